@@ -1,13 +1,39 @@
-import psycopg2
-from fastapi import Depends, FastAPI, HTTPException
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
+from uuid import UUID
+
+import psycopg
+from fastapi import Body, Depends, FastAPI, Header, HTTPException, Query, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from psycopg_pool import PoolTimeout
+from pydantic import ValidationError
 
 import schemas as s
-from db import (
+from cache import QUESTIONS_CHANNEL, question_cache
+from changes import (
+    CHANGE_LOG_PRUNE_INTERVAL,
+    CHANGE_LOG_RETENTION,
+    DEFAULT_CHANGES_LIMIT,
+    MAX_CHANGES_LIMIT,
+    decode_change_token,
+    next_change_token,
+    parse_tables,
+)
+from db_async import (
+    STREAM_ITERSIZE,
+    bulk_create_favorite_kahoots,
+    bulk_create_kahoot_owners,
+    bulk_create_user_group_members,
+    bulk_create_users,
+    clone_your_kahoot,
+    copy_game_answers,
     create_answer_quiz,
     create_customer_types,
     create_favorite_kahoots,
     create_groups,
+    create_kahoot_report,
     create_kahoot_owners,
     create_languages,
     create_presentation_classic,
@@ -18,20 +44,36 @@ from db import (
     create_written_quiz,
     create_your_kahoot,
     delete_group_by_id,
+    delete_link,
     delete_quiz_answer_with_written_answer,
     delete_quiz_question_with_written_answer,
     delete_quiz_with_true_false,
     delete_user_by_username,
     delete_your_kahoot_by_id,
+    import_your_kahoot,
     patch_question_quiz_with_true_false,
+    prune_change_log,
+    put_link,
+    read_changes,
+    read_game_report,
     read_all_groups,
     read_all_kahoots,
     read_all_users,
     read_individual_user,
+    read_kahoot_tree,
+    read_lookup_table,
     read_questions_by_kahoot_id,
+    read_table_versions,
     read_users_favorite_kahoot,
+    read_users_favorite_kahoot_nested,
     read_users_groups,
+    read_users_groups_nested,
     read_users_joined_kahoot,
+    read_users_joined_kahoot_nested,
+    read_written_answers_by_kahoot_id,
+    stream_users_favorite_kahoot,
+    stream_users_groups,
+    stream_users_joined_kahoot,
     update_groups,
     update_presentation_classic,
     update_quiz_answer_with_written_answer,
@@ -39,9 +81,79 @@ from db import (
     update_quiz_with_true_false,
     update_your_kahoot_by,
 )
-from db_setup import get_connection, release_connection
+from db_setup import (
+    MIGRATE_ON_STARTUP,
+    POOL_LAZY,
+    close_async_pool,
+    close_pool,
+    get_async_connection,
+    migrate_database,
+    open_async_pool,
+    pool_stats,
+    release_async_connection,
+)
+from etag import ETAG_HEADER, etag_headers, etag_matches, make_etag
+from events import EVENT_TABLES, EVENTS_CHANNEL, broker
+from fieldsets import parse_fields
+from game import DEFAULT_QUESTION_TIME, SESSION_REAP_INTERVAL, GameError, load_questions, sessions
+from grading import WRITTEN_ANSWER_MAX_DISTANCE
+from ingest import AnswerIngester
+from lookup_cache import LookupCache
+from notifications import listener
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, paginate
+from rooms import FORBIDDEN_CLOSE_CODE, NOT_FOUND_CLOSE_CODE, rooms, serve_connection
+from singleflight import SingleFlight
+from streaming import ndjson_response, sse_response
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Applies pending migrations and opens the database pool when a worker
+    starts, and drains the pool on shutdown.
+    Nothing connects at import time, so workers can be forked first.
+    https://fastapi.tiangolo.com/advanced/events/#lifespan
+    """
+    if MIGRATE_ON_STARTUP:
+        await asyncio.to_thread(migrate_database)
+    if not POOL_LAZY:
+        await open_async_pool(wait=True)
+    await listener.start()
+    answer_log.start()
+    reaper = asyncio.create_task(run_periodically(SESSION_REAP_INTERVAL, reap_sessions))
+    pruner = asyncio.create_task(run_periodically(CHANGE_LOG_PRUNE_INTERVAL, prune_changes))
+    yield
+    pruner.cancel()
+    reaper.cancel()
+    await answer_log.stop()
+    await listener.stop()
+    await close_async_pool()
+    close_pool()
+
+app = FastAPI(lifespan=lifespan)
+
+async def run_periodically(interval, func):
+    """
+    Calls `func` every `interval` seconds until cancelled. Errors are
+    printed and don't stop the loop.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = func()
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            print(f"Periodic task {func.__name__} failed. Error message: {e}")
+
+async def prune_changes():
+    deleted = await run_with_connection(prune_change_log, CHANGE_LOG_RETENTION)
+    if deleted:
+        print(f"Pruned {deleted} change log entries")
 
-app = FastAPI()
+def reap_sessions():
+    for session_id in sessions.reap():
+        rooms.close(session_id)
 
 ############## FRONTEND AI GENERATED ##############
 # Configure CORS to allow requests from your frontend's address
@@ -57,64 +169,162 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER],
 )
 ############## / FRONTEND AI GENERATED ##############
 
 # Dependency function to manage database connection lifecycle
-def get_db_connection():
+async def get_db_connection():
     """
-    FastAPI dependency that provides a database connection and ensures proper cleanup.
+    FastAPI dependency that provides an async database connection and ensures proper cleanup.
     The connection is automatically returned to the pool after the request completes.
     https://fastapi.tiangolo.com/tutorial/dependencies/dependencies-with-yield/#sub-dependencies-with-yield
     """
-    conn = get_connection()
+    try:
+        conn = await get_async_connection()
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=f"Database is busy, try again later. Error message: {e}")
     try:
         yield conn
     finally:
-        release_connection(conn)
+        await release_async_connection(conn)
+
+async def run_with_connection(func, *args):
+    """
+    Runs a db_async function on a connection checked out just for it. Used by
+    cached reads, so cache hits never check a connection out.
+    """
+    conn = await get_async_connection()
+    try:
+        return await func(conn, *args)
+    finally:
+        await release_async_connection(conn)
+
+flights = SingleFlight()
+
+async def write_game_answers(events):
+    return await run_with_connection(copy_game_answers, events)
+
+# answers of live games, written to game_answers in batches (see ingest.py)
+answer_log = AnswerIngester(write_game_answers, data_errors=(psycopg.DataError,))
+
+async def run_coalesced(func, *args):
+    """
+    Like run_with_connection, but identical concurrent calls share one query
+    and one connection, see singleflight.py.
+    """
+    return await flights.do((func.__name__, *args), lambda: run_with_connection(func, *args))
+
+async def load_lookup_table(table):
+    return await run_coalesced(read_lookup_table, table)
+
+lookups = LookupCache(listener, load_lookup_table)
+
+# question sets are invalidated by the write functions in db_async.py, other
+# workers' writes arrive as notifications
+listener.subscribe(QUESTIONS_CHANNEL, lambda kahoot_id: question_cache.invalidate(int(kahoot_id)))
+listener.on_reconnect(question_cache.clear)
+
+# live list updates, see events.py
+listener.subscribe(EVENTS_CHANNEL, broker.publish)
+listener.on_reconnect(broker.resync)
+
+async def request_etag(request, tables, connection=None):
+    """
+    Builds the ETag of a GET from the change counters of the tables it reads
+    and its URL, see etag.py. Call it before reading the data: a write racing
+    with the request then can only leave the ETag older than the body, which
+    costs the client one extra download, never a stale 304.
+    """
+    if connection is None:
+        versions = await run_coalesced(read_table_versions, tables)
+    else:
+        versions = await read_table_versions(connection, tables)
+    return make_etag(versions, f"{request.url.path}?{request.url.query}")
+
+def not_modified(request, etag):
+    """
+    Returns a 304 response when the client's If-None-Match matches, else None.
+    """
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=etag_headers(etag))
+    return None
+
+def nested_page_response(page, etag=None):
+    """
+    Sends a page built by one of the *_nested queries as-is, it is already
+    JSON text, and puts the cursor for the next page in the header.
+    """
+    response = Response(content=page["body"], media_type="application/json")
+    if etag:
+        response.headers.update(etag_headers(etag))
+    if page["has_more"]:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page["last_id"])
+    return response
+
+# ==================== HEALTH ENDPOINTS ====================
+
+@app.get("/pool_stats")
+async def read_pool_stats_endpoint():
+    return pool_stats()
+
+@app.get("/cache_stats")
+async def read_cache_stats_endpoint():
+    return {"lookup_cache": lookups.stats(), "question_cache": question_cache.stats(), "single_flight": flights.stats()}
+
+@app.get("/event_stats")
+async def read_event_stats_endpoint():
+    return broker.stats()
+
+@app.get("/game_stats")
+async def read_game_stats_endpoint():
+    return {"sessions": len(sessions), **rooms.stats(), "answers": answer_log.stats()}
 
 # ==================== POST ENDPOINTS (CREATE) ====================
 
 @app.post("/subscriptions", status_code=201)
-def create_subscription_endpoint(
+async def create_subscription_endpoint(
     subscription: s.SubscriptionCreate,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        out_data = create_subscriptions(connection, subscription.name)
+        out_data = await create_subscriptions(connection, subscription.name)
+        lookups.invalidate("subscriptions")
         return out_data
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to save the subscription name. Error message: {e}")
 
 @app.post("/languages", status_code=201)
-def create_language_endpoint(
+async def create_language_endpoint(
     language: s.LanguageCreate,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        out_data = create_languages(connection, language.name)
+        out_data = await create_languages(connection, language.name)
+        lookups.invalidate("languages")
         return out_data
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to save the language name. Error message: {e}")
 
 @app.post("/customer_types", status_code=201)
-def create_customer_types_endpoint(
+async def create_customer_types_endpoint(
     customer_type: s.CustomerTypeCreate,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        out_data = create_customer_types(connection, customer_type.name)
+        out_data = await create_customer_types(connection, customer_type.name)
+        lookups.invalidate("customer_types")
         return out_data
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to save the customer type name. Error message: {e}")
 
 @app.post("/users", status_code=201)
-def create_users_endpoint(
+async def create_users_endpoint(
     user: s.UsersCreate,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        out_data = create_users(connection,
+        out_data = await create_users(connection,
                                 username=user.username,
                                 email=user.email,
                                 password=user.password,
@@ -126,74 +336,144 @@ def create_users_endpoint(
                                 organisation=user.organisation
         )
         return out_data
-    except psycopg2.errors.UniqueViolation as e:
+    except psycopg.errors.UniqueViolation as e:
         raise HTTPException(status_code=409, detail=f"Unable to save the user, userdata already exists violating unique constraints. Error message: {e}")
-    except psycopg2.errors.ForeignKeyViolation as e:
+    except psycopg.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=404, detail=f"Unable to save the user, violating foreign key constraints. Error message: {e}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to save the user. Error message: {e}")
 
+# Bulk variants insert a whole list with one statement. Rows that violate a
+# unique or foreign key constraint are skipped and reported in `errors` by
+# their index in the request, the rest of the batch is still created.
+MAX_BULK_ROWS = 5000
+
+@app.post("/users/bulk", status_code=201)
+async def create_users_bulk_endpoint(
+    users: List[s.UsersCreate] = Body(..., max_length=MAX_BULK_ROWS),
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    try:
+        out_data = await bulk_create_users(connection, [user.model_dump() for user in users])
+        return out_data
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to save the users. Error message: {e}")
+
 @app.post("/your_kahoots", status_code=201)
-def create_your_kahoot_endpoint(
+async def create_your_kahoot_endpoint(
     kahoot: s.YourKahootCreate,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        out_data = create_your_kahoot(connection,
+        out_data = await create_your_kahoot(connection,
                                     title=kahoot.title,
                                     language_id=kahoot.language_id,
                                     description=kahoot.description,
                                     is_private=kahoot.is_private
         )
         return out_data
-    except psycopg2.errors.ForeignKeyViolation as e:
+    except psycopg.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=404, detail=f"Unable to save the kahoot because of foreign key violation. Error message: {e}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to save the kahoot. Error message: {e}")
 
+@app.post("/your_kahoots/import", status_code=201)
+async def import_your_kahoot_endpoint(
+    kahoot: s.YourKahootImport,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    # the kahoot with its questions, answers, slides and owner in one transaction
+    try:
+        out_data = await import_your_kahoot(connection, kahoot.model_dump())
+        return out_data
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to import the kahoot. Error message: {e}")
+
+@app.post("/your_kahoots/{your_kahoot_id}/clone", status_code=201)
+async def clone_your_kahoot_endpoint(
+    your_kahoot_id: int,
+    clone: Optional[s.YourKahootClone] = None,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    # copies the kahoot and everything in it inside Postgres, in one transaction
+    clone = clone or s.YourKahootClone()
+    try:
+        out_data = await clone_your_kahoot(connection, your_kahoot_id, title=clone.title, owner_id=clone.owner_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to clone the kahoot. Error message: {e}")
+    if out_data is None:
+        raise HTTPException(status_code=404, detail="Kahoot id not found, nothing to clone.")
+    return out_data
+
 @app.post("/kahoot_owners", status_code=201)
-def create_kahoot_owners_endpoint(
+async def create_kahoot_owners_endpoint(
     kahoot_owner: s.KahootOwnerCreate,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        out_data = create_kahoot_owners(connection,
+        out_data = await create_kahoot_owners(connection,
                                         users_id=kahoot_owner.users_id,
                                         your_kahoot_id=kahoot_owner.your_kahoot_id
         )
         return out_data
-    except psycopg2.errors.UniqueViolation as e:
+    except psycopg.errors.UniqueViolation as e:
         raise HTTPException(status_code=409, detail=f"Unable to create the kahoot ownership because it already exists. Error message: {e}")
-    except psycopg2.errors.ForeignKeyViolation as e:
+    except psycopg.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=404, detail=f"Unable to create the kahoot ownership. Foreign key violation. Error message: {e}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to create the kahoot ownership. Error message: {e}")
 
+@app.post("/kahoot_owners/bulk", status_code=201)
+async def create_kahoot_owners_bulk_endpoint(
+    kahoot_owners: List[s.KahootOwnerCreate] = Body(..., max_length=MAX_BULK_ROWS),
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    try:
+        out_data = await bulk_create_kahoot_owners(connection, [owner.model_dump() for owner in kahoot_owners])
+        return out_data
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the kahoot ownerships. Error message: {e}")
+
 @app.post("/favorite_kahoots", status_code=201)
-def create_favorite_kahoot_endpoint(
+async def create_favorite_kahoot_endpoint(
     favorite: s.FavoriteKahootCreate,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        out_data = create_favorite_kahoots(connection,
+        out_data = await create_favorite_kahoots(connection,
                                         users_id=favorite.users_id,
                                         your_kahoot_id=favorite.your_kahoot_id
         )
         return out_data
-    except psycopg2.errors.UniqueViolation as e:
+    except psycopg.errors.UniqueViolation as e:
         raise HTTPException(status_code=409, detail=f"Unable to create favorite kahoot because it already exists as favorite. Error message: {e}")
-    except psycopg2.errors.ForeignKeyViolation as e:
+    except psycopg.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=404, detail=f"Unable to create favorite kahoot. Foreign key violation. Error message: {e}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to create favorite kahoot. Error message: {e}")
 
+@app.post("/favorite_kahoots/bulk", status_code=201)
+async def create_favorite_kahoots_bulk_endpoint(
+    favorites: List[s.FavoriteKahootCreate] = Body(..., max_length=MAX_BULK_ROWS),
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    try:
+        out_data = await bulk_create_favorite_kahoots(connection, [favorite.model_dump() for favorite in favorites])
+        return out_data
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create favorite kahoots. Error message: {e}")
+
 @app.post("/groups", status_code=201)
-def create_groups_endpoint(
+async def create_groups_endpoint(
     group: s.GroupCreate,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        out_data = create_groups(connection,
+        out_data = await create_groups(connection,
                                 name=group.name,
                                 description=group.description
         )
@@ -202,176 +482,420 @@ def create_groups_endpoint(
         raise HTTPException(status_code=400, detail=f"Unable to create the group. Error message: {e}")
 
 @app.post("/group_memberships", status_code=201)
-def create_group_membership_endpoint(
+async def create_group_membership_endpoint(
     membership: s.GroupMembershipCreate,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        out_data = create_user_group_members(connection,
+        out_data = await create_user_group_members(connection,
                                 user_id=membership.user_id,
                                 group_id=membership.group_id
         )
         return out_data
-    except psycopg2.errors.UniqueViolation as e:
+    except psycopg.errors.UniqueViolation as e:
         raise HTTPException(status_code=409, detail=f"Unable to create the group membership because it already exists. Error message: {e}")
-    except psycopg2.errors.ForeignKeyViolation as e:
+    except psycopg.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=404, detail=f"Unable to create the group membership. Foreign key constraint violation. Error message: {e}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to create the group membership. Error message: {e}")
 
+@app.post("/group_memberships/bulk", status_code=201)
+async def create_group_memberships_bulk_endpoint(
+    memberships: List[s.GroupMembershipCreate] = Body(..., max_length=MAX_BULK_ROWS),
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    try:
+        out_data = await bulk_create_user_group_members(connection, [membership.model_dump() for membership in memberships])
+        return out_data
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the group memberships. Error message: {e}")
+
 @app.post("/quizzes/written_question", status_code=201)
-def create_written_quiz_endpoint(
+async def create_written_quiz_endpoint(
     quiz: s.WrittenQuizCreate,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        out_data = create_written_quiz(connection,
+        out_data = await create_written_quiz(connection,
                                     question=quiz.question,
                                     your_kahoot_id=quiz.your_kahoot_id
         )
         return out_data
-    except psycopg2.errors.ForeignKeyViolation as e:
+    except psycopg.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=404, detail=f"Unable to create the quiz. Foreign key constraint violation. Error message: {e}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to create the quiz. Error message: {e}")
 
 @app.post("/quizzes/written_answers", status_code=201)
-def create_answer_quiz_endpoint(
+async def create_answer_quiz_endpoint(
     quiz_answer: s.QuizAnswerCreate,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        out_data = create_answer_quiz(connection,
+        out_data = await create_answer_quiz(connection,
                                     answer=quiz_answer.answer,
                                     quiz_with_written_answer_id=quiz_answer.quiz_with_written_answer_id
         )
         return out_data
-    except psycopg2.errors.ForeignKeyViolation as e:
+    except psycopg.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=404, detail=f"Unable to create the quiz answer. Foreign key constraint violation. Error message: {e}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to create the quiz answer. Error message: {e}")
 
 @app.post("/quizzes/true_false", status_code=201)
-def create_true_false_quiz_endpoint(
+async def create_true_false_quiz_endpoint(
     quiz: s.TrueFalseQuizCreate,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        out_data = create_true_false_quiz(connection,
+        out_data = await create_true_false_quiz(connection,
                                         question=quiz.question,
                                         answer=quiz.answer,
                                         your_kahoot_id=quiz.your_kahoot_id
         )
         return out_data
-    except psycopg2.errors.ForeignKeyViolation as e:
+    except psycopg.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=404, detail=f"Unable to create the quiz. Foreign key constraint violation. Error message: {e}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to create the quiz. Error message: {e}")
 
 @app.post("/classic_presentations", status_code=201)
-def create_classic_presentation_endpoint(
+async def create_classic_presentation_endpoint(
     presentation: s.PresentationClassicCreate,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        out_data = create_presentation_classic(connection,
+        out_data = await create_presentation_classic(connection,
                                             your_kahoot_id=presentation.your_kahoot_id,
                                             title=presentation.title,
                                             text=presentation.text
         )
         return out_data
-    except psycopg2.errors.ForeignKeyViolation as e:
+    except psycopg.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=404, detail=f"Unable to create the presention. Foreign key constraint violation. Error message: {e}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to create the presenation. Error message: {e}")
 
 # ==================== GET ENDPOINTS (READ) ====================
 
+# lookup tables are served from the in-process cache, see lookup_cache.py
+@app.get("/subscriptions")
+async def read_subscriptions_endpoint():
+    try:
+        out_data = await lookups.get_all("subscriptions")
+        return out_data
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to get the subscriptions. Error message: {e}")
+
+@app.get("/subscriptions/{id}")
+async def read_subscriptions_by_id_endpoint(id: int):
+    try:
+        out_data = await lookups.get("subscriptions", id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to get the subscription. Error message: {e}")
+    if out_data is None:
+        raise HTTPException(status_code=404, detail="No subscription found with provided id.")
+    return out_data
+
+@app.get("/languages")
+async def read_languages_endpoint():
+    try:
+        out_data = await lookups.get_all("languages")
+        return out_data
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to get the languages. Error message: {e}")
+
+@app.get("/languages/{id}")
+async def read_languages_by_id_endpoint(id: int):
+    try:
+        out_data = await lookups.get("languages", id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to get the language. Error message: {e}")
+    if out_data is None:
+        raise HTTPException(status_code=404, detail="No language found with provided id.")
+    return out_data
+
+@app.get("/customer_types")
+async def read_customer_types_endpoint():
+    try:
+        out_data = await lookups.get_all("customer_types")
+        return out_data
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to get the customer types. Error message: {e}")
+
+@app.get("/customer_types/{id}")
+async def read_customer_types_by_id_endpoint(id: int):
+    try:
+        out_data = await lookups.get("customer_types", id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to get the customer type. Error message: {e}")
+    if out_data is None:
+        raise HTTPException(status_code=404, detail="No customer type found with provided id.")
+    return out_data
+
+
 @app.get("/users")
-def read_all_users_endpoint(
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+async def read_all_users_endpoint(
+    response: Response,
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
+    # keyset pagination, the cursor for the next page is sent in a header
     try:
-        out_data = read_all_users(connection)
+        etag = await request_etag(request, ("users",), connection)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        columns = parse_fields("users", fields)
+        rows = await read_all_users(connection, limit=limit + 1, after_id=decode_cursor(after), columns=columns)
+        out_data, next_cursor = paginate(rows, limit)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        response.headers.update(etag_headers(etag))
         return out_data
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to get all user information. Error message: {e}")
 
 @app.get("/your_kahoots")
-def read_all_kahoots_endpoint(
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+async def read_all_kahoots_endpoint(
+    response: Response,
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
+    # keyset pagination, the cursor for the next page is sent in a header
     try:
-        out_data = read_all_kahoots(connection)
+        etag = await request_etag(request, ("your_kahoot",), connection)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        columns = parse_fields("your_kahoot", fields)
+        rows = await read_all_kahoots(connection, limit=limit + 1, after_id=decode_cursor(after), columns=columns)
+        out_data, next_cursor = paginate(rows, limit)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        response.headers.update(etag_headers(etag))
         return out_data
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to get information of all kahoots. Error message: {e}")
 
 @app.get("/groups")
-def read_all_groups_endpoint(
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+async def read_all_groups_endpoint(
+    response: Response,
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
+    # keyset pagination, the cursor for the next page is sent in a header
     try:
-        out_data = read_all_groups(connection)
+        etag = await request_etag(request, ("groups",), connection)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        columns = parse_fields("groups", fields)
+        rows = await read_all_groups(connection, limit=limit + 1, after_id=decode_cursor(after), columns=columns)
+        out_data, next_cursor = paginate(rows, limit)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        response.headers.update(etag_headers(etag))
         return out_data
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to get information of all groups. Error message: {e}")
 
 @app.get("/users_kahoots")
-def read_users_kahoot_endpoint(
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+async def read_users_kahoot_endpoint(
+    request: Request,
+    response: Response,
+    stream: Optional[Literal["ndjson"]] = None,
+    itersize: int = Query(STREAM_ITERSIZE, ge=1, le=50000),
+    nested: bool = False,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
+    # ?stream=ndjson exports every row through a server-side cursor
+    if stream == "ndjson":
+        return ndjson_response(stream_users_joined_kahoot(connection, itersize))
+    try:
+        etag = await request_etag(request, ("users", "kahoot_owners", "your_kahoot"), connection)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the table versions. Error message: {e}")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    # ?nested=true returns one object per user, paginated by user
+    if nested:
+        try:
+            page = await read_users_joined_kahoot_nested(connection, limit=limit, after_id=decode_cursor(after))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Unable to get the users page. Error message: {e}")
+        return nested_page_response(page, etag)
     try:
-        out_data = read_users_joined_kahoot(connection)
+        out_data = await read_users_joined_kahoot(connection)
+        response.headers.update(etag_headers(etag))
         return out_data
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to get information of all users and their kahoots. Error message: {e}")
 
 @app.get("/users_favorites")
-def read_users_favorite_kahoot_endpoint(
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+async def read_users_favorite_kahoot_endpoint(
+    request: Request,
+    response: Response,
+    stream: Optional[Literal["ndjson"]] = None,
+    itersize: int = Query(STREAM_ITERSIZE, ge=1, le=50000),
+    nested: bool = False,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
+    # ?stream=ndjson exports every row through a server-side cursor
+    if stream == "ndjson":
+        return ndjson_response(stream_users_favorite_kahoot(connection, itersize))
+    try:
+        etag = await request_etag(request, ("users", "favorite_kahoots", "your_kahoot"), connection)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the table versions. Error message: {e}")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    # ?nested=true returns one object per user, paginated by user
+    if nested:
+        try:
+            page = await read_users_favorite_kahoot_nested(connection, limit=limit, after_id=decode_cursor(after))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Unable to get the users page. Error message: {e}")
+        return nested_page_response(page, etag)
     try:
-        out_data = read_users_favorite_kahoot(connection)
+        out_data = await read_users_favorite_kahoot(connection)
+        response.headers.update(etag_headers(etag))
         return out_data
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to get information of all users and their favorite kahoots. Error message: {e}")
 
 @app.get("/users_groups")
-def read_users_groups_endpoint(
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+async def read_users_groups_endpoint(
+    request: Request,
+    response: Response,
+    stream: Optional[Literal["ndjson"]] = None,
+    itersize: int = Query(STREAM_ITERSIZE, ge=1, le=50000),
+    nested: bool = False,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
+    # ?stream=ndjson exports every row through a server-side cursor
+    if stream == "ndjson":
+        return ndjson_response(stream_users_groups(connection, itersize))
     try:
-        out_data = read_users_groups(connection)
+        etag = await request_etag(request, ("users", "user_group_members", "groups"), connection)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the table versions. Error message: {e}")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    # ?nested=true returns one object per user, paginated by user
+    if nested:
+        try:
+            page = await read_users_groups_nested(connection, limit=limit, after_id=decode_cursor(after))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Unable to get the users page. Error message: {e}")
+        return nested_page_response(page, etag)
+    try:
+        out_data = await read_users_groups(connection)
+        response.headers.update(etag_headers(etag))
         return out_data
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to get information of all users and their groups. Error message: {e}")
 
 @app.get("/users/{user_id}")
-def read_individual_user_endpoint(
+async def read_individual_user_endpoint(
+    request: Request,
+    response: Response,
     user_id: int,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    fields: Optional[str] = None,
 ):
     try:
-        out_data = read_individual_user(connection, user_id)
+        etag = await request_etag(request, ("users",))
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        out_data = await run_coalesced(read_individual_user, user_id, parse_fields("user_detail", fields))
         if out_data is None:
             raise HTTPException(status_code=404, detail="No user found with provided primary key id.")
+        response.headers.update(etag_headers(etag))
         return out_data
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to provide information of the user. Error message: {e}")
 
+@app.get("/your_kahoots/{kahoot_id}/full")
+async def read_kahoot_tree_endpoint(
+    kahoot_id: int,
+):
+    # metadata, questions with their accepted answers and slides in one query,
+    # e.g. for a game host loading a kahoot
+    try:
+        body = await run_coalesced(read_kahoot_tree, kahoot_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to get the kahoot. Error message: {e}")
+    if body is None:
+        raise HTTPException(status_code=404, detail="No kahoot found with provided id.")
+    return Response(content=body, media_type="application/json")
+
 @app.get("/your_kahoots/{kahoot_id}/questions")
-def read_kahoot_questions_endpoint(
+async def read_kahoot_questions_endpoint(
     kahoot_id: int,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
 ):
     try:
-        # This calls the function we just added to db.py
-        out_data = read_questions_by_kahoot_id(connection, kahoot_id)
+        # served from the question cache, a miss loads it with read_questions_by_kahoot_id
+        out_data = await question_cache.get_or_load(
+            kahoot_id, lambda: run_coalesced(read_questions_by_kahoot_id, kahoot_id)
+        )
         return out_data
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Unable to get questions. Error message: {e}")
 
+@app.get("/changes")
+async def read_changes_endpoint(
+    since: Optional[str] = None,
+    tables: Optional[str] = None,
+    limit: int = Query(DEFAULT_CHANGES_LIMIT, ge=1, le=MAX_CHANGES_LIMIT),
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    # inserts, updates and deletes of kahoots, users and groups after `since`,
+    # pass the returned `next` token as `since` to continue (see changes.py);
+    # a 410 means the token is older than the retained log
+    try:
+        since_txid, since_id = decode_change_token(since)
+        page = await read_changes(connection, since_txid, since_id, limit, parse_tables(tables))
+        next_token, has_more = next_change_token(page["changes"], limit, page["watermark"])
+        return {"changes": page["changes"], "next": next_token, "has_more": has_more}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to get the changes. Error message: {e}")
+
+@app.get("/events")
+async def read_events_endpoint(
+    tables: Optional[str] = None,
+):
+    # Server-Sent Events stream of creates, updates and deletes, e.g.
+    # new EventSource("/events?tables=your_kahoot,groups"). A `resync` or
+    # `evicted` event means updates were lost and the client should refetch.
+    requested = tuple(name.strip() for name in tables.split(",") if name.strip()) if tables else EVENT_TABLES
+    unknown = set(requested) - set(EVENT_TABLES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown tables: {', '.join(sorted(unknown))}. Allowed tables: {', '.join(EVENT_TABLES)}")
+    return sse_response(broker.stream(broker.subscribe(requested)))
+
 # ==================== DELETE ENDPOINTS ====================
 
 # We generally return a 204 or 200 when deleting. 
@@ -379,12 +903,12 @@ def read_kahoot_questions_endpoint(
 # If we return a 200, we can just use “return” and nothing more.
 
 @app.delete("/users/{username}")
-def delete_user_endpoint(
+async def delete_user_endpoint(
     user: s.Username,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        result = delete_user_by_username(connection, user.username)
+        result = await delete_user_by_username(connection, user.username)
         return {
             "message": f"User '{user.username}' deleted successfully",
             "deleted_user": result,
@@ -395,12 +919,12 @@ def delete_user_endpoint(
         raise HTTPException(status_code=400, detail=f"Delete failed: {str(e)}")
 
 @app.delete("/your_kahoots/{your_kahoot_id}")
-def delete_your_kahoot_endpoint(
+async def delete_your_kahoot_endpoint(
     your_kahoot_id: int,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        result = delete_your_kahoot_by_id(connection, your_kahoot_id)
+        result = await delete_your_kahoot_by_id(connection, your_kahoot_id)
         return {
             "message": f"Kahoot id '{your_kahoot_id}' deleted successfully",
             "deleted_kahoot": result,
@@ -411,12 +935,12 @@ def delete_your_kahoot_endpoint(
         raise HTTPException(status_code=400, detail=f"Delete failed: {str(e)}")
 
 @app.delete("/quizzes/written_question/{id}")
-def delete_quiz_question_with_written_answer_endpoint(
+async def delete_quiz_question_with_written_answer_endpoint(
     quiz_with_written_answer_id: int,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        result = delete_quiz_question_with_written_answer(connection, quiz_with_written_answer_id)
+        result = await delete_quiz_question_with_written_answer(connection, quiz_with_written_answer_id)
         return {
             "message": f"Quiz question with written answer id '{quiz_with_written_answer_id}' deleted successfully",
             "deleted_quiz_question": result,
@@ -427,12 +951,12 @@ def delete_quiz_question_with_written_answer_endpoint(
         raise HTTPException(status_code=400, detail=f"Delete failed: {str(e)}")
 
 @app.delete("/quizzes/written_answer/{id}")
-def delete_quiz_answer_with_written_answer_endpoint(
+async def delete_quiz_answer_with_written_answer_endpoint(
     quiz_written_answer_id: int,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        result = delete_quiz_answer_with_written_answer(connection, quiz_written_answer_id)
+        result = await delete_quiz_answer_with_written_answer(connection, quiz_written_answer_id)
         return {
             "message": f"Quiz answer with written answer id '{quiz_written_answer_id}' deleted successfully",
             "deleted_quiz_answer": result,
@@ -443,12 +967,12 @@ def delete_quiz_answer_with_written_answer_endpoint(
         raise HTTPException(status_code=400, detail=f"Delete failed: {str(e)}")
 
 @app.delete("/quizzes/true_false/{id}")
-def delete_quiz_with_true_false_endpoint(
+async def delete_quiz_with_true_false_endpoint(
     quiz_with_true_false_id: int,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        result = delete_quiz_with_true_false(connection, quiz_with_true_false_id)
+        result = await delete_quiz_with_true_false(connection, quiz_with_true_false_id)
         return {
             "message": f"Quiz question/answer with written answer id '{quiz_with_true_false_id}' deleted successfully",
             "deleted_quiz_question/answer": result,
@@ -459,12 +983,12 @@ def delete_quiz_with_true_false_endpoint(
         raise HTTPException(status_code=400, detail=f"Delete failed: {str(e)}")
 
 @app.delete("/groups/{id}")
-def delete_group_endpoint(
+async def delete_group_endpoint(
     id: int,
-    connection: psycopg2.extensions.connection = Depends(get_db_connection)
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        result = delete_group_by_id(connection, id)
+        result = await delete_group_by_id(connection, id)
         return {
             "message": f"Group id '{id}' deleted successfully",
             "deleted_group": result,
@@ -474,16 +998,76 @@ def delete_group_endpoint(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Delete failed: {str(e)}")
 
+# Idempotent unlinking, deleting a link that doesn't exist is not an error
+@app.delete("/favorite_kahoots/{users_id}/{your_kahoot_id}", status_code=204)
+async def delete_favorite_kahoot_endpoint(
+    users_id: int,
+    your_kahoot_id: int,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    await delete_link(connection, "favorite_kahoots", users_id, your_kahoot_id)
+
+@app.delete("/kahoot_owners/{users_id}/{your_kahoot_id}", status_code=204)
+async def delete_kahoot_owner_endpoint(
+    users_id: int,
+    your_kahoot_id: int,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    await delete_link(connection, "kahoot_owners", users_id, your_kahoot_id)
+
+@app.delete("/group_memberships/{user_id}/{group_id}", status_code=204)
+async def delete_group_membership_endpoint(
+    user_id: int,
+    group_id: int,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    await delete_link(connection, "user_group_members", user_id, group_id)
+
 # ==================== PUT ENDPOINTS (UPDATE) ====================
 
+# Idempotent linking with INSERT ... ON CONFLICT DO NOTHING, repeating the
+# request (a double click on the favorite button) answers 200 instead of 201
+# and never takes an error path
+async def put_link_response(response, connection, table, left_id, right_id):
+    result = await put_link(connection, table, left_id, right_id)
+    response.status_code = 201 if result.pop("created") else 200
+    return result
+
+@app.put("/favorite_kahoots/{users_id}/{your_kahoot_id}")
+async def put_favorite_kahoot_endpoint(
+    response: Response,
+    users_id: int,
+    your_kahoot_id: int,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    return await put_link_response(response, connection, "favorite_kahoots", users_id, your_kahoot_id)
+
+@app.put("/kahoot_owners/{users_id}/{your_kahoot_id}")
+async def put_kahoot_owner_endpoint(
+    response: Response,
+    users_id: int,
+    your_kahoot_id: int,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    return await put_link_response(response, connection, "kahoot_owners", users_id, your_kahoot_id)
+
+@app.put("/group_memberships/{user_id}/{group_id}")
+async def put_group_membership_endpoint(
+    response: Response,
+    user_id: int,
+    group_id: int,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    return await put_link_response(response, connection, "user_group_members", user_id, group_id)
+
 @app.put("/quizzes/true_false/{id}")
-def put_quiz_true_false(
+async def put_quiz_true_false(
     id: int,
     quiz: s.QuizTrueFalseUpdate,
-    con: psycopg2.extensions.connection = Depends(get_db_connection)
+    con: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        result = update_quiz_with_true_false(con, id=id, question=quiz.question, answer=quiz.answer,your_kahoot_id=quiz.your_kahoot_id,)
+        result = await update_quiz_with_true_false(con, id=id, question=quiz.question, answer=quiz.answer,your_kahoot_id=quiz.your_kahoot_id,)
         return {
             "message": f"Quiz true/false id '{id}' updated successfully",
             "updated_quiz": result,
@@ -494,13 +1078,13 @@ def put_quiz_true_false(
         raise HTTPException(status_code=400, detail=f"Update failed: {str(e)}")
 
 @app.put("/quizzes/written_answer/{id}")
-def put_quiz_answer_with_written_answer(
+async def put_quiz_answer_with_written_answer(
     id: int,
     body: s.QuizAnswerWrittenUpdate,
-    con: psycopg2.extensions.connection = Depends(get_db_connection)
+    con: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        result = update_quiz_answer_with_written_answer(con, id=id, quiz_with_written_answer_id=body.quiz_with_written_answer_id,answer=body.answer,)
+        result = await update_quiz_answer_with_written_answer(con, id=id, quiz_with_written_answer_id=body.quiz_with_written_answer_id,answer=body.answer,)
         return {
             "message": f"Quiz written answer id '{id}' updated successfully",
             "updated_answer": result,
@@ -511,13 +1095,13 @@ def put_quiz_answer_with_written_answer(
         raise HTTPException(status_code=400, detail=f"Update failed: {str(e)}")
 
 @app.put("/quizzes/written_question/{id}")
-def put_quiz_question_with_written_answer(
+async def put_quiz_question_with_written_answer(
     id: int,
     body: s.QuizQuestionWrittenUpdate,
-    con: psycopg2.extensions.connection = Depends(get_db_connection)
+    con: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        result = update_quiz_question_with_written_answer(con, id=id, question=body.question, your_kahoot_id=body.your_kahoot_id,)
+        result = await update_quiz_question_with_written_answer(con, id=id, question=body.question, your_kahoot_id=body.your_kahoot_id,)
         return {
             "message": f"Quiz question with written answer id '{id}' updated successfully",
             "updated_question": result,
@@ -528,13 +1112,13 @@ def put_quiz_question_with_written_answer(
         raise HTTPException(status_code=400, detail=f"Update failed: {str(e)}")
 
 @app.put("/your_kahoots/{your_kahoot_id}")
-def put_your_kahoot(
+async def put_your_kahoot(
     your_kahoot_id: int,
     body: s.YourKahootUpdate,
-    con: psycopg2.extensions.connection = Depends(get_db_connection)
+    con: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        result = update_your_kahoot_by(con, your_kahoot_id=your_kahoot_id, title=body.title, description=body.description, is_private=body.is_private, language_id=body.language_id,)
+        result = await update_your_kahoot_by(con, your_kahoot_id=your_kahoot_id, title=body.title, description=body.description, is_private=body.is_private, language_id=body.language_id,)
         return {
             "message": f"Kahoot id '{your_kahoot_id}' updated successfully",
             "updated_kahoot": result,
@@ -545,13 +1129,13 @@ def put_your_kahoot(
         raise HTTPException(status_code=400, detail=f"Update failed: {str(e)}")
 
 @app.put("/groups/{id}")
-def put_group(
+async def put_group(
     id: int,
     body: s.GroupUpdate,
-    con: psycopg2.extensions.connection = Depends(get_db_connection)
+    con: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        result = update_groups(con, id=id, name=body.name, description=body.description,)
+        result = await update_groups(con, id=id, name=body.name, description=body.description,)
         return {
             "message": f"Group id '{id}' updated successfully",
             "updated_group": result,
@@ -562,13 +1146,13 @@ def put_group(
         raise HTTPException(status_code=400, detail=f"Update failed: {str(e)}")
 
 @app.put("/classic_presentations/{id}")
-def put_presentation_classic(
+async def put_presentation_classic(
     id: int,
     body: s.PresentationClassicUpdate,
-    con: psycopg2.extensions.connection = Depends(get_db_connection)
+    con: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        result = update_presentation_classic(con, id=id,your_kahoot_id=body.your_kahoot_id,title=body.title,text=body.text,)
+        result = await update_presentation_classic(con, id=id,your_kahoot_id=body.your_kahoot_id,title=body.title,text=body.text,)
         return {
             "message": f"Presentation classic id '{id}' updated successfully",
             "updated_presentation": result,
@@ -581,13 +1165,13 @@ def put_presentation_classic(
 # ==================== PATCH ENDPOINTS (PARTIAL UPDATE) ====================
 
 @app.patch("/quizzes/true_false/{id}")
-def patch_quiz_true_false_question(
+async def patch_quiz_true_false_question(
     id: int,
     body: s.QuizTrueFalseQuestionPatch,
-    con: psycopg2.extensions.connection = Depends(get_db_connection)
+    con: psycopg.AsyncConnection = Depends(get_db_connection)
 ):
     try:
-        result = patch_question_quiz_with_true_false(con, id=id, question=body.question,)
+        result = await patch_question_quiz_with_true_false(con, id=id, question=body.question,)
         return {
             "message": f"Quiz true/false id '{id}' question updated successfully",
             "updated_quiz": result,
@@ -596,3 +1180,214 @@ def patch_quiz_true_false_question(
         raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Update failed: {str(e)}")
+
+# ==================== GAME SESSION ENDPOINTS ====================
+
+# Games run in memory in this worker (see game.py), only the final summary
+# is written to kahoot_report.
+
+MAX_LEADERBOARD_SIZE = 1000
+# the host token from POST /sessions or a player's token from joining,
+# websockets send it as the `token` query parameter instead
+GAME_TOKEN_HEADER = "X-Game-Token"
+
+def get_session(session_id):
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="No game session found with provided id.")
+    return session
+
+def get_hosted_session(session_id, token):
+    session = get_session(session_id)
+    if not session.is_host(token):
+        raise HTTPException(status_code=403, detail="A valid host token is required.")
+    return session
+
+@app.post("/sessions", status_code=201)
+async def create_session_endpoint(
+    body: s.SessionCreate,
+):
+    try:
+        rows = await question_cache.get_or_load(
+            body.your_kahoot_id, lambda: run_coalesced(read_questions_by_kahoot_id, body.your_kahoot_id)
+        )
+        written_answers = await run_with_connection(read_written_answers_by_kahoot_id, body.your_kahoot_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to load the kahoot. Error message: {e}")
+    if not rows:
+        raise HTTPException(status_code=404, detail="The kahoot has no questions to play.")
+    max_distance = WRITTEN_ANSWER_MAX_DISTANCE if body.answer_typos is None else body.answer_typos
+    questions = load_questions(rows, written_answers, body.question_time or DEFAULT_QUESTION_TIME, max_distance)
+    session = sessions.create(body.your_kahoot_id, questions)
+    return {**session.status(), "host_token": session.host_token}
+
+@app.get("/sessions/{session_id}")
+async def read_session_endpoint(session_id: int):
+    return get_session(session_id).status()
+
+@app.get("/sessions/{session_id}/leaderboard")
+async def read_leaderboard_endpoint(
+    session_id: int,
+    top: int = Query(default=10, ge=1, le=MAX_LEADERBOARD_SIZE),
+    player_id: Optional[int] = None,
+):
+    """
+    The best `top` players of a game. With `player_id`, that player's own
+    rank and score are returned as well, wherever they are placed.
+    """
+    session = get_session(session_id)
+    body = {"total_players": len(session.players), "players": session.standings(top)}
+    if player_id is not None:
+        try:
+            body["player"] = session.player_standing(player_id)
+        except GameError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+    return body
+
+@app.post("/sessions/{session_id}/players", status_code=201)
+async def join_session_endpoint(session_id: int, body: s.PlayerJoin):
+    try:
+        player = get_session(session_id).join(body.name)
+    except GameError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"player_id": player.id, "name": player.name, "token": player.token}
+
+@app.post("/sessions/{session_id}/next")
+async def next_question_endpoint(session_id: int, token: Optional[str] = Header(None, alias=GAME_TOKEN_HEADER)):
+    session = get_hosted_session(session_id, token)
+    try:
+        return session.next_question()
+    except GameError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/sessions/{session_id}/answers")
+async def submit_answer_endpoint(
+    session_id: int,
+    body: s.AnswerSubmit,
+    token: Optional[str] = Header(None, alias=GAME_TOKEN_HEADER),
+):
+    session = get_session(session_id)
+    if not session.is_player(body.player_id, token):
+        raise HTTPException(status_code=403, detail="A valid player token is required.")
+    try:
+        result = session.submit(body.player_id, body.answer)
+    except GameError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    await answer_log.put(session.answer_event(body.player_id))
+    return result
+
+@app.post("/sessions/{session_id}/reveal")
+async def reveal_answer_endpoint(session_id: int, token: Optional[str] = Header(None, alias=GAME_TOKEN_HEADER)):
+    session = get_hosted_session(session_id, token)
+    try:
+        return session.close_question()
+    except GameError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/sessions/{session_id}/finish")
+async def finish_session_endpoint(
+    session_id: int,
+    token: Optional[str] = Header(None, alias=GAME_TOKEN_HEADER),
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    """
+    Ends the game and saves its kahoot_report. If saving fails the finished
+    session stays around (see SessionRegistry.reap) and the call can be
+    retried, the summary is the same every time.
+    """
+    session = get_hosted_session(session_id, token)
+    if session.state != "finished":
+        try:
+            session.finish()
+        except GameError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    summary = session.summary()
+    # best effort, answers that can't be written yet stay buffered for retry
+    await answer_log.flush()
+    try:
+        report = await create_kahoot_report(connection, **summary)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to save the kahoot report. Error message: {e}")
+    sessions.remove(session_id)
+    return report
+
+@app.get("/games/{game_id}/report")
+async def read_game_report_endpoint(
+    game_id: UUID,
+    connection: psycopg.AsyncConnection = Depends(get_db_connection)
+):
+    """
+    A finished game's report values rebuilt from its answers in game_answers.
+    """
+    try:
+        report = await read_game_report(connection, game_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the game report. Error message: {e}")
+    if report is None:
+        raise HTTPException(status_code=404, detail="No answers found for the provided game id.")
+    return report
+
+@app.websocket("/sessions/{session_id}/ws")
+async def session_socket_endpoint(
+    websocket: WebSocket,
+    session_id: int,
+    player_id: Optional[int] = None,
+    token: Optional[str] = None,
+):
+    """
+    Live channel of a game. Messages are {"type": ..., "data": ...}. Every
+    socket gets the session's question, reveal and finished events plus a
+    ping every few seconds, which it should answer with {"type": "pong"}.
+    Players connect with their player_id and token, send
+    {"type": "answer", "answer": ...} and get their result back on the same
+    socket. The host connects with the host token and can send
+    {"type": "next"} and {"type": "reveal"}. Without either the socket only
+    watches.
+    """
+    session = sessions.get(session_id)
+    if session is None or (player_id is not None and player_id not in session.players):
+        await websocket.close(code=NOT_FOUND_CLOSE_CODE)
+        return
+    if player_id is not None:
+        allowed = session.is_player(player_id, token)
+    else:
+        allowed = token is None or session.is_host(token)
+    if not allowed:
+        await websocket.close(code=FORBIDDEN_CLOSE_CODE)
+        return
+    host = player_id is None and token is not None
+    await websocket.accept()
+    room = rooms.get(session)
+    connection = room.connect(websocket)
+    connection.offer(json.dumps({"type": "state", "data": session.status()}))
+
+    async def handle(message):
+        kind = message.get("type") if isinstance(message, dict) else None
+        try:
+            if kind == "pong":
+                return
+            if kind == "answer" and player_id is not None:
+                try:
+                    answer = s.AnswerMessage.model_validate(message).answer
+                except ValidationError:
+                    raise GameError("Answers must be true/false or text of at most 255 characters")
+                result = session.submit(player_id, answer)
+                await answer_log.put(session.answer_event(player_id))
+                connection.offer(json.dumps({"type": "answer_result", "data": result}))
+            elif kind == "next" and host:
+                session.next_question()
+            elif kind == "reveal" and host:
+                session.close_question()
+            else:
+                raise GameError(f"Unsupported message type '{kind}'")
+        except GameError as e:
+            connection.offer(json.dumps({"type": "error", "data": {"detail": str(e)}}))
+
+    try:
+        await serve_connection(connection, handle)
+    finally:
+        room.disconnect(connection)
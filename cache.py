@@ -0,0 +1,95 @@
+import os
+import time
+from collections import OrderedDict
+
+# Bounded in-process caches. A TTLCache evicts the least recently used entry
+# once it holds `maxsize` entries, and entries older than `ttl` seconds are
+# treated as misses, which bounds staleness if an invalidation is ever missed.
+
+QUESTION_CACHE_SIZE = int(os.getenv("QUESTION_CACHE_SIZE", "1024"))
+QUESTION_CACHE_TTL = float(os.getenv("QUESTION_CACHE_TTL", "30"))
+# NOTIFY channel carrying the id of a kahoot whose items changed
+QUESTIONS_CHANNEL = "kahoot_questions_changed"
+
+
+class TTLCache:
+    """
+    LRU cache with a per-entry time to live and hit/miss counters.
+
+    Args:
+        maxsize: Maximum number of entries kept.
+        ttl: Seconds an entry stays valid.
+        clock: Monotonic time function, replaceable in tests.
+    """
+
+    def __init__(self, maxsize, ttl, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        # bumped on every invalidation, loads that raced with one aren't stored
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+            self.expirations += 1
+        self.misses += 1
+        return default
+
+    def set(self, key, value):
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *keys):
+        self._version += 1
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self, *_):
+        self._version += 1
+        self._entries.clear()
+
+    async def get_or_load(self, key, load):
+        """
+        Return the cached value for `key`, or await `load()` and cache it.
+
+        The loaded value is not stored if an invalidation happened while it
+        was loading, since it may predate the change.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+        version = self._version
+        value = await load()
+        if version == self._version:
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+question_cache = TTLCache(maxsize=QUESTION_CACHE_SIZE, ttl=QUESTION_CACHE_TTL)
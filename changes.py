@@ -0,0 +1,101 @@
+import base64
+import json
+import os
+
+# Helpers for the change feed (GET /changes). The feed reads change_log, which
+# triggers fill for the tables below (see migrations.py). A token marks a
+# position in the log as (txid, id) of the last entry the client has seen;
+# entries are handed out in that order and only once their transaction has
+# finished, so a transaction that commits late can't slip behind a token.
+
+# each change carries the row's current columns, limited to the fieldsets.py
+# whitelist of its table so users.password never leaves the database
+CHANGE_FEED_TABLES = ("your_kahoot", "users", "groups")
+
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 5000
+
+# entries older than this are deleted every CHANGE_LOG_PRUNE_INTERVAL
+# seconds; a client that comes back with an older token gets a 410 and
+# has to refetch the lists and start the feed again
+CHANGE_LOG_RETENTION = float(os.getenv("CHANGE_LOG_RETENTION_DAYS", "7")) * 86400
+CHANGE_LOG_PRUNE_INTERVAL = 3600
+
+
+def encode_change_token(txid, last_id):
+    """
+    Turn a change log position into an opaque token.
+
+    Args:
+        txid: Transaction id of the last entry seen, or the watermark.
+        last_id: change_log id of the last entry seen, 0 at a watermark.
+
+    Returns:
+        A url-safe string the client sends back as `since`.
+    """
+    raw = json.dumps({"txid": txid, "id": last_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_change_token(token):
+    """
+    Turn a token produced by `encode_change_token` back into a position.
+
+    Args:
+        token: The `since` value sent by the client, or None for the start
+            of the log.
+
+    Returns:
+        A tuple (txid, id).
+
+    Raises:
+        ValueError: If the token is malformed.
+    """
+    if not token:
+        return 0, 0
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded))
+        txid, last_id = position["txid"], position["id"]
+    except Exception:
+        raise ValueError("Invalid change token")
+    if not all(isinstance(value, int) and value >= 0 for value in (txid, last_id)):
+        raise ValueError("Invalid change token")
+    return txid, last_id
+
+
+def parse_tables(tables=None):
+    """
+    Validate a comma separated `tables` query value.
+
+    Returns:
+        A tuple of table names, every feed table when `tables` is empty.
+
+    Raises:
+        ValueError: If a table is not part of the feed.
+    """
+    if not tables:
+        return CHANGE_FEED_TABLES
+    requested = {name.strip() for name in tables.split(",") if name.strip()}
+    unknown = requested - set(CHANGE_FEED_TABLES)
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}. Allowed tables: {', '.join(CHANGE_FEED_TABLES)}")
+    return tuple(name for name in CHANGE_FEED_TABLES if name in requested)
+
+
+def next_change_token(rows, limit, watermark):
+    """
+    Work out where the next request continues.
+
+    Args:
+        rows: Entries returned for this request, ordered by (txid, id).
+        limit: Requested page size.
+        watermark: Oldest transaction still running when the page was read.
+
+    Returns:
+        A tuple (token, has_more). A full page continues after its last
+        entry, otherwise the client is caught up to the watermark.
+    """
+    if len(rows) >= limit:
+        return encode_change_token(rows[-1]["txid"], rows[-1]["id"]), True
+    return encode_change_token(watermark, 0), False
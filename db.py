@@ -3,6 +3,27 @@ from fastapi import HTTPException
 from psycopg2 import DatabaseError
 from psycopg2.extras import RealDictCursor
 
+from cache import QUESTIONS_CHANNEL
+from events import EVENTS_CHANNEL, event_payload
+from lookup_cache import LOOKUP_CHANNEL
+
+
+def notify_questions_changed(cur, *kahoot_ids):
+    """
+    Queues a NOTIFY for every kahoot whose questions or slides changed, sent
+    on commit so the API workers drop their cached question sets (see cache.py).
+    """
+    for kahoot_id in {kahoot_id for kahoot_id in kahoot_ids if kahoot_id is not None}:
+        cur.execute("SELECT pg_notify(%s, %s)", (QUESTIONS_CHANNEL, str(kahoot_id)))
+
+
+def notify_list_changed(cur, table, event, row_id):
+    """
+    Queues a NOTIFY for the live update streams (see events.py), sent on
+    commit so rolled back writes never reach a client.
+    """
+    cur.execute("SELECT pg_notify(%s, %s)", (EVENTS_CHANNEL, event_payload(table, event, row_id)))
+
 
 def create_subscriptions(con, name):
     query = """
@@ -15,6 +36,8 @@ def create_subscriptions(con, name):
             with con.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(query, (name,))
                 result = cur.fetchone()
+                # delivered on commit, tells every worker to drop its cached copy
+                cur.execute("SELECT pg_notify(%s, %s)", (LOOKUP_CHANNEL, "subscriptions"))
                 return result
     except psycopg2.errors.UniqueViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to insert the subscription name. Error message: {e}")
@@ -30,6 +53,8 @@ def create_languages(con, name):
             with con.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(query, (name,))
                 result = cur.fetchone()
+                # delivered on commit, tells every worker to drop its cached copy
+                cur.execute("SELECT pg_notify(%s, %s)", (LOOKUP_CHANNEL, "languages"))
                 return result
     except psycopg2.errors.UniqueViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to insert the language name. Error message: {e}")
@@ -45,6 +70,8 @@ def create_customer_types(con, name):
             with con.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(query, (name,))
                 result = cur.fetchone()
+                # delivered on commit, tells every worker to drop its cached copy
+                cur.execute("SELECT pg_notify(%s, %s)", (LOOKUP_CHANNEL, "customer_types"))
                 return result
     except psycopg2.errors.UniqueViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to insert the customer type name. Error message: {e}")
@@ -60,6 +87,7 @@ def create_users(con, username, email, password, birthdate, subscriptions_id, la
             with con.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(query, (username, email, password, birthdate, subscriptions_id, language_id, customer_type_id, name, organisation,))
                 result = cur.fetchone()
+                notify_list_changed(cur, "users", "create", result["id"])
                 return result
     except psycopg2.errors.UniqueViolation as e:
         raise HTTPException(status_code=409, detail=f"Unable to insert the user. Error message: {e}")
@@ -77,6 +105,7 @@ def create_your_kahoot(con, title, language_id, description=None, is_private=Fal
             with con.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(query, (title, language_id, description, is_private))
                 result = cur.fetchone()
+                notify_list_changed(cur, "your_kahoot", "create", result["id"])
                 return result
     except psycopg2.errors.UniqueViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to create the kahoot. Error message: {e}")
@@ -128,6 +157,7 @@ def create_groups(con, name, description=None):
             with con.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(query, (name, description))
                 result = cur.fetchone()
+                notify_list_changed(cur, "groups", "create", result["id"])
                 return result
     except psycopg2.errors.UniqueViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to create the group. Error message: {e}")
@@ -162,6 +192,7 @@ def create_written_quiz(con, question, your_kahoot_id):
             with con.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(query, (question, your_kahoot_id))
                 result = cur.fetchone()
+                notify_questions_changed(cur, result["your_kahoot_id"])
                 return result
     except psycopg2.errors.UniqueViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to create the quiz. Error message: {e}")
@@ -196,6 +227,7 @@ def create_true_false_quiz(con, question, answer, your_kahoot_id):
             with con.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(query, (question, answer, your_kahoot_id))
                 result = cur.fetchone()
+                notify_questions_changed(cur, result["your_kahoot_id"])
                 return result
     except psycopg2.errors.UniqueViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to create the quiz. Error message: {e}")
@@ -213,46 +245,56 @@ def create_presentation_classic(con, your_kahoot_id, title=None, text=None):
             with con.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(query, (title, text, your_kahoot_id))
                 result = cur.fetchone()
+                notify_questions_changed(cur, result["your_kahoot_id"])
                 return result
     except psycopg2.errors.UniqueViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to create the presenation. Error message: {e}")
     except psycopg2.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to create the presentation. Error message: {e}")
 
-def read_all_users(con):
+def read_all_users(con, limit=None, after_id=0):
     query = """
-    SELECT * FROM users;
+    SELECT * FROM users
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s;
     """
     try:
         with con:
             with con.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(query)
+                cur.execute(query, (after_id, limit))
                 result = cur.fetchall()
                 return result
     except DatabaseError as e:
         raise HTTPException(status_code=400, detail=f"Unable to read the users data. Error message: {e}")
 
-def read_all_kahoots(con):
+def read_all_kahoots(con, limit=None, after_id=0):
     query = """
-    SELECT * FROM your_kahoot;
+    SELECT * FROM your_kahoot
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s;
     """
     try:
         with con:
             with con.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(query)
+                cur.execute(query, (after_id, limit))
                 result = cur.fetchall()
                 return result
     except DatabaseError as e:
         raise HTTPException(status_code=400, detail=f"Unable to read the kahoots. Error message: {e}")
 
-def read_all_groups(con):
+def read_all_groups(con, limit=None, after_id=0):
     query = """
-    SELECT * FROM groups;
+    SELECT * FROM groups
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s;
     """
     try:
         with con:
             with con.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(query)
+                cur.execute(query, (after_id, limit))
                 result = cur.fetchall()
                 return result
     except DatabaseError as e:
@@ -357,40 +399,35 @@ def read_individual_user(con, primary_key_id):
 def read_questions_by_kahoot_id(con, kahoot_id):
     """
     Fetches True/False, Written Questions, and Slides for a specific Kahoot
-    and combines them into a single list.
+    in one query. Every row has the same keys (position, id, type, question,
+    answer, text) and they come back True/False first, then Written, then
+    Slides, each by id.
+    """
+    query = """
+    SELECT
+        ROW_NUMBER() OVER (ORDER BY kind, id)::int AS position,
+        id, type, question, answer, text
+    FROM (
+        SELECT 1 AS kind, id, 'True/False' AS type, question, answer, NULL::varchar AS text
+        FROM quiz_with_true_false
+        WHERE your_kahoot_id = %(kahoot_id)s
+        UNION ALL
+        SELECT 2, id, 'Written', question, NULL, NULL
+        FROM quiz_with_written_answer
+        WHERE your_kahoot_id = %(kahoot_id)s
+        UNION ALL
+        SELECT 3, id, 'Slide', title, NULL, text
+        FROM presentation_classic
+        WHERE your_kahoot_id = %(kahoot_id)s
+    ) AS items
+    ORDER BY kind, id;
     """
-    questions = []
-    
     try:
         with con:
             with con.cursor(cursor_factory=RealDictCursor) as cur:
-                
-                # 1. Get True/False Questions
-                cur.execute("""
-                    SELECT id, question, 'True/False' as type, answer 
-                    FROM quiz_with_true_false 
-                    WHERE your_kahoot_id = %s
-                """, (kahoot_id,))
-                questions.extend(cur.fetchall())
-
-                # 2. Get Written Questions (Stems)
-                cur.execute("""
-                    SELECT id, question, 'Written' as type 
-                    FROM quiz_with_written_answer 
-                    WHERE your_kahoot_id = %s
-                """, (kahoot_id,))
-                questions.extend(cur.fetchall())
-
-                # 3. Get Slides (Presentation)
-                cur.execute("""
-                    SELECT id, title as question, 'Slide' as type, text 
-                    FROM presentation_classic 
-                    WHERE your_kahoot_id = %s
-                """, (kahoot_id,))
-                questions.extend(cur.fetchall())
-                
-                return questions
-
+                cur.execute(query, {"kahoot_id": kahoot_id})
+                result = cur.fetchall()
+                return result
     except DatabaseError as e:
         raise HTTPException(status_code=400, detail=f"Error fetching questions: {e}")
 
@@ -407,6 +444,7 @@ def delete_group_by_id(con, group_id):
                 result = cur.fetchone()
                 if result is None:
                     raise HTTPException(status_code=404, detail="Group not found, no deletion could be made")
+                notify_list_changed(cur, "groups", "delete", result["id"])
                 return result
     except psycopg2.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to delete the group. Error message: {e}")
@@ -424,6 +462,7 @@ def delete_user_by_username(con, username):
                 result = cur.fetchone()
                 if result is None:
                     raise HTTPException(status_code=404, detail="User not found, no deletion could be made")
+                notify_list_changed(cur, "users", "delete", result["id"])
                 return result
     except psycopg2.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to delete the user. Error message: {e}")
@@ -441,6 +480,8 @@ def delete_your_kahoot_by_id(con, your_kahoot_id):
                 result = cur.fetchone()
                 if result is None:
                     raise HTTPException(status_code=404, detail="Kahoot id not found, no deletion could be made")
+                notify_questions_changed(cur, result["id"])
+                notify_list_changed(cur, "your_kahoot", "delete", result["id"])
                 return result
     except psycopg2.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to delete the Kahoot with that id. Error message: {e}")
@@ -458,6 +499,7 @@ def delete_quiz_question_with_written_answer(con, quiz_with_written_answer_id):
                 result = cur.fetchone()
                 if result is None:
                     raise HTTPException(status_code=404, detail="Quiz question not found, no deletion could be made")
+                notify_questions_changed(cur, result["your_kahoot_id"])
                 return result
     except psycopg2.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to delete the Quiz question with that id. Error message: {e}")
@@ -492,16 +534,18 @@ def delete_quiz_with_true_false(con, quiz_with_true_false_id):
                 result = cur.fetchone()
                 if result is None:
                     raise HTTPException(status_code=404, detail="Quiz answer not found, no deletion could be made")
+                notify_questions_changed(cur, result["your_kahoot_id"])
                 return result
     except psycopg2.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to delete the Quiz answer with that id. Error message: {e}")
 
 def update_quiz_with_true_false(con, id, question, answer, your_kahoot_id):
     query = """
-    UPDATE quiz_with_true_false 
+    UPDATE quiz_with_true_false AS item
     SET question = %s, answer = %s, your_kahoot_id = %s
-    WHERE id = %s
-    RETURNING id, question, answer, your_kahoot_id;
+    FROM (SELECT id, your_kahoot_id FROM quiz_with_true_false WHERE id = %s FOR UPDATE) AS old
+    WHERE item.id = old.id
+    RETURNING item.id, item.question, item.answer, item.your_kahoot_id, old.your_kahoot_id AS old_kahoot_id;
     """
     try:
         with con:
@@ -510,6 +554,7 @@ def update_quiz_with_true_false(con, id, question, answer, your_kahoot_id):
                 result = cur.fetchone()
                 if result is None:
                     raise HTTPException(status_code=404, detail="Quiz answer/question id not found, no update could be made")
+                notify_questions_changed(cur, result.pop("old_kahoot_id"), result["your_kahoot_id"])
                 return result
     except psycopg2.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=400, detail=f"Quiz answer/question id not found, no update could be made. Error message: {e}")
@@ -534,10 +579,11 @@ def update_quiz_answer_with_written_answer(con, id, quiz_with_written_answer_id,
 
 def update_quiz_question_with_written_answer(con, id, question, your_kahoot_id):
     query = """
-    UPDATE quiz_with_written_answer
+    UPDATE quiz_with_written_answer AS item
     SET question = %s, your_kahoot_id = %s
-    WHERE id = %s
-    RETURNING id, question, your_kahoot_id;
+    FROM (SELECT id, your_kahoot_id FROM quiz_with_written_answer WHERE id = %s FOR UPDATE) AS old
+    WHERE item.id = old.id
+    RETURNING item.id, item.question, item.your_kahoot_id, old.your_kahoot_id AS old_kahoot_id;
     """
     try:
         with con:
@@ -546,6 +592,7 @@ def update_quiz_question_with_written_answer(con, id, question, your_kahoot_id):
                 result = cur.fetchone()
                 if result is None:
                     raise HTTPException(status_code=404, detail="Quiz question not found, no update could be made")
+                notify_questions_changed(cur, result.pop("old_kahoot_id"), result["your_kahoot_id"])
                 return result
     except psycopg2.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to update the Quiz question with that id. Error message: {e}")
@@ -564,6 +611,7 @@ def update_your_kahoot_by(con, your_kahoot_id, title, description, is_private, l
                 result = cur.fetchone()
                 if result is None:
                     raise HTTPException(status_code=404, detail="Kahoot id not found, no update could be made")
+                notify_list_changed(cur, "your_kahoot", "update", result["id"])
                 return result
     except psycopg2.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to update the Kahoot with that id. Error message: {e}")
@@ -582,22 +630,26 @@ def update_groups(con, id, name, description):
                 result = cur.fetchone()
                 if result is None:
                     raise HTTPException(status_code=404, detail="Group not found, no update could be made")
+                notify_list_changed(cur, "groups", "update", result["id"])
                 return result
     except psycopg2.errors.ForeignKeyViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to update the user. Error message: {e}")
 
 def update_presentation_classic(con, id, your_kahoot_id, title=None, text=None):
     query = """
-    UPDATE presentation_classic 
-    SET title = %s, text = %s, your_kahoot_id = %s 
-    WHERE id = %s
-    RETURNING *;
+    UPDATE presentation_classic AS item
+    SET title = %s, text = %s, your_kahoot_id = %s
+    FROM (SELECT id, your_kahoot_id FROM presentation_classic WHERE id = %s FOR UPDATE) AS old
+    WHERE item.id = old.id
+    RETURNING item.*, old.your_kahoot_id AS old_kahoot_id;
     """
     try:
         with con:
             with con.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(query, (title, text, your_kahoot_id, id))
                 result = cur.fetchone()
+                if result is not None:
+                    notify_questions_changed(cur, result.pop("old_kahoot_id"), result["your_kahoot_id"])
                 return result
     except psycopg2.errors.UniqueViolation as e:
         raise HTTPException(status_code=400, detail=f"Unable to update the presenation. Error message: {e}")
@@ -618,6 +670,7 @@ def patch_question_quiz_with_true_false(con, id, question):
                 result = cur.fetchone()
                 if result is None:
                     raise HTTPException(status_code=404, detail="Quiz answer/question id not found, no update could be made")
+                notify_questions_changed(cur, result["your_kahoot_id"])
                 return result
     except DatabaseError as e:
         raise HTTPException(status_code=400, detail=f"Database error while updating quiz. Error message: {e}")
@@ -0,0 +1,1546 @@
+# Async counterparts of the functions in db.py, used by the endpoints in app.py.
+# db.py stays the blocking version for scripts such as db_setup.py and
+# tests/example_crud.py. Queries and error handling follow db.py, functions
+# only the API needs (e.g. the export streams) live here alone.
+import psycopg
+from fastapi import HTTPException
+from psycopg import DatabaseError, sql
+from psycopg.rows import dict_row
+
+from cache import QUESTIONS_CHANNEL, question_cache
+from changes import CHANGE_FEED_TABLES
+from events import EVENTS_CHANNEL, event_payload
+from fieldsets import FIELDSETS
+from lookup_cache import LOOKUP_CHANNEL, LOOKUP_TABLES
+
+# rows fetched per round trip by the server-side cursors used for exports
+STREAM_ITERSIZE = 2000
+
+
+async def notify_questions_changed(cur, *kahoot_ids):
+    """
+    Queues a NOTIFY for every kahoot whose questions or slides changed. Sent on
+    commit, so other workers drop their cached question sets (see cache.py);
+    the writing worker invalidates its own cache right after the commit.
+    """
+    for kahoot_id in {kahoot_id for kahoot_id in kahoot_ids if kahoot_id is not None}:
+        await cur.execute("SELECT pg_notify(%s, %s)", (QUESTIONS_CHANNEL, str(kahoot_id)))
+
+
+async def notify_list_changed(cur, table, event, row_id):
+    """
+    Queues a NOTIFY for the live update streams (see events.py), sent on
+    commit so rolled back writes never reach a client.
+    """
+    await cur.execute("SELECT pg_notify(%s, %s)", (EVENTS_CHANNEL, event_payload(table, event, row_id)))
+
+
+async def create_subscriptions(con, name):
+    query = """
+    INSERT INTO subscriptions (name)
+    VALUES (%s)
+    RETURNING name;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (name,))
+                result = await cur.fetchone()
+                # delivered on commit, tells every worker to drop its cached copy
+                await cur.execute("SELECT pg_notify(%s, %s)", (LOOKUP_CHANNEL, "subscriptions"))
+                return result
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to insert the subscription name. Error message: {e}")
+
+async def create_languages(con, name):
+    query = """
+    INSERT INTO languages (name)
+    VALUES (%s)
+    RETURNING name;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (name,))
+                result = await cur.fetchone()
+                # delivered on commit, tells every worker to drop its cached copy
+                await cur.execute("SELECT pg_notify(%s, %s)", (LOOKUP_CHANNEL, "languages"))
+                return result
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to insert the language name. Error message: {e}")
+
+async def create_customer_types(con, name):
+    query = """
+    INSERT INTO customer_types (name)
+    VALUES (%s)
+    RETURNING name;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (name,))
+                result = await cur.fetchone()
+                # delivered on commit, tells every worker to drop its cached copy
+                await cur.execute("SELECT pg_notify(%s, %s)", (LOOKUP_CHANNEL, "customer_types"))
+                return result
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to insert the customer type name. Error message: {e}")
+
+async def create_users(con, username, email, password, birthdate, subscriptions_id, language_id, customer_type_id, name=None, organisation=None):
+    query = """
+    INSERT INTO users (username, email, password, birthdate, subscriptions_id, language_id, customer_type_id, name, organisation) 
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    RETURNING id, username, email;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (username, email, password, birthdate, subscriptions_id, language_id, customer_type_id, name, organisation,))
+                result = await cur.fetchone()
+                await notify_list_changed(cur, "users", "create", result["id"])
+                return result
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=409, detail=f"Unable to insert the user. Error message: {e}")
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=404, detail=f"Unable to insert the user. Error message: {e}")
+
+async def create_your_kahoot(con, title, language_id, description=None, is_private=False):
+    query = """
+    INSERT INTO your_kahoot (title, language_id, description, is_private) 
+    VALUES (%s, %s, %s, %s)
+    RETURNING id, title;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (title, language_id, description, is_private))
+                result = await cur.fetchone()
+                await notify_list_changed(cur, "your_kahoot", "create", result["id"])
+                return result
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the kahoot. Error message: {e}")
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the kahoot. Error message: {e}")
+
+async def create_kahoot_owners(con, users_id, your_kahoot_id):
+    query = """
+    INSERT INTO kahoot_owners (users_id, your_kahoot_id) 
+    VALUES (%s, %s)
+    RETURNING id, users_id, your_kahoot_id;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (users_id, your_kahoot_id))
+                result = await cur.fetchone()
+                return result
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the kahoot ownership. Error message: {e}")
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the kahoot ownership. Error message: {e}")
+
+async def create_favorite_kahoots(con, users_id, your_kahoot_id):
+    query = """
+    INSERT INTO favorite_kahoots (users_id, your_kahoot_id) 
+    VALUES (%s, %s)
+    RETURNING id, users_id, your_kahoot_id;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (users_id, your_kahoot_id))
+                result = await cur.fetchone()
+                return result
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=409, detail=f"Unable to create favorite kahoot. Error message: {e}")
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=404, detail=f"Unable to create favorite kahoot. Error message: {e}")
+
+async def create_groups(con, name, description=None):
+    query = """
+    INSERT INTO groups (name, description) 
+    VALUES (%s, %s)
+    RETURNING id, name;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (name, description))
+                result = await cur.fetchone()
+                await notify_list_changed(cur, "groups", "create", result["id"])
+                return result
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the group. Error message: {e}")
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the group. Error message: {e}")
+
+async def create_user_group_members(con, user_id, group_id):
+    query = """
+    INSERT INTO user_group_members (user_id, group_id) 
+    VALUES (%s, %s)
+    RETURNING id, user_id, group_id;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (user_id, group_id))
+                result = await cur.fetchone()
+                return result
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the group membership. Error message: {e}")
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the group membership. Error message: {e}")
+
+async def create_written_quiz(con, question, your_kahoot_id):
+    query = """
+    INSERT INTO quiz_with_written_answer (question, your_kahoot_id) 
+    VALUES (%s, %s)
+    RETURNING *;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (question, your_kahoot_id))
+                result = await cur.fetchone()
+                await notify_questions_changed(cur, result["your_kahoot_id"])
+        question_cache.invalidate(result["your_kahoot_id"])
+        return result
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the quiz. Error message: {e}")
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the quiz. Error message: {e}")
+
+async def create_answer_quiz(con, answer, quiz_with_written_answer_id):
+    query = """
+    INSERT INTO quiz_written_answer (answer, quiz_with_written_answer_id) 
+    VALUES (%s, %s)
+    RETURNING *;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (answer, quiz_with_written_answer_id))
+                result = await cur.fetchone()
+                return result
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the quiz answer. Error message: {e}")
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the quiz answer. Error message: {e}")
+
+async def create_true_false_quiz(con, question, answer, your_kahoot_id):
+    query = """
+    INSERT INTO quiz_with_true_false (question, answer, your_kahoot_id)
+    VALUES (%s, %s, %s)
+    RETURNING *;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (question, answer, your_kahoot_id))
+                result = await cur.fetchone()
+                await notify_questions_changed(cur, result["your_kahoot_id"])
+        question_cache.invalidate(result["your_kahoot_id"])
+        return result
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the quiz. Error message: {e}")
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the quiz. Error message: {e}")
+
+async def create_presentation_classic(con, your_kahoot_id, title=None, text=None):
+    query = """
+    INSERT INTO presentation_classic (title, text, your_kahoot_id)
+    VALUES (%s, %s, %s)
+    RETURNING *;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (title, text, your_kahoot_id))
+                result = await cur.fetchone()
+                await notify_questions_changed(cur, result["your_kahoot_id"])
+        question_cache.invalidate(result["your_kahoot_id"])
+        return result
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the presenation. Error message: {e}")
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to create the presentation. Error message: {e}")
+
+async def import_your_kahoot(con, kahoot):
+    """
+    Creates a kahoot with all of its questions, written answers, slides and
+    optionally its owner in one transaction, so either everything is saved
+    or nothing is. Each child table is filled with one INSERT ... SELECT FROM
+    unnest(...), so the number of statements doesn't grow with the kahoot.
+
+    Args:
+        con: An async database connection.
+        kahoot: Dict shaped like schemas.YourKahootImport.
+
+    Returns:
+        A dict with the new kahoot's `id` and `title` and how many rows of
+        each kind were created.
+    """
+    written = kahoot["written"]
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute("""
+                INSERT INTO your_kahoot (title, language_id, description, is_private)
+                VALUES (%s, %s, %s, %s)
+                RETURNING id, title;
+                """, (kahoot["title"], kahoot["language_id"], kahoot["description"], kahoot["is_private"]))
+                result = await cur.fetchone()
+                kahoot_id = result["id"]
+
+                if kahoot["owner_id"] is not None:
+                    await cur.execute(
+                        "INSERT INTO kahoot_owners (users_id, your_kahoot_id) VALUES (%s, %s);",
+                        (kahoot["owner_id"], kahoot_id),
+                    )
+
+                if kahoot["true_false"]:
+                    await cur.execute("""
+                    INSERT INTO quiz_with_true_false (question, answer, your_kahoot_id)
+                    SELECT question, answer, %s
+                    FROM unnest(%s::varchar[], %s::boolean[]) WITH ORDINALITY AS input(question, answer, input_position)
+                    ORDER BY input_position;
+                    """, (kahoot_id, [q["question"] for q in kahoot["true_false"]], [q["answer"] for q in kahoot["true_false"]]))
+
+                answer_count = 0
+                if written:
+                    # ids are taken from the sequence up front so the answers can
+                    # reference their question without matching rows back up
+                    await cur.execute(
+                        "SELECT nextval(pg_get_serial_sequence('quiz_with_written_answer', 'id'))::int AS id FROM generate_series(1, %s);",
+                        (len(written),),
+                    )
+                    question_ids = [row["id"] for row in await cur.fetchall()]
+                    await cur.execute("""
+                    INSERT INTO quiz_with_written_answer (id, question, your_kahoot_id)
+                    SELECT id, question, %s
+                    FROM unnest(%s::int[], %s::varchar[]) AS input(id, question)
+                    ORDER BY id;
+                    """, (kahoot_id, question_ids, [q["question"] for q in written]))
+
+                    answers = [(question_id, answer) for question_id, q in zip(question_ids, written) for answer in q["answers"]]
+                    answer_count = len(answers)
+                    if answers:
+                        await cur.execute("""
+                        INSERT INTO quiz_written_answer (quiz_with_written_answer_id, answer)
+                        SELECT question_id, answer
+                        FROM unnest(%s::int[], %s::varchar[]) WITH ORDINALITY AS input(question_id, answer, input_position)
+                        ORDER BY input_position;
+                        """, ([a[0] for a in answers], [a[1] for a in answers]))
+
+                if kahoot["slides"]:
+                    await cur.execute("""
+                    INSERT INTO presentation_classic (title, text, your_kahoot_id)
+                    SELECT title, text, %s
+                    FROM unnest(%s::varchar[], %s::varchar[]) WITH ORDINALITY AS input(title, text, input_position)
+                    ORDER BY input_position;
+                    """, (kahoot_id, [slide["title"] for slide in kahoot["slides"]], [slide["text"] for slide in kahoot["slides"]]))
+
+                await notify_list_changed(cur, "your_kahoot", "create", kahoot_id)
+                await notify_questions_changed(cur, kahoot_id)
+        question_cache.invalidate(kahoot_id)
+        return {
+            "id": kahoot_id,
+            "title": result["title"],
+            "true_false": len(kahoot["true_false"]),
+            "written": len(written),
+            "written_answers": answer_count,
+            "slides": len(kahoot["slides"]),
+        }
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=404, detail=f"Unable to import the kahoot, foreign key violation. Error message: {e}")
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=409, detail=f"Unable to import the kahoot. Error message: {e}")
+
+CLONE_KAHOOT_QUERY = """
+    WITH new_kahoot AS (
+        INSERT INTO your_kahoot (title, description, is_private, language_id)
+        SELECT COALESCE(%(title)s, title), description, is_private, language_id
+        FROM your_kahoot
+        WHERE id = %(source_id)s
+        RETURNING id, title
+    ),
+    true_false AS (
+        INSERT INTO quiz_with_true_false (question, answer, your_kahoot_id)
+        SELECT q.question, q.answer, new_kahoot.id
+        FROM quiz_with_true_false AS q, new_kahoot
+        WHERE q.your_kahoot_id = %(source_id)s
+        ORDER BY q.id
+        RETURNING id
+    ),
+    -- new ids are drawn up front so the answers can be pointed at their copied question
+    written_source AS (
+        SELECT w.id AS old_id, w.question, nextval(pg_get_serial_sequence('quiz_with_written_answer', 'id'))::int AS new_id
+        FROM quiz_with_written_answer AS w
+        WHERE w.your_kahoot_id = %(source_id)s AND EXISTS (SELECT 1 FROM new_kahoot)
+    ),
+    written AS (
+        INSERT INTO quiz_with_written_answer (id, question, your_kahoot_id)
+        SELECT ws.new_id, ws.question, new_kahoot.id
+        FROM written_source AS ws, new_kahoot
+        ORDER BY ws.old_id
+        RETURNING id
+    ),
+    written_answers AS (
+        INSERT INTO quiz_written_answer (answer, quiz_with_written_answer_id)
+        SELECT a.answer, ws.new_id
+        FROM quiz_written_answer AS a
+        JOIN written_source AS ws ON a.quiz_with_written_answer_id = ws.old_id
+        ORDER BY a.id
+        RETURNING id
+    ),
+    slides AS (
+        INSERT INTO presentation_classic (title, text, your_kahoot_id)
+        SELECT p.title, p.text, new_kahoot.id
+        FROM presentation_classic AS p, new_kahoot
+        WHERE p.your_kahoot_id = %(source_id)s
+        ORDER BY p.id
+        RETURNING id
+    ),
+    surveys AS (
+        INSERT INTO survey_open_question (question, answer_text, your_kahoot_id)
+        SELECT q.question, q.answer_text, new_kahoot.id
+        FROM survey_open_question AS q, new_kahoot
+        WHERE q.your_kahoot_id = %(source_id)s
+        ORDER BY q.id
+        RETURNING id
+    ),
+    owners AS (
+        INSERT INTO kahoot_owners (users_id, your_kahoot_id)
+        SELECT owner.users_id, new_kahoot.id
+        FROM new_kahoot, (
+            SELECT %(owner_id)s::int AS users_id
+            WHERE %(owner_id)s::int IS NOT NULL
+            UNION
+            SELECT users_id FROM kahoot_owners
+            WHERE your_kahoot_id = %(source_id)s AND users_id IS NOT NULL AND %(owner_id)s::int IS NULL
+        ) AS owner
+        RETURNING users_id
+    )
+    SELECT
+        new_kahoot.id,
+        new_kahoot.title,
+        (SELECT count(*) FROM true_false)::int AS true_false,
+        (SELECT count(*) FROM written)::int AS written,
+        (SELECT count(*) FROM written_answers)::int AS written_answers,
+        (SELECT count(*) FROM slides)::int AS slides,
+        (SELECT count(*) FROM surveys)::int AS surveys,
+        (SELECT array_agg(users_id ORDER BY users_id) FROM owners) AS owners
+    FROM new_kahoot;
+    """
+
+async def clone_your_kahoot(con, your_kahoot_id, title=None, owner_id=None):
+    """
+    Copies a kahoot with its questions, written answers, slides and surveys
+    inside Postgres with one INSERT ... SELECT statement, so the cost is a
+    single round trip however big the kahoot is. The copy is owned by
+    `owner_id`, or by the original's owners when it is None.
+
+    Returns:
+        A dict with the new kahoot's `id`, `title`, the number of copied rows
+        of each kind and its `owners`, or None if the kahoot doesn't exist.
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(CLONE_KAHOOT_QUERY, {"source_id": your_kahoot_id, "title": title, "owner_id": owner_id})
+                result = await cur.fetchone()
+                if result is None:
+                    return None
+                result["owners"] = result["owners"] or []
+                await notify_list_changed(cur, "your_kahoot", "create", result["id"])
+                await notify_questions_changed(cur, result["id"])
+        question_cache.invalidate(result["id"])
+        return result
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=404, detail=f"Unable to clone the kahoot, foreign key violation. Error message: {e}")
+
+async def create_kahoot_report(con, your_kahoot_id, total_questions, total_participants, correct_answers, duration):
+    query = """
+    INSERT INTO kahoot_report (your_kahoot_id, total_questions, total_participants, correct_answers, duration)
+    VALUES (%s, %s, %s, %s, %s)
+    RETURNING id, your_kahoot_id, total_questions, total_participants, correct_answers, duration, created_at;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (your_kahoot_id, total_questions, total_participants, correct_answers, duration))
+                result = await cur.fetchone()
+                return result
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=404, detail=f"Unable to save the kahoot report. Error message: {e}")
+
+GAME_ANSWER_COLUMNS = (
+    "game_id",
+    "your_kahoot_id",
+    "question_index",
+    "question_id",
+    "player_id",
+    "answer",
+    "correct",
+    "points",
+    "answered_at",
+)
+
+async def copy_game_answers(con, rows):
+    """
+    Writes a batch of answer events to game_answers with one COPY, which
+    costs far less per row than INSERT statements.
+
+    Args:
+        con: An async database connection.
+        rows: List of dicts with a value for every GAME_ANSWER_COLUMNS column.
+
+    Returns:
+        The number of rows written.
+    """
+    statement = sql.SQL("COPY game_answers ({}) FROM STDIN").format(
+        sql.SQL(", ").join(map(sql.Identifier, GAME_ANSWER_COLUMNS))
+    )
+    async with con.transaction():
+        async with con.cursor() as cur:
+            async with cur.copy(statement) as copy:
+                for row in rows:
+                    await copy.write_row([row[column] for column in GAME_ANSWER_COLUMNS])
+    return len(rows)
+
+async def read_game_report(con, game_id):
+    """
+    Rebuilds a game's kahoot_report values from its answer events. Players
+    who never answered and questions nobody answered don't leave events, so
+    those two counts are a lower bound of what the session reported.
+
+    Returns:
+        A dict with the kahoot_report columns, or None if the game has no answers.
+    """
+    query = """
+    SELECT
+        MIN(your_kahoot_id) AS your_kahoot_id,
+        COUNT(DISTINCT question_index) AS total_questions,
+        COUNT(DISTINCT player_id) AS total_participants,
+        COUNT(*) FILTER (WHERE correct) AS correct_answers,
+        MAX(answered_at) - MIN(answered_at) AS duration
+    FROM game_answers
+    WHERE game_id = %s
+    HAVING COUNT(*) > 0;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (game_id,))
+                result = await cur.fetchone()
+                return result
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the game report. Error message: {e}")
+
+async def bulk_insert(con, table, columns, rows, references, returning, event_table=None):
+    """
+    Inserts many rows with a single INSERT ... SELECT FROM unnest(...) and
+    reports the rows that could not be inserted instead of failing the batch.
+
+    Referenced ids are looked up first and locked FOR KEY SHARE until commit,
+    rows pointing at a missing one are skipped as foreign key violations.
+    The rest go in with ON CONFLICT DO NOTHING. Each inserted row is joined
+    back to the input on all of its inserted values to get its input
+    position, the earliest one if several input rows are identical (the
+    later copies conflicted). Rows whose position doesn't come back
+    collided with one of the table's unique constraints, with an existing
+    row or an earlier row of the same batch.
+
+    Args:
+        con: An async database connection.
+        table: Table to insert into.
+        columns: Dict of column name to Postgres type, in insert order.
+        rows: List of dicts with a value for every column.
+        references: Dict of foreign key column to referenced table.
+        returning: Columns returned for created rows, must include `id`.
+        event_table: Set to send a live update (see events.py) for every
+            created row, as the single row create functions do.
+
+    Returns:
+        A dict with the `created` rows and the `errors`, each error holding
+        the `index` of the input row, the `error` kind and a `detail` message.
+    """
+    errors = []
+    missing = {}
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                for column, referenced in references.items():
+                    ids = list({row[column] for row in rows if row[column] is not None})
+                    await cur.execute(
+                        sql.SQL("SELECT id FROM {} WHERE id = ANY(%s) FOR KEY SHARE").format(sql.Identifier(referenced)),
+                        (ids,),
+                    )
+                    found = {r["id"] for r in await cur.fetchall()}
+                    missing[column] = set(ids) - found
+
+                valid = []
+                for index, row in enumerate(rows):
+                    bad = [column for column in references if row[column] in missing[column]]
+                    if bad:
+                        errors.append({
+                            "index": index,
+                            "error": "foreign_key_violation",
+                            "detail": ", ".join(f"{column} {row[column]} does not exist in {references[column]}" for column in bad),
+                        })
+                    else:
+                        valid.append((index, row))
+
+                created = []
+                if valid:
+                    query = sql.SQL("""
+                    WITH input AS (
+                        SELECT * FROM unnest({arrays}) WITH ORDINALITY AS input({columns}, input_position)
+                    ), inserted AS (
+                        INSERT INTO {table} ({columns})
+                        SELECT {columns} FROM input
+                        ORDER BY input_position
+                        ON CONFLICT DO NOTHING
+                        RETURNING {inserted_columns}
+                    )
+                    SELECT DISTINCT ON (inserted.id) input.input_position, {returning}
+                    FROM inserted
+                    JOIN input ON {match}
+                    ORDER BY inserted.id, input.input_position;
+                    """).format(
+                        table=sql.Identifier(table),
+                        columns=sql.SQL(", ").join(map(sql.Identifier, columns)),
+                        arrays=sql.SQL(", ").join(sql.SQL("%s::" + pg_type + "[]") for pg_type in columns.values()),
+                        inserted_columns=sql.SQL(", ").join(map(sql.Identifier, dict.fromkeys([*returning, *columns]))),
+                        returning=sql.SQL(", ").join(sql.Identifier("inserted", column) for column in returning),
+                        # compared as row text: NULLs match NULLs and it can be hash joined
+                        match=sql.SQL("ROW({})::text = ROW({})::text").format(
+                            sql.SQL(", ").join(sql.Identifier("inserted", column) for column in columns),
+                            sql.SQL(", ").join(sql.Identifier("input", column) for column in columns),
+                        ),
+                    )
+                    await cur.execute(query, [[row[column] for _, row in valid] for column in columns])
+                    # input_position counts from 1 over `valid`
+                    inserted = {r.pop("input_position"): r for r in await cur.fetchall()}
+                    for position, (index, row) in enumerate(valid, 1):
+                        result = inserted.get(position)
+                        if result is None:
+                            errors.append({"index": index, "error": "unique_violation", "detail": f"{table} row already exists"})
+                        else:
+                            created.append(result)
+                if event_table and created:
+                    # one round trip for every notification of the batch
+                    await cur.execute(
+                        "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+                        (EVENTS_CHANNEL, [event_payload(event_table, "create", row["id"]) for row in created]),
+                    )
+                errors.sort(key=lambda error: error["index"])
+                return {"created": created, "errors": errors}
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to insert the {table} rows. Error message: {e}")
+
+async def bulk_create_users(con, users):
+    return await bulk_insert(
+        con,
+        "users",
+        {
+            "username": "varchar", "email": "varchar", "password": "varchar", "birthdate": "date",
+            "subscriptions_id": "int", "language_id": "int", "customer_type_id": "int",
+            "name": "varchar", "organisation": "varchar",
+        },
+        users,
+        references={"subscriptions_id": "subscriptions", "language_id": "languages", "customer_type_id": "customer_types"},
+        returning=("id", "username", "email"),
+        event_table="users",
+    )
+
+async def bulk_create_user_group_members(con, memberships):
+    return await bulk_insert(
+        con,
+        "user_group_members",
+        {"user_id": "int", "group_id": "int"},
+        memberships,
+        references={"user_id": "users", "group_id": "groups"},
+        returning=("id", "user_id", "group_id"),
+    )
+
+async def bulk_create_kahoot_owners(con, owners):
+    return await bulk_insert(
+        con,
+        "kahoot_owners",
+        {"users_id": "int", "your_kahoot_id": "int"},
+        owners,
+        references={"users_id": "users", "your_kahoot_id": "your_kahoot"},
+        returning=("id", "users_id", "your_kahoot_id"),
+    )
+
+async def bulk_create_favorite_kahoots(con, favorites):
+    return await bulk_insert(
+        con,
+        "favorite_kahoots",
+        {"users_id": "int", "your_kahoot_id": "int"},
+        favorites,
+        references={"users_id": "users", "your_kahoot_id": "your_kahoot"},
+        returning=("id", "users_id", "your_kahoot_id"),
+    )
+
+# Link tables with a UNIQUE pair, written idempotently by put_link/delete_link
+LINK_TABLES = {
+    "favorite_kahoots": ("users_id", "your_kahoot_id"),
+    "kahoot_owners": ("users_id", "your_kahoot_id"),
+    "user_group_members": ("user_id", "group_id"),
+}
+
+async def put_link(con, table, left_id, right_id):
+    """
+    Idempotently links two rows, e.g. favorites a kahoot. Uses INSERT ... ON
+    CONFLICT DO NOTHING, so repeating the request is a normal read instead of
+    a failed statement, a rollback and an exception.
+
+    Returns:
+        The link row with `created` telling whether this call inserted it.
+    """
+    left, right = LINK_TABLES[table]
+    query = sql.SQL("""
+    WITH inserted AS (
+        INSERT INTO {table} ({left}, {right})
+        VALUES (%(left_id)s, %(right_id)s)
+        ON CONFLICT ({left}, {right}) DO NOTHING
+        RETURNING id, {left}, {right}
+    )
+    SELECT id, {left}, {right}, true AS created FROM inserted
+    UNION ALL
+    SELECT id, {left}, {right}, false FROM {table}
+    WHERE {left} = %(left_id)s AND {right} = %(right_id)s
+    LIMIT 1;
+    """).format(table=sql.Identifier(table), left=sql.Identifier(left), right=sql.Identifier(right))
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                # a link committed by a concurrent request after this statement
+                # started is invisible to it, the second run then finds it
+                for _ in range(2):
+                    await cur.execute(query, {"left_id": left_id, "right_id": right_id})
+                    result = await cur.fetchone()
+                    if result is not None:
+                        return result
+                raise HTTPException(status_code=409, detail="The link was changed concurrently, try again.")
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=404, detail=f"Unable to create the link, foreign key violation. Error message: {e}")
+
+async def delete_link(con, table, left_id, right_id):
+    """
+    Removes a link if it exists. Deleting a missing link is not an error.
+
+    Returns:
+        True if a row was deleted.
+    """
+    left, right = LINK_TABLES[table]
+    query = sql.SQL("""
+    DELETE FROM {table}
+    WHERE {left} = %s AND {right} = %s
+    RETURNING id;
+    """).format(table=sql.Identifier(table), left=sql.Identifier(left), right=sql.Identifier(right))
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (left_id, right_id))
+                result = await cur.fetchone()
+                return result is not None
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to delete the link. Error message: {e}")
+
+async def read_lookup_table(con, table):
+    if table not in LOOKUP_TABLES:
+        raise ValueError(f"{table} is not a lookup table")
+    query = sql.SQL("""
+    SELECT id, name FROM {table}
+    ORDER BY id;
+    """).format(table=sql.Identifier(table))
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query)
+                result = await cur.fetchall()
+                return result
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the {table}. Error message: {e}")
+
+async def read_table_versions(con, tables):
+    """
+    Returns a dict with the change counter of each table that has been
+    written to since the counters were added, used to build ETags.
+    """
+    query = """
+    SELECT table_name, version FROM table_versions
+    WHERE table_name = ANY(%s);
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor() as cur:
+                await cur.execute(query, (list(tables),))
+                result = await cur.fetchall()
+                return dict(result)
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the table versions. Error message: {e}")
+
+async def read_all_users(con, limit=None, after_id=0, columns=FIELDSETS["users"]["default"]):
+    query = sql.SQL("""
+    SELECT {columns} FROM users
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s;
+    """).format(columns=sql.SQL(", ").join(map(sql.Identifier, columns)))
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (after_id, limit))
+                result = await cur.fetchall()
+                return result
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the users data. Error message: {e}")
+
+async def read_all_kahoots(con, limit=None, after_id=0, columns=FIELDSETS["your_kahoot"]["default"]):
+    query = sql.SQL("""
+    SELECT {columns} FROM your_kahoot
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s;
+    """).format(columns=sql.SQL(", ").join(map(sql.Identifier, columns)))
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (after_id, limit))
+                result = await cur.fetchall()
+                return result
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the kahoots. Error message: {e}")
+
+async def read_all_groups(con, limit=None, after_id=0, columns=FIELDSETS["groups"]["default"]):
+    query = sql.SQL("""
+    SELECT {columns} FROM groups
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s;
+    """).format(columns=sql.SQL(", ").join(map(sql.Identifier, columns)))
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (after_id, limit))
+                result = await cur.fetchall()
+                return result
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the groups. Error message: {e}")
+
+USERS_JOINED_KAHOOT_QUERY = """
+    SELECT 
+        users.id AS user_id,
+        users.username,
+        users.email,
+        your_kahoot.id AS kahoot_id,
+        your_kahoot.title,
+        your_kahoot.description,
+        your_kahoot.is_private
+    FROM users
+    LEFT JOIN kahoot_owners
+        ON users.id = kahoot_owners.users_id
+    LEFT JOIN your_kahoot
+        ON kahoot_owners.your_kahoot_id = your_kahoot.id
+    ORDER BY users.id;
+    """
+
+async def read_users_joined_kahoot(con):
+    query = USERS_JOINED_KAHOOT_QUERY
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query)
+                result = await cur.fetchall()
+                return result
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the users data. Error message: {e}")
+
+USERS_FAVORITE_KAHOOT_QUERY = """
+    SELECT 
+        users.id AS user_id,
+        users.username,
+        users.name,
+        users.email,
+        users.organisation,
+        your_kahoot.id AS kahoot_id,
+        your_kahoot.title,
+        your_kahoot.description,
+        your_kahoot.is_private
+    FROM users
+    LEFT JOIN favorite_kahoots
+        ON users.id = favorite_kahoots.users_id
+    LEFT JOIN your_kahoot
+        ON favorite_kahoots.your_kahoot_id = your_kahoot.id
+    ORDER BY users.id;
+    """
+
+async def read_users_favorite_kahoot(con):
+    query = USERS_FAVORITE_KAHOOT_QUERY
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query)
+                result = await cur.fetchall()
+                return result
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the users data. Error message: {e}")
+
+USERS_GROUPS_QUERY = """
+    SELECT 
+        users.id AS user_id,
+        users.username,
+        users.name,
+        users.birthdate,
+        users.email,
+        groups.id AS group_id,
+        groups.name AS group_name,
+        groups.description AS group_description
+    FROM users
+    LEFT JOIN user_group_members
+        ON users.id = user_group_members.user_id
+    LEFT JOIN groups
+        ON user_group_members.group_id = groups.id
+    ORDER BY users.id ASC;
+    """
+
+async def read_users_groups(con):
+    query = USERS_GROUPS_QUERY
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query)
+                result = await cur.fetchall()
+                return result
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the users data. Error message: {e}")
+
+async def stream_rows(con, query, itersize=STREAM_ITERSIZE, cursor_name="export"):
+    """
+    Runs a query through a named server-side cursor and yields the rows in
+    batches of `itersize`, so memory stays flat no matter how big the result is.
+    """
+    async with con.transaction():
+        async with con.cursor(name=cursor_name, row_factory=dict_row) as cur:
+            cur.itersize = itersize
+            # DECLARE ... CURSOR FOR does not take a trailing semicolon
+            await cur.execute(query.rstrip().rstrip(";"))
+            while True:
+                rows = await cur.fetchmany(itersize)
+                if not rows:
+                    break
+                yield rows
+
+def stream_users_joined_kahoot(con, itersize=STREAM_ITERSIZE):
+    return stream_rows(con, USERS_JOINED_KAHOOT_QUERY, itersize, "export_users_kahoots")
+
+def stream_users_favorite_kahoot(con, itersize=STREAM_ITERSIZE):
+    return stream_rows(con, USERS_FAVORITE_KAHOOT_QUERY, itersize, "export_users_favorites")
+
+def stream_users_groups(con, itersize=STREAM_ITERSIZE):
+    return stream_rows(con, USERS_GROUPS_QUERY, itersize, "export_users_groups")
+
+# Nested variants of the three joins above: one object per user with the
+# related rows aggregated into an array by Postgres, paginated by user id.
+# The page is returned as ready-made JSON text so no per-row dicts are built.
+USERS_JOINED_KAHOOT_NESTED_QUERY = """
+    WITH page_users AS (
+        SELECT id, username, email
+        FROM users
+        WHERE id > %(after_id)s
+        ORDER BY id
+        LIMIT %(limit)s + 1
+    ), page AS (
+        SELECT
+            page_users.id AS user_id,
+            page_users.username,
+            page_users.email,
+            COALESCE(
+                json_agg(json_build_object(
+                    'kahoot_id', your_kahoot.id,
+                    'title', your_kahoot.title,
+                    'description', your_kahoot.description,
+                    'is_private', your_kahoot.is_private
+                ) ORDER BY your_kahoot.id)
+                    FILTER (WHERE your_kahoot.id IS NOT NULL),
+                '[]'::json
+            ) AS kahoots
+        FROM (SELECT * FROM page_users ORDER BY id LIMIT %(limit)s) AS page_users
+        LEFT JOIN kahoot_owners
+            ON page_users.id = kahoot_owners.users_id
+        LEFT JOIN your_kahoot
+            ON kahoot_owners.your_kahoot_id = your_kahoot.id
+        GROUP BY page_users.id, page_users.username, page_users.email
+    )
+    SELECT
+        COALESCE((SELECT json_agg(page ORDER BY user_id) FROM page), '[]'::json)::text AS body,
+        (SELECT count(*) FROM page_users) > %(limit)s AS has_more,
+        (SELECT max(user_id) FROM page) AS last_id;
+    """
+
+USERS_FAVORITE_KAHOOT_NESTED_QUERY = """
+    WITH page_users AS (
+        SELECT id, username, name, email, organisation
+        FROM users
+        WHERE id > %(after_id)s
+        ORDER BY id
+        LIMIT %(limit)s + 1
+    ), page AS (
+        SELECT
+            page_users.id AS user_id,
+            page_users.username,
+            page_users.name,
+            page_users.email,
+            page_users.organisation,
+            COALESCE(
+                json_agg(json_build_object(
+                    'kahoot_id', your_kahoot.id,
+                    'title', your_kahoot.title,
+                    'description', your_kahoot.description,
+                    'is_private', your_kahoot.is_private
+                ) ORDER BY your_kahoot.id)
+                    FILTER (WHERE your_kahoot.id IS NOT NULL),
+                '[]'::json
+            ) AS favorites
+        FROM (SELECT * FROM page_users ORDER BY id LIMIT %(limit)s) AS page_users
+        LEFT JOIN favorite_kahoots
+            ON page_users.id = favorite_kahoots.users_id
+        LEFT JOIN your_kahoot
+            ON favorite_kahoots.your_kahoot_id = your_kahoot.id
+        GROUP BY page_users.id, page_users.username, page_users.name, page_users.email, page_users.organisation
+    )
+    SELECT
+        COALESCE((SELECT json_agg(page ORDER BY user_id) FROM page), '[]'::json)::text AS body,
+        (SELECT count(*) FROM page_users) > %(limit)s AS has_more,
+        (SELECT max(user_id) FROM page) AS last_id;
+    """
+
+USERS_GROUPS_NESTED_QUERY = """
+    WITH page_users AS (
+        SELECT id, username, name, birthdate, email
+        FROM users
+        WHERE id > %(after_id)s
+        ORDER BY id
+        LIMIT %(limit)s + 1
+    ), page AS (
+        SELECT
+            page_users.id AS user_id,
+            page_users.username,
+            page_users.name,
+            page_users.birthdate,
+            page_users.email,
+            COALESCE(
+                json_agg(json_build_object(
+                    'group_id', groups.id,
+                    'group_name', groups.name,
+                    'group_description', groups.description
+                ) ORDER BY groups.id)
+                    FILTER (WHERE groups.id IS NOT NULL),
+                '[]'::json
+            ) AS groups
+        FROM (SELECT * FROM page_users ORDER BY id LIMIT %(limit)s) AS page_users
+        LEFT JOIN user_group_members
+            ON page_users.id = user_group_members.user_id
+        LEFT JOIN groups
+            ON user_group_members.group_id = groups.id
+        GROUP BY page_users.id, page_users.username, page_users.name, page_users.birthdate, page_users.email
+    )
+    SELECT
+        COALESCE((SELECT json_agg(page ORDER BY user_id) FROM page), '[]'::json)::text AS body,
+        (SELECT count(*) FROM page_users) > %(limit)s AS has_more,
+        (SELECT max(user_id) FROM page) AS last_id;
+    """
+
+async def read_nested_page(con, query, limit, after_id=0):
+    """
+    Runs one of the nested queries and returns a dict with the page as JSON
+    text (`body`), whether more users follow (`has_more`) and the last user
+    id on the page (`last_id`).
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, {"limit": limit, "after_id": after_id})
+                result = await cur.fetchone()
+                return result
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the users data. Error message: {e}")
+
+async def read_users_joined_kahoot_nested(con, limit, after_id=0):
+    return await read_nested_page(con, USERS_JOINED_KAHOOT_NESTED_QUERY, limit, after_id)
+
+async def read_users_favorite_kahoot_nested(con, limit, after_id=0):
+    return await read_nested_page(con, USERS_FAVORITE_KAHOOT_NESTED_QUERY, limit, after_id)
+
+async def read_users_groups_nested(con, limit, after_id=0):
+    return await read_nested_page(con, USERS_GROUPS_NESTED_QUERY, limit, after_id)
+
+async def read_individual_user(con, primary_key_id, columns=FIELDSETS["user_detail"]["default"]):
+    query = sql.SQL("""
+    SELECT {columns} FROM users WHERE id = %s;
+    """).format(columns=sql.SQL(", ").join(map(sql.Identifier, columns)))
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (primary_key_id,))
+                result = await cur.fetchone()
+                if result is None:
+                    raise HTTPException(status_code=404, detail="No user found with provided primary key id.")
+                return result
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the users data. Error message: {e}")
+
+async def read_changes(con, since_txid, since_id, limit, tables=CHANGE_FEED_TABLES):
+    """
+    Reads up to `limit` change_log entries after the position (since_txid,
+    since_id), each with the row's current columns as `data` (None once the
+    row is gone). Only transactions older than the oldest one still running
+    are returned, since a running one could still commit entries behind the
+    client's position. Returns a dict with the entries (`changes`) and that
+    cut-off (`watermark`), where a caught-up client continues.
+
+    Raises:
+        HTTPException: 410 if the position is behind what prune_change_log
+            has deleted, the client may have missed changes.
+    """
+    data = sql.SQL(" ").join(
+        sql.SQL("WHEN {name} THEN (SELECT to_jsonb(t) FROM (SELECT {columns} FROM {table} WHERE id = change_log.row_id) AS t)").format(
+            name=sql.Literal(table),
+            columns=sql.SQL(", ").join(map(sql.Identifier, FIELDSETS[table]["allowed"])),
+            table=sql.Identifier(table),
+        )
+        for table in tables
+    )
+    query = sql.SQL("""
+    SELECT change_log.id, txid, table_name, row_id, operation, changed_at,
+        CASE table_name {data} END AS data
+    FROM change_log
+    WHERE (txid, change_log.id) > (%s, %s) AND txid < %s AND table_name = ANY(%s)
+    ORDER BY txid, change_log.id
+    LIMIT %s;
+    """).format(data=data)
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                # taken first, every transaction below it has finished by the time the entries are read
+                await cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()) AS watermark")
+                watermark = max((await cur.fetchone())["watermark"], since_txid)
+                # a client starting from scratch (0, 0) just gets what is left
+                await cur.execute("SELECT txid, last_id FROM change_log_pruned")
+                pruned = await cur.fetchone()
+                if pruned and (since_txid, since_id) != (0, 0) and (since_txid, since_id) < (pruned["txid"], pruned["last_id"]):
+                    raise HTTPException(
+                        status_code=410,
+                        detail="The change token is older than the retained change log, refetch the lists and start again without `since`.",
+                    )
+                await cur.execute(query, (since_txid, since_id, watermark, list(tables), limit))
+                result = await cur.fetchall()
+                return {"changes": result, "watermark": watermark}
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the changes. Error message: {e}")
+
+async def prune_change_log(con, retention):
+    """
+    Deletes change_log entries older than `retention` seconds and moves the
+    change_log_pruned mark up to the newest deleted entry, which read_changes
+    checks tokens against.
+
+    Returns:
+        The number of entries deleted.
+    """
+    query = """
+    WITH pruned AS (
+        DELETE FROM change_log
+        WHERE changed_at < NOW() - %s * INTERVAL '1 second'
+        RETURNING txid, id
+    ), mark AS (
+        INSERT INTO change_log_pruned (singleton, txid, last_id, pruned_at)
+        SELECT TRUE, txid, id, NOW() FROM pruned
+        ORDER BY txid DESC, id DESC
+        LIMIT 1
+        ON CONFLICT (singleton) DO UPDATE
+        SET txid = EXCLUDED.txid, last_id = EXCLUDED.last_id, pruned_at = EXCLUDED.pruned_at
+        WHERE (EXCLUDED.txid, EXCLUDED.last_id) > (change_log_pruned.txid, change_log_pruned.last_id)
+    )
+    SELECT COUNT(*) AS deleted FROM pruned;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (retention,))
+                result = await cur.fetchone()
+                return result["deleted"]
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to prune the change log. Error message: {e}")
+
+async def read_questions_by_kahoot_id(con, kahoot_id):
+    """
+    Fetches True/False, Written Questions, and Slides for a specific Kahoot
+    in one query. Every row has the same keys (position, id, type, question,
+    answer, text) and they come back True/False first, then Written, then
+    Slides, each by id.
+    """
+    query = """
+    SELECT
+        ROW_NUMBER() OVER (ORDER BY kind, id)::int AS position,
+        id, type, question, answer, text
+    FROM (
+        SELECT 1 AS kind, id, 'True/False' AS type, question, answer, NULL::varchar AS text
+        FROM quiz_with_true_false
+        WHERE your_kahoot_id = %(kahoot_id)s
+        UNION ALL
+        SELECT 2, id, 'Written', question, NULL, NULL
+        FROM quiz_with_written_answer
+        WHERE your_kahoot_id = %(kahoot_id)s
+        UNION ALL
+        SELECT 3, id, 'Slide', title, NULL, text
+        FROM presentation_classic
+        WHERE your_kahoot_id = %(kahoot_id)s
+    ) AS items
+    ORDER BY kind, id;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, {"kahoot_id": kahoot_id})
+                result = await cur.fetchall()
+                return result
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Error fetching questions: {e}")
+
+async def read_written_answers_by_kahoot_id(con, kahoot_id):
+    """
+    Returns a dict of written question id to its accepted answers, for
+    loading a game session.
+    """
+    query = """
+    SELECT q.id, array_agg(a.answer ORDER BY a.id) AS answers
+    FROM quiz_with_written_answer AS q
+    JOIN quiz_written_answer AS a ON a.quiz_with_written_answer_id = q.id
+    WHERE q.your_kahoot_id = %s
+    GROUP BY q.id;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (kahoot_id,))
+                result = await cur.fetchall()
+                return {row["id"]: row["answers"] for row in result}
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Error fetching written answers: {e}")
+
+KAHOOT_TREE_QUERY = """
+    SELECT json_build_object(
+        'id', k.id,
+        'title', k.title,
+        'description', k.description,
+        'is_private', k.is_private,
+        'language_id', k.language_id,
+        'questions', COALESCE((
+            SELECT json_agg(items ORDER BY position)
+            FROM (
+                SELECT
+                    ROW_NUMBER() OVER (ORDER BY kind, id)::int AS position,
+                    id, type, question, answer, answers
+                FROM (
+                    SELECT 1 AS kind, id, 'True/False' AS type, question, answer, NULL::json AS answers
+                    FROM quiz_with_true_false
+                    WHERE your_kahoot_id = k.id
+                    UNION ALL
+                    SELECT 2, w.id, 'Written', w.question, NULL,
+                        COALESCE((
+                            SELECT json_agg(json_build_object('id', a.id, 'answer', a.answer) ORDER BY a.id)
+                            FROM quiz_written_answer AS a
+                            WHERE a.quiz_with_written_answer_id = w.id
+                        ), '[]'::json)
+                    FROM quiz_with_written_answer AS w
+                    WHERE w.your_kahoot_id = k.id
+                ) AS kinds
+            ) AS items
+        ), '[]'::json),
+        'slides', COALESCE((
+            SELECT json_agg(json_build_object('id', p.id, 'title', p.title, 'text', p.text) ORDER BY p.id)
+            FROM presentation_classic AS p
+            WHERE p.your_kahoot_id = k.id
+        ), '[]'::json)
+    )::text AS body
+    FROM your_kahoot AS k
+    WHERE k.id = %s;
+    """
+
+async def read_kahoot_tree(con, kahoot_id):
+    """
+    Fetches a kahoot with its questions (True/False first, then Written, each
+    by id, like read_questions_by_kahoot_id), the accepted answers nested
+    under every written question, and its slides, in one query. Postgres
+    builds the JSON, so the result is returned as text; None when the kahoot
+    doesn't exist.
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(KAHOOT_TREE_QUERY, (kahoot_id,))
+                result = await cur.fetchone()
+                return result["body"] if result else None
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Unable to read the kahoot. Error message: {e}")
+
+async def delete_group_by_id(con, group_id):
+    query = """
+    DELETE FROM groups 
+    WHERE id = %s
+    RETURNING id, name;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (group_id, ))
+                result = await cur.fetchone()
+                if result is None:
+                    raise HTTPException(status_code=404, detail="Group not found, no deletion could be made")
+                await notify_list_changed(cur, "groups", "delete", result["id"])
+                return result
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to delete the group. Error message: {e}")
+
+async def delete_user_by_username(con, username):
+    query = """
+    DELETE FROM users 
+    WHERE username = %s
+    RETURNING id, username, email;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (username,))
+                result = await cur.fetchone()
+                if result is None:
+                    raise HTTPException(status_code=404, detail="User not found, no deletion could be made")
+                await notify_list_changed(cur, "users", "delete", result["id"])
+                return result
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to delete the user. Error message: {e}")
+
+async def delete_your_kahoot_by_id(con, your_kahoot_id):
+    query = """
+    DELETE FROM your_kahoot 
+    WHERE id = %s
+    RETURNING id, title, description;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (your_kahoot_id, ))
+                result = await cur.fetchone()
+                if result is None:
+                    raise HTTPException(status_code=404, detail="Kahoot id not found, no deletion could be made")
+                await notify_questions_changed(cur, result["id"])
+                await notify_list_changed(cur, "your_kahoot", "delete", result["id"])
+        question_cache.invalidate(result["id"])
+        return result
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to delete the Kahoot with that id. Error message: {e}")
+
+async def delete_quiz_question_with_written_answer(con, quiz_with_written_answer_id):
+    query = """
+    DELETE FROM quiz_with_written_answer
+    WHERE id = %s
+    RETURNING id, question, your_kahoot_id;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (quiz_with_written_answer_id, ))
+                result = await cur.fetchone()
+                if result is None:
+                    raise HTTPException(status_code=404, detail="Quiz question not found, no deletion could be made")
+                await notify_questions_changed(cur, result["your_kahoot_id"])
+        question_cache.invalidate(result["your_kahoot_id"])
+        return result
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to delete the Quiz question with that id. Error message: {e}")
+
+async def delete_quiz_answer_with_written_answer(con, quiz_written_answer_id):
+    query = """
+    DELETE FROM quiz_written_answer
+    WHERE id = %s
+    RETURNING id, answer, quiz_with_written_answer_id;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (quiz_written_answer_id, ))
+                result = await cur.fetchone()
+                if result is None:
+                    raise HTTPException(status_code=404, detail="Quiz answer not found, no deletion could be made")
+                return result
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to delete the Quiz answer with that id. Error message: {e}")
+
+async def delete_quiz_with_true_false(con, quiz_with_true_false_id):
+    query = """
+    DELETE FROM quiz_with_true_false
+    WHERE id = %s
+    RETURNING id, question, answer, your_kahoot_id;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (quiz_with_true_false_id, ))
+                result = await cur.fetchone()
+                if result is None:
+                    raise HTTPException(status_code=404, detail="Quiz answer not found, no deletion could be made")
+                await notify_questions_changed(cur, result["your_kahoot_id"])
+        question_cache.invalidate(result["your_kahoot_id"])
+        return result
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to delete the Quiz answer with that id. Error message: {e}")
+
+async def update_quiz_with_true_false(con, id, question, answer, your_kahoot_id):
+    query = """
+    UPDATE quiz_with_true_false AS item
+    SET question = %s, answer = %s, your_kahoot_id = %s
+    FROM (SELECT id, your_kahoot_id FROM quiz_with_true_false WHERE id = %s FOR UPDATE) AS old
+    WHERE item.id = old.id
+    RETURNING item.id, item.question, item.answer, item.your_kahoot_id, old.your_kahoot_id AS old_kahoot_id;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (question, answer, your_kahoot_id, id))
+                result = await cur.fetchone()
+                if result is None:
+                    raise HTTPException(status_code=404, detail="Quiz answer/question id not found, no update could be made")
+                old_kahoot_id = result.pop("old_kahoot_id")
+                await notify_questions_changed(cur, old_kahoot_id, result["your_kahoot_id"])
+        question_cache.invalidate(old_kahoot_id, result["your_kahoot_id"])
+        return result
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Quiz answer/question id not found, no update could be made. Error message: {e}")
+
+async def update_quiz_answer_with_written_answer(con, id, quiz_with_written_answer_id, answer):
+    query = """
+    UPDATE quiz_written_answer
+    SET answer = %s, quiz_with_written_answer_id = %s
+    WHERE id = %s
+    RETURNING id, answer, quiz_with_written_answer_id;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (answer, quiz_with_written_answer_id, id ))
+                result = await cur.fetchone()
+                if result is None:
+                    raise HTTPException(status_code=404, detail="Quiz answer not found, no update could be made")
+                return result
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to update the Quiz answer with that id. Error message: {e}")
+
+async def update_quiz_question_with_written_answer(con, id, question, your_kahoot_id):
+    query = """
+    UPDATE quiz_with_written_answer AS item
+    SET question = %s, your_kahoot_id = %s
+    FROM (SELECT id, your_kahoot_id FROM quiz_with_written_answer WHERE id = %s FOR UPDATE) AS old
+    WHERE item.id = old.id
+    RETURNING item.id, item.question, item.your_kahoot_id, old.your_kahoot_id AS old_kahoot_id;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (question, your_kahoot_id, id ))
+                result = await cur.fetchone()
+                if result is None:
+                    raise HTTPException(status_code=404, detail="Quiz question not found, no update could be made")
+                old_kahoot_id = result.pop("old_kahoot_id")
+                await notify_questions_changed(cur, old_kahoot_id, result["your_kahoot_id"])
+        question_cache.invalidate(old_kahoot_id, result["your_kahoot_id"])
+        return result
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to update the Quiz question with that id. Error message: {e}")
+
+async def update_your_kahoot_by(con, your_kahoot_id, title, description, is_private, language_id):
+    query = """
+    UPDATE your_kahoot 
+    SET title = %s, description = %s, is_private = %s, language_id = %s
+    WHERE id = %s
+    RETURNING id, title, description;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (title, description, is_private, language_id, your_kahoot_id))
+                result = await cur.fetchone()
+                if result is None:
+                    raise HTTPException(status_code=404, detail="Kahoot id not found, no update could be made")
+                await notify_list_changed(cur, "your_kahoot", "update", result["id"])
+                return result
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to update the Kahoot with that id. Error message: {e}")
+    
+async def update_groups(con, id, name, description):
+    query = """
+    UPDATE groups
+    SET name = %s, description = %s
+    WHERE id = %s
+    RETURNING name, description, id;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (name, description, id))
+                result = await cur.fetchone()
+                if result is None:
+                    raise HTTPException(status_code=404, detail="Group not found, no update could be made")
+                await notify_list_changed(cur, "groups", "update", result["id"])
+                return result
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to update the user. Error message: {e}")
+
+async def update_presentation_classic(con, id, your_kahoot_id, title=None, text=None):
+    query = """
+    UPDATE presentation_classic AS item
+    SET title = %s, text = %s, your_kahoot_id = %s
+    FROM (SELECT id, your_kahoot_id FROM presentation_classic WHERE id = %s FOR UPDATE) AS old
+    WHERE item.id = old.id
+    RETURNING item.*, old.your_kahoot_id AS old_kahoot_id;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (title, text, your_kahoot_id, id))
+                result = await cur.fetchone()
+                if result is None:
+                    return result
+                old_kahoot_id = result.pop("old_kahoot_id")
+                await notify_questions_changed(cur, old_kahoot_id, result["your_kahoot_id"])
+        question_cache.invalidate(old_kahoot_id, result["your_kahoot_id"])
+        return result
+    except psycopg.errors.UniqueViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to update the presenation. Error message: {e}")
+    except psycopg.errors.ForeignKeyViolation as e:
+        raise HTTPException(status_code=400, detail=f"Unable to update the presentation. Error message: {e}")
+
+async def patch_question_quiz_with_true_false(con, id, question):
+    query = """
+    UPDATE quiz_with_true_false
+    SET question = %s
+    WHERE id = %s
+    RETURNING id, question, answer, your_kahoot_id;
+    """
+    try:
+        async with con.transaction():
+            async with con.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, (question, id))
+                result = await cur.fetchone()
+                if result is None:
+                    raise HTTPException(status_code=404, detail="Quiz answer/question id not found, no update could be made")
+                await notify_questions_changed(cur, result["your_kahoot_id"])
+        question_cache.invalidate(result["your_kahoot_id"])
+        return result
+    except DatabaseError as e:
+        raise HTTPException(status_code=400, detail=f"Database error while updating quiz. Error message: {e}")
+
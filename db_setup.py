@@ -1,319 +1,255 @@
+import asyncio
 import os
+import threading
+import time
 
+import psycopg
 import psycopg2
 from dotenv import load_dotenv
+from psycopg.conninfo import make_conninfo
 from psycopg2 import DatabaseError
-from psycopg2.pool import SimpleConnectionPool
+from psycopg_pool import AsyncConnectionPool
+
+from migrations import migrate
+from pool import ConnectionPool
 
 load_dotenv()
 
 DATABASE_NAME = os.getenv("DATABASE_NAME")
 PASSWORD = os.getenv("PASSWORD")
 
-print(f"Connecting to database: {DATABASE_NAME}")
-
-# setting up connectionpool
-pool = SimpleConnectionPool(
-    minconn=1,
-    maxconn=12,
-    dbname=DATABASE_NAME,
-    user="postgres",
-    password=PASSWORD,
-    host="localhost",
-    port="5432",
-)
+# pool sizing and recycling, all overridable from the environment
+POOL_MINCONN = int(os.getenv("DB_POOL_MINCONN", "1"))
+POOL_MAXCONN = int(os.getenv("DB_POOL_MAXCONN", "12"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "600"))
+POOL_DRAIN_TIMEOUT = float(os.getenv("DB_POOL_DRAIN_TIMEOUT", "10"))
+# when true the app does not connect at startup but on the first request,
+# e.g. for gunicorn --preload so only the forked workers ever connect
+POOL_LAZY = os.getenv("DB_POOL_LAZY", "false").lower() in ("1", "true", "yes")
+# apply pending schema migrations when the app starts
+MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+CONNECTION_KWARGS = {
+    "dbname": DATABASE_NAME,
+    "user": "postgres",
+    "password": PASSWORD,
+    "host": "localhost",
+    "port": "5432",
+}
+
+# Both pools are created on first use (or by the lifespan handler in app.py),
+# so importing this module never opens a socket.
+pool = None
+async_pool = None
+_pool_lock = threading.Lock()
+_async_pool_lock = asyncio.Lock()
+
+
+def get_pool():
+    """
+    Return the sync connection pool, creating it on first use.
 
-def get_connection():
+    Returns:
+        The process wide pool.ConnectionPool.
     """
-    Retrieve a database connection from the connection pool.
+    global pool
+    if pool is None:
+        with _pool_lock:
+            if pool is None:
+                print(f"Connecting to database: {DATABASE_NAME}")
+                pool = ConnectionPool(
+                    minconn=POOL_MINCONN,
+                    maxconn=POOL_MAXCONN,
+                    timeout=POOL_TIMEOUT,
+                    max_lifetime=POOL_MAX_LIFETIME,
+                    max_idle=POOL_MAX_IDLE,
+                    **CONNECTION_KWARGS,
+                )
+    return pool
 
-    Returns:
-        A psycopg2 connection object from the pool.
+
+def close_pool():
     """
-    return pool.getconn()
+    Close the sync connection pool if it has been created.
+    """
+    global pool
+    if pool is not None:
+        pool.closeall()
+        pool = None
 
 
-def release_connection(conn):
+async def open_async_pool(wait=True):
     """
-    Return a database connection to the pool.
+    Create and open the async pool used by the endpoints in app.py.
 
     Args:
-        conn: A psycopg2 connection object to return to the pool.
+        wait: Block until DB_POOL_MINCONN connections are established, so the
+            first requests don't pay for connecting.
+
+    Returns:
+        The opened psycopg_pool.AsyncConnectionPool.
     """
-    pool.putconn(conn)
+    global async_pool
+    async with _async_pool_lock:
+        if async_pool is None:
+            async_pool = AsyncConnectionPool(
+                conninfo=make_conninfo(**CONNECTION_KWARGS),
+                min_size=POOL_MINCONN,
+                max_size=POOL_MAXCONN,
+                timeout=POOL_TIMEOUT,
+                max_lifetime=POOL_MAX_LIFETIME,
+                max_idle=POOL_MAX_IDLE,
+                check=AsyncConnectionPool.check_connection,
+                open=False,
+            )
+            await async_pool.open(wait=wait, timeout=POOL_TIMEOUT)
+    return async_pool
 
 
-def create_tables(con):
+async def close_async_pool(drain_timeout=POOL_DRAIN_TIMEOUT):
     """
-    This function executes a series of SQL CREATE TABLE statements
-    to ensure that all required tables exist in the connected PostgreSQL
-    database. If a table already exists, it will not be recreated.
+    Drain and close the async pool.
+
+    Waits up to `drain_timeout` seconds for checked out connections to be
+    returned before closing, so in-flight queries can finish.
 
     Args:
-        con: An active database connection object.
+        drain_timeout: Seconds to wait for connections in use.
+    """
+    global async_pool
+    async with _async_pool_lock:
+        if async_pool is None:
+            return
+        deadline = time.monotonic() + drain_timeout
+        while time.monotonic() < deadline:
+            stats = async_pool.get_stats()
+            if stats["pool_size"] - stats["pool_available"] <= 0:
+                break
+            await asyncio.sleep(0.05)
+        await async_pool.close()
+        async_pool = None
 
-    Raises:
-        psycopg2.IntegrityError: If any constraint violations occur while
-            creating the tables.
-        psycopg2.DatabaseError: If there is a general error when executing SQL
-            statements in the database.
-    """
-    
-    subscriptions = """
-    CREATE TABLE IF NOT EXISTS subscriptions(
-        id SERIAL PRIMARY KEY,
-        name VARCHAR(20) NOT NULL
-    )
-    """
 
-    languages = """
-    CREATE TABLE IF NOT EXISTS languages(
-        id SERIAL PRIMARY KEY,
-        name VARCHAR(50) NOT NULL
-    )
+def get_connection():
     """
+    Retrieve a database connection from the connection pool.
 
-    customer_types = """
-    CREATE TABLE IF NOT EXISTS customer_types(
-        id SERIAL PRIMARY KEY,
-        name VARCHAR(30) NOT NULL
-    )
-    """
+    Waits up to DB_POOL_TIMEOUT seconds when every connection is in use.
 
-    users = """
-    CREATE TABLE IF NOT EXISTS users(
-        id SERIAL PRIMARY KEY,
-        username VARCHAR(50) NOT NULL UNIQUE,
-        email VARCHAR(255) NOT NULL UNIQUE,
-        password VARCHAR(255) NOT NULL,
-        birthdate DATE NOT NULL,
-        signup_date TIMESTAMP NOT NULL DEFAULT NOW(),
-        name VARCHAR(255),
-        organisation VARCHAR(50),
-        subscriptions_id INT NOT NULL REFERENCES subscriptions(id) ON DELETE RESTRICT,
-        language_id INT NOT NULL REFERENCES languages(id) ON DELETE RESTRICT,
-        customer_type_id INT NOT NULL REFERENCES customer_types(id) ON DELETE RESTRICT
-    )
-    """
+    Returns:
+        A psycopg2 connection object from the pool.
 
-    your_kahoot = """
-    CREATE TABLE IF NOT EXISTS your_kahoot(
-        id SERIAL PRIMARY KEY,
-        title VARCHAR(80) NOT NULL,
-        description VARCHAR(500),
-        is_private BOOLEAN,
-        language_id INT NOT NULL REFERENCES languages(id) ON DELETE RESTRICT
-    )
+    Raises:
+        pool.PoolTimeout: If no connection became available in time.
     """
+    return get_pool().getconn()
 
-    images = """
-    CREATE TABLE IF NOT EXISTS images(
-        id SERIAL PRIMARY KEY,
-        link VARCHAR(500),
-        your_kahoot_id INT UNIQUE REFERENCES your_kahoot(id) ON DELETE SET NULL
-    )
-    """
 
-    kahoot_owners = """
-    CREATE TABLE IF NOT EXISTS kahoot_owners(
-        id SERIAL PRIMARY KEY,
-        users_id INT REFERENCES users(id) ON DELETE SET NULL,
-        your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL,
-        UNIQUE(users_id, your_kahoot_id)
-    )
+def release_connection(conn):
     """
+    Return a database connection to the pool.
 
-    favorite_kahoots = """
-    CREATE TABLE IF NOT EXISTS favorite_kahoots(
-        id SERIAL PRIMARY KEY,
-        users_id INT REFERENCES users(id) ON DELETE SET NULL,
-        your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL,
-        UNIQUE(users_id, your_kahoot_id)
-    )
+    Args:
+        conn: A psycopg2 connection object to return to the pool.
     """
+    get_pool().putconn(conn)
 
-    kahoot_report = """
-    CREATE TABLE IF NOT EXISTS kahoot_report(
-        id SERIAL PRIMARY KEY,
-        total_questions INT NOT NULL,
-        total_participants INT NOT NULL,
-        correct_answers INT,
-        duration INTERVAL,
-        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
-        your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL
-    )
-    """
 
-    groups = """
-    CREATE TABLE IF NOT EXISTS groups(
-        id SERIAL PRIMARY KEY,
-        name VARCHAR(50) NOT NULL,
-        description VARCHAR(200)
-        )
-        """
-
-    user_group_members = """
-    CREATE TABLE IF NOT EXISTS user_group_members(
-        id SERIAL PRIMARY KEY,
-        user_id INT REFERENCES users(id) ON DELETE SET NULL,
-        group_id INT REFERENCES groups(id) ON DELETE SET NULL,
-        UNIQUE(user_id, group_id)
-    )
+async def get_async_connection():
     """
+    Retrieve an async database connection from the async connection pool.
 
-    groups_and_kahoots = """
-    CREATE TABLE IF NOT EXISTS groups_and_kahoots(
-        id SERIAL PRIMARY KEY,
-        group_id INT REFERENCES groups(id) ON DELETE SET NULL,
-        your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL,
-        UNIQUE(group_id, your_kahoot_id)
-    )
-    """
+    Opens the pool on first use when the app was started with DB_POOL_LAZY.
+    Waits up to DB_POOL_TIMEOUT seconds when every connection is in use.
 
-    group_messages = """
-    CREATE TABLE IF NOT EXISTS group_messages(
-        id SERIAL PRIMARY KEY,
-        text VARCHAR(400) NOT NULL,
-        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
-        user_id INT REFERENCES users(id) ON DELETE SET NULL,
-        group_id INT REFERENCES groups(id) ON DELETE SET NULL
-    )
-    """
+    Returns:
+        A psycopg AsyncConnection object from the pool.
 
-    saved_payment_card = """
-    CREATE TABLE IF NOT EXISTS saved_payment_card(
-        id SERIAL PRIMARY KEY,
-        payment_provider VARCHAR(20),
-        payment_method_token VARCHAR(255),
-        card_type VARCHAR(50) CHECK (card_type IN ('Visa', 'Mastercard', 'American Express')),
-        last_four CHAR(4),
-        expiration_month INT,
-        expiration_year INT,
-        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
-        user_id INT REFERENCES users(id) ON DELETE SET NULL
-    )
+    Raises:
+        psycopg_pool.PoolTimeout: If no connection became available in time.
     """
+    current = async_pool or await open_async_pool(wait=False)
+    return await current.getconn()
 
-    saved_paypal = """
-    CREATE TABLE IF NOT EXISTS saved_paypal(
-        id SERIAL PRIMARY KEY,
-        payment_method_token VARCHAR(255),
-        firstname VARCHAR(100),
-        lastname VARCHAR(100),
-        payment_email VARCHAR(255),
-        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
-        user_id INT REFERENCES users(id) ON DELETE SET NULL
-    )
-    """
 
-    saved_google_pay = """
-    CREATE TABLE IF NOT EXISTS saved_google_pay(
-        id SERIAL PRIMARY KEY,
-        payment_method_token VARCHAR(255),
-        firstname VARCHAR(100),
-        lastname VARCHAR(100),
-        payment_email VARCHAR(255),
-        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
-        user_id INT REFERENCES users(id) ON DELETE SET NULL
-    )
+async def release_async_connection(conn):
     """
+    Return an async database connection to the async pool.
 
-    transactions = """
-    CREATE TABLE IF NOT EXISTS transactions(
-        id SERIAL PRIMARY KEY,
-        payment_method_token VARCHAR(255),
-        amount DECIMAL(10,2),
-        currency CHAR(3),
-        status VARCHAR(20),
-        provider VARCHAR(20),
-        transaction_id VARCHAR(255),
-        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
-        subscriptions_id INT REFERENCES subscriptions(id) ON DELETE SET NULL,
-        saved_payment_card_id INT REFERENCES saved_payment_card(id) ON DELETE SET NULL,
-        saved_paypal_id INT REFERENCES saved_paypal(id) ON DELETE SET NULL,
-        saved_google_pay_id INT REFERENCES saved_google_pay(id) ON DELETE SET NULL,
-        user_id INT REFERENCES users(id) ON DELETE SET NULL
-    )
+    Args:
+        conn: A psycopg AsyncConnection object to return to the pool.
     """
+    await async_pool.putconn(conn)
 
-    quiz_with_written_answer = """
-    CREATE TABLE IF NOT EXISTS quiz_with_written_answer(
-        id SERIAL PRIMARY KEY,
-        question VARCHAR(100) NOT NULL,
-        your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL
-    )
-    """
 
-    quiz_written_answer = """
-    CREATE TABLE IF NOT EXISTS quiz_written_answer(
-        id SERIAL PRIMARY KEY,
-        answer VARCHAR(100) NOT NULL,
-        quiz_with_written_answer_id INT REFERENCES quiz_with_written_answer(id) ON DELETE SET NULL
-    )
+async def connect_listener():
     """
+    Open a dedicated autocommit connection for LISTEN, outside the pool
+    since it stays busy waiting for notifications for the worker's lifetime.
 
-    quiz_with_true_false = """
-    CREATE TABLE IF NOT EXISTS quiz_with_true_false(
-        id SERIAL PRIMARY KEY,
-        question VARCHAR(100) NOT NULL,
-        answer BOOLEAN NOT NULL,
-        your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL
-    )
+    Returns:
+        A psycopg AsyncConnection object.
     """
+    return await psycopg.AsyncConnection.connect(make_conninfo(**CONNECTION_KWARGS), autocommit=True)
+
 
-    presentation_classic = """
-    CREATE TABLE IF NOT EXISTS presentation_classic(
-        id SERIAL PRIMARY KEY,
-        title VARCHAR(100),
-        text VARCHAR(500),
-        your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL
-    )
+def pool_stats():
     """
+    Return size and usage counters of the connection pools that are open.
+    """
+    return {
+        "sync": pool.stats() if pool is not None else None,
+        "async": async_pool.get_stats() if async_pool is not None else None,
+    }
+
 
-    survey_open_question = """
-    CREATE TABLE IF NOT EXISTS survey_open_question(
-        id SERIAL PRIMARY KEY,
-        question VARCHAR(100),
-        answer_text VARCHAR(250),
-        your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL
-    )
+def create_tables(con):
     """
+    This function brings the schema up to date by applying every pending
+    migration from migrations.py (tables, indexes, ...). Migrations that
+    have already been applied are recorded and skipped, so calling this on
+    a current database costs a single query.
+
+    Args:
+        con: An active database connection object.
 
+    Raises:
+        psycopg2.IntegrityError: If any constraint violations occur while
+            creating the tables.
+        psycopg2.DatabaseError: If there is a general error when executing SQL
+            statements in the database.
+    """
     try:
-        with con:
-            with con.cursor() as cur:
-                cur.execute(subscriptions)
-                cur.execute(languages)
-                cur.execute(customer_types)
-                cur.execute(users)
-                cur.execute(your_kahoot)
-                cur.execute(images)
-                cur.execute(kahoot_owners)
-                cur.execute(favorite_kahoots)
-                cur.execute(kahoot_report)
-                cur.execute(groups)
-                cur.execute(user_group_members)
-                cur.execute(groups_and_kahoots)
-                cur.execute(group_messages)
-                cur.execute(saved_payment_card)
-                cur.execute(saved_paypal)
-                cur.execute(saved_google_pay)
-                cur.execute(transactions)
-                cur.execute(quiz_with_written_answer)
-                cur.execute(quiz_written_answer)
-                cur.execute(quiz_with_true_false)
-                cur.execute(presentation_classic)
-                cur.execute(survey_open_question)
-                print("Tables created (or already existed).")
+        applied = migrate(con)
+        if applied:
+            print(f"Schema migrated to version {applied[-1]}.")
+        else:
+            print("Schema already up to date.")
     except psycopg2.IntegrityError as e:
         print(f"There has been error regarding database rules and constraints. Error message: {e}")
     except DatabaseError as e:
         print(f"There has been error creating tables in database. Error message: {e}")
 
 
+def migrate_database():
+    """
+    Run pending migrations over a dedicated connection, used by the app on
+    startup. Kept outside the pools so it doesn't hold a pooled connection
+    while indexes build.
+    """
+    con = psycopg2.connect(**CONNECTION_KWARGS)
+    try:
+        return migrate(con)
+    finally:
+        con.close()
+
+
 if __name__ == "__main__":
+        con = get_connection()
         try:
-            con = get_connection()
             create_tables(con)
         finally:
-            con.close()
+            release_connection(con)
+            close_pool()
@@ -0,0 +1,59 @@
+import hashlib
+
+# Conditional GETs. A response's ETag is derived from the change counters of
+# the tables it reads (table_versions, kept by triggers, see migrations.py)
+# and the request URL, so a matching If-None-Match can be answered with a 304
+# after a primary key lookup instead of running and serialising the query.
+
+ETAG_HEADER = "ETag"
+
+# browsers store the response but revalidate it on every use
+CACHE_CONTROL = "no-cache"
+
+
+def make_etag(versions, variant):
+    """
+    Build a strong ETag from table versions and the request variant.
+
+    Args:
+        versions: Dict of table name to version, tables never written to
+            may be missing.
+        variant: Anything else the body depends on, e.g. path and query string.
+
+    Returns:
+        The quoted ETag value.
+    """
+    state = ",".join(f"{table}={versions[table]}" for table in sorted(versions))
+    digest = hashlib.sha1(f"{state}|{variant}".encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Check an If-None-Match header against an ETag.
+
+    Uses the weak comparison RFC 9110 prescribes for If-None-Match, so a
+    W/ prefix added by a proxy still matches.
+
+    Args:
+        if_none_match: The header value or None.
+        etag: The current quoted ETag.
+
+    Returns:
+        True when the client's copy is current.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def etag_headers(etag):
+    return {ETAG_HEADER: etag, "Cache-Control": CACHE_CONTROL}
@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+# Live list updates over Server-Sent Events. The write functions in db.py /
+# db_async.py send a NOTIFY on EVENTS_CHANNEL when a kahoot, group or user is
+# created, updated or deleted. The worker's single listener connection (see
+# notifications.py) hands it to `broker`, which formats the SSE frame once
+# and queues it for every subscriber. A subscriber whose queue is full is
+# evicted instead of slowing down the others or growing without bound.
+
+EVENTS_CHANNEL = "list_changed"
+EVENT_TABLES = ("your_kahoot", "groups", "users")
+
+SUBSCRIBER_QUEUE_SIZE = 100
+# comment frame sent when a stream was idle this long, keeps proxies from
+# closing it and lets the server notice clients that went away
+HEARTBEAT_INTERVAL = 15.0
+
+HEARTBEAT_FRAME = ": keep-alive\n\n"
+# sent when notifications may have been missed, clients should refetch
+RESYNC_FRAME = "event: resync\ndata: {}\n\n"
+EVICTED_FRAME = "event: evicted\ndata: {}\n\n"
+
+
+def event_payload(table, event, row_id):
+    """
+    Build the NOTIFY payload for a change, e.g. ("groups", "update", 3).
+    """
+    return json.dumps({"table": table, "event": event, "id": row_id})
+
+
+class Subscriber:
+    def __init__(self, tables, maxsize):
+        self.tables = tables
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.evicted = False
+
+
+class EventBroker:
+    """
+    Fans event notifications out to the SSE streams of this worker.
+
+    Args:
+        queue_size: Frames buffered per subscriber before it is evicted.
+    """
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self._queue_size = queue_size
+        self._subscribers = set()
+        self.published = 0
+        self.evictions = 0
+
+    def subscribe(self, tables=EVENT_TABLES):
+        subscriber = Subscriber(frozenset(tables), self._queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, payload):
+        """
+        Queue a notification payload for every subscriber of its table.
+        Registered as the listener's handler for EVENTS_CHANNEL.
+        """
+        event = json.loads(payload)
+        frame = f"event: {event['event']}\ndata: {payload}\n\n"
+        self.published += 1
+        for subscriber in list(self._subscribers):
+            if event["table"] in subscriber.tables:
+                self._offer(subscriber, frame)
+
+    def resync(self, *_):
+        for subscriber in list(self._subscribers):
+            self._offer(subscriber, RESYNC_FRAME)
+
+    def _offer(self, subscriber, frame):
+        try:
+            subscriber.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self._evict(subscriber)
+
+    def _evict(self, subscriber):
+        # drop its backlog so the final frame fits, the client reconnects and refetches
+        self.unsubscribe(subscriber)
+        subscriber.evicted = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(EVICTED_FRAME)
+        self.evictions += 1
+
+    async def stream(self, subscriber, heartbeat=HEARTBEAT_INTERVAL):
+        """
+        Yield the frames of a subscriber, with a heartbeat while idle. Ends
+        after the eviction frame; unsubscribes when the client goes away.
+        """
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    frame = HEARTBEAT_FRAME
+                yield frame
+                if frame is EVICTED_FRAME:
+                    return
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "evictions": self.evictions,
+        }
+
+
+broker = EventBroker()
@@ -0,0 +1,51 @@
+# Sparse fieldsets for the read endpoints. Clients pick columns with
+# ?fields=a,b,c; only whitelisted columns can be requested and they are pushed
+# down into the SELECT, so unrequested columns never leave Postgres.
+# `id` is always included since pagination and clients key on it.
+# users.password is deliberately not selectable.
+
+FIELDSETS = {
+    "users": {
+        "allowed": ("id", "username", "email", "birthdate", "signup_date", "name", "organisation",
+                    "subscriptions_id", "language_id", "customer_type_id"),
+        "default": ("id", "username", "email", "name", "organisation"),
+    },
+    "user_detail": {
+        "allowed": ("id", "username", "email", "birthdate", "signup_date", "name", "organisation",
+                    "subscriptions_id", "language_id", "customer_type_id"),
+        "default": ("id", "username", "email", "birthdate", "signup_date", "name", "organisation"),
+    },
+    "your_kahoot": {
+        "allowed": ("id", "title", "description", "is_private", "language_id"),
+        "default": ("id", "title", "is_private", "language_id"),
+    },
+    "groups": {
+        "allowed": ("id", "name", "description"),
+        "default": ("id", "name", "description"),
+    },
+}
+
+
+def parse_fields(fieldset, fields=None):
+    """
+    Validate a comma separated `fields` query value against a fieldset.
+
+    Args:
+        fieldset: Key in FIELDSETS, e.g. "users".
+        fields: Value of the `fields` query parameter, None for the default.
+
+    Returns:
+        A tuple of column names, `id` first, in the whitelist's order.
+
+    Raises:
+        ValueError: If an unknown or forbidden column is requested.
+    """
+    spec = FIELDSETS[fieldset]
+    if not fields:
+        return spec["default"]
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(spec["allowed"])
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Allowed fields: {', '.join(spec['allowed'])}")
+    requested.add("id")
+    return tuple(name for name in spec["allowed"] if name in requested)
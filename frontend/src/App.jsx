@@ -16,6 +16,34 @@ import {
 // Connects directly to your Uvicorn backend
 const API_BASE_URL = 'http://127.0.0.1:8000';
 
+// Refetches a list whenever the server reports a change to its table
+// (Server-Sent Events from /events) instead of polling. `resync` and
+// `evicted` mean events were missed, so those refetch too.
+const useLiveUpdates = (table, refetch) => {
+  useEffect(() => {
+    const source = new EventSource(`${API_BASE_URL}/events?tables=${table}`);
+    ['create', 'update', 'delete', 'resync', 'evicted'].forEach(type => source.addEventListener(type, refetch));
+    return () => source.close();
+  }, []);
+};
+
+// Fetches every page of a list endpoint. Lists are paged by the server, the
+// cursor for the next page comes in the X-Next-Cursor header and is sent back
+// as `after`. Returns null if a page fails.
+const fetchAllPages = async (path) => {
+  const rows = [];
+  let cursor = null;
+  do {
+    const url = new URL(`${API_BASE_URL}${path}`);
+    if (cursor) url.searchParams.set('after', cursor);
+    const res = await fetch(url);
+    if (!res.ok) return null;
+    rows.push(...await res.json());
+    cursor = res.headers.get('X-Next-Cursor');
+  } while (cursor);
+  return rows;
+};
+
 // --- UI COMPONENTS ---
 
 const Button = ({ children, onClick, variant = 'primary', className = "", type = "button" }) => {
@@ -149,12 +177,13 @@ const KahootsView = ({ onSelect }) => {
 
   const fetchKahoots = async () => {
     try {
-      const res = await fetch(`${API_BASE_URL}/your_kahoots`);
-      if (res.ok) setKahoots(await res.json());
+      const rows = await fetchAllPages('/your_kahoots?fields=id,title,description,is_private');
+      if (rows) setKahoots(rows);
     } catch (e) { console.error("API Error:", e); }
   };
 
   useEffect(() => { fetchKahoots(); }, []);
+  useLiveUpdates('your_kahoot', fetchKahoots);
 
   const handleCreate = async (e) => {
     e.preventDefault();
@@ -247,12 +276,13 @@ const UsersView = () => {
 
   const fetchUsers = async () => {
     try {
-      const res = await fetch(`${API_BASE_URL}/users`);
-      if (res.ok) setUsers(await res.json());
+      const rows = await fetchAllPages('/users');
+      if (rows) setUsers(rows);
     } catch(e) { console.error(e); }
   };
 
   useEffect(() => { fetchUsers(); }, []);
+  useLiveUpdates('users', fetchUsers);
 
   const handleCreate = async (e) => {
     e.preventDefault();
@@ -344,12 +374,13 @@ const GroupsView = () => {
 
   const fetchGroups = async () => {
     try {
-      const res = await fetch(`${API_BASE_URL}/groups`);
-      if (res.ok) setGroups(await res.json());
+      const rows = await fetchAllPages('/groups');
+      if (rows) setGroups(rows);
     } catch(e) {}
   };
 
   useEffect(() => { fetchGroups(); }, []);
+  useLiveUpdates('groups', fetchGroups);
 
   const handleCreate = async (e) => {
     e.preventDefault();
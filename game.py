@@ -0,0 +1,420 @@
+import asyncio
+import json
+import os
+import secrets
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from grading import WRITTEN_ANSWER_MAX_DISTANCE, AnswerIndex
+from leaderboard import Leaderboard
+
+# Live game sessions. A session loads its kahoot's questions once into the
+# compact Question objects below, after that joining, question timers,
+# answering and scoring are plain dict operations in memory; Postgres is only
+# written once, when the finished game's summary goes into kahoot_report.
+# Sessions live in the worker that created them, so with several workers the
+# players of a game have to be routed to the same one (sticky sessions).
+
+DEFAULT_QUESTION_TIME = float(os.getenv("GAME_QUESTION_TIME", "20"))
+MAX_PLAYERS = int(os.getenv("GAME_MAX_PLAYERS", "10000"))
+# points for a correct answer given instantly, an answer at the deadline
+# still earns half
+MAX_POINTS = 1000
+# players listed in the leaderboard event sent after each reveal
+LEADERBOARD_BROADCAST_SIZE = 10
+# seconds before SessionRegistry.reap drops a game nobody has touched, and a
+# finished game whose report never got saved
+SESSION_IDLE_TTL = float(os.getenv("GAME_SESSION_IDLE_TTL", "3600"))
+FINISHED_SESSION_TTL = float(os.getenv("GAME_FINISHED_SESSION_TTL", "600"))
+SESSION_REAP_INTERVAL = 60
+
+TRUE_FALSE = "True/False"
+WRITTEN = "Written"
+SLIDE = "Slide"
+
+
+class GameError(Exception):
+    """
+    Raised for actions the session's current state doesn't allow.
+    """
+
+
+class Question:
+    __slots__ = ("index", "id", "type", "text", "correct", "time_limit")
+
+    def __init__(self, index, id, type, text, correct, time_limit):
+        self.index = index
+        self.id = id
+        self.type = type
+        self.text = text
+        # bool for True/False, an AnswerIndex of accepted answers for
+        # Written, None for slides which aren't scored
+        self.correct = correct
+        self.time_limit = time_limit
+
+    def public(self):
+        """
+        The question as sent to players, without the answer.
+        """
+        return {"index": self.index, "id": self.id, "type": self.type, "text": self.text, "time_limit": self.time_limit}
+
+
+def load_questions(rows, written_answers, time_limit=DEFAULT_QUESTION_TIME, max_distance=WRITTEN_ANSWER_MAX_DISTANCE):
+    """
+    Build the session's questions from read_questions_by_kahoot_id rows.
+
+    Args:
+        rows: Rows with position, id, type, question, answer and text.
+        written_answers: Dict of written question id to its accepted answers.
+        time_limit: Seconds players get per question.
+        max_distance: Typos forgiven in written answers, see grading.py.
+
+    Returns:
+        A tuple of Question.
+    """
+    questions = []
+    for row in rows:
+        if row["type"] == TRUE_FALSE:
+            correct = bool(row["answer"])
+        elif row["type"] == WRITTEN:
+            correct = AnswerIndex(written_answers.get(row["id"], ()), max_distance)
+        else:
+            correct = None
+        text = row["question"] if row["type"] != SLIDE else {"title": row["question"], "text": row["text"]}
+        questions.append(Question(len(questions), row["id"], row["type"], text, correct, time_limit))
+    return tuple(questions)
+
+
+class Player:
+    __slots__ = ("id", "name", "score", "correct", "token")
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+        self.score = 0
+        self.correct = 0
+        # secret handed to the player on join, required to answer as them
+        self.token = secrets.token_urlsafe(16)
+
+
+class GameSession:
+    """
+    One running game: players, the current question and its answers.
+
+    States go lobby -> question -> reveal -> question ... -> finished.
+
+    Args:
+        id: Session id, the game PIN players join with.
+        your_kahoot_id: Kahoot being played.
+        questions: Tuple of Question from `load_questions`.
+        max_players: Joins beyond this are refused.
+        clock: Monotonic time function, replaceable in tests.
+    """
+
+    def __init__(self, id, your_kahoot_id, questions, max_players=MAX_PLAYERS, clock=time.monotonic):
+        self.id = id
+        # PINs are reused once a game ends, this tells games apart in game_answers
+        self.game_id = uuid.uuid4()
+        # secret handed to whoever created the game, required to run it
+        self.host_token = secrets.token_urlsafe(16)
+        self.your_kahoot_id = your_kahoot_id
+        self.questions = questions
+        self.max_players = max_players
+        self._clock = clock
+        self.players = {}
+        self.leaderboard = Leaderboard(MAX_POINTS * sum(1 for q in questions if q.type != SLIDE))
+        self.state = "lobby"
+        self.current = None
+        self.started_at = None
+        self.finished_at = None
+        self._deadline = None
+        self._question_started = None
+        self._answers = {}  # player id -> (answer, correct, points) for the current question
+        self._timer = None
+        self._listeners = []
+        self.last_activity = clock()
+
+    def add_listener(self, listener):
+        """
+        Register `listener(event)`, called with {"type": ..., "data": ...} for
+        every question shown, answer revealed and the end of the game,
+        whether the host, the question timer or anything else caused it.
+        """
+        self._listeners.append(listener)
+
+    def _emit(self, event_type, data):
+        event = {"type": event_type, "data": data}
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Game session listener failed. Error message: {e}")
+
+    def is_host(self, token):
+        return token is not None and secrets.compare_digest(token, self.host_token)
+
+    def is_player(self, player_id, token):
+        player = self.players.get(player_id)
+        return player is not None and token is not None and secrets.compare_digest(token, player.token)
+
+    def join(self, name):
+        if self.state == "finished":
+            raise GameError("The game has finished")
+        if len(self.players) >= self.max_players:
+            raise GameError("The game is full")
+        player = Player(len(self.players) + 1, name)
+        self.players[player.id] = player
+        self.last_activity = self._clock()
+        self.leaderboard.add(player.id)
+        return player
+
+    def next_question(self):
+        """
+        Show the next question and start its timer. Answers are accepted until
+        the time limit, then the question closes by itself.
+
+        Returns:
+            The question as sent to players.
+        """
+        if self.state not in ("lobby", "reveal"):
+            raise GameError(f"Can't move to the next question while in state '{self.state}'")
+        index = 0 if self.current is None else self.current.index + 1
+        if index >= len(self.questions):
+            raise GameError("There are no more questions")
+        now = self._clock()
+        self.last_activity = now
+        if self.started_at is None:
+            self.started_at = now
+        self.current = self.questions[index]
+        self.state = "question"
+        self._answers = {}
+        self._question_started = now
+        self._deadline = now + self.current.time_limit
+        self._start_timer(self.current.time_limit)
+        question = self.current.public()
+        self._emit("question", question)
+        return question
+
+    def _start_timer(self, delay):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # no event loop (scripts, tests), the deadline is still enforced on submit
+            return
+        self._timer = loop.call_later(delay, self.close_question)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def grade(self, question, answer):
+        if question.type == TRUE_FALSE:
+            return isinstance(answer, bool) and answer == question.correct
+        if question.type == WRITTEN:
+            return isinstance(answer, str) and question.correct.grade(answer)
+        return False
+
+    def submit(self, player_id, answer):
+        """
+        Accept a player's answer to the current question and score it.
+
+        Returns:
+            A dict with `correct`, the `points` earned, the player's `score`
+            and current `rank`.
+        """
+        player = self.players.get(player_id)
+        if player is None:
+            raise GameError("Unknown player")
+        if self.state != "question" or self.current.type == SLIDE:
+            raise GameError("No question is open for answers")
+        now = self._clock()
+        self.last_activity = now
+        if now > self._deadline:
+            raise GameError("Time is up for this question")
+        if player_id in self._answers:
+            raise GameError("Already answered this question")
+
+        correct = self.grade(self.current, answer)
+        points = 0
+        if correct:
+            elapsed = now - self._question_started
+            points = round(MAX_POINTS * (1 - elapsed / self.current.time_limit / 2))
+            player.score += points
+            player.correct += 1
+            self.leaderboard.update(player_id, player.score)
+        self._answers[player_id] = (answer, correct, points)
+        return {"correct": correct, "points": points, "score": player.score, "rank": self.leaderboard.rank(player_id)}
+
+    def answer_event(self, player_id):
+        """
+        The player's answer to the current question as a game_answers row,
+        for the ingester in ingest.py. Call right after `submit`.
+        """
+        answer, correct, points = self._answers[player_id]
+        return {
+            "game_id": self.game_id,
+            "your_kahoot_id": self.your_kahoot_id,
+            "question_index": self.current.index,
+            "question_id": self.current.id,
+            "player_id": player_id,
+            # Postgres text can't hold NUL characters
+            "answer": answer.replace("\x00", "") if isinstance(answer, str) else json.dumps(answer),
+            "correct": correct,
+            "points": points,
+            "answered_at": datetime.now(timezone.utc),
+        }
+
+    def close_question(self):
+        """
+        Stop accepting answers and return the reveal: the correct answer and
+        how many players answered and got it right.
+        """
+        if self.state != "question":
+            raise GameError("No question is open")
+        self._cancel_timer()
+        self.state = "reveal"
+        question = self.current
+        correct = question.correct
+        if isinstance(correct, AnswerIndex):
+            correct = correct.answers
+        reveal = {
+            "index": question.index,
+            "correct_answer": correct,
+            "answered": len(self._answers),
+            "correct": sum(1 for _, ok, _ in self._answers.values() if ok),
+        }
+        self._emit("reveal", reveal)
+        self._emit("leaderboard", {"players": self.standings(LEADERBOARD_BROADCAST_SIZE)})
+        return reveal
+
+    def finish(self):
+        """
+        End the game and return the summary stored in kahoot_report.
+        """
+        if self.state == "finished":
+            raise GameError("The game has already finished")
+        if self.state == "question":
+            self.close_question()
+        self._cancel_timer()
+        self.state = "finished"
+        self.finished_at = self._clock()
+        self.last_activity = self.finished_at
+        summary = self.summary()
+        self._emit("finished", {
+            **summary,
+            "game_id": str(self.game_id),
+            "duration": summary["duration"].total_seconds(),
+            "standings": self.standings(LEADERBOARD_BROADCAST_SIZE),
+        })
+        return summary
+
+    def standings(self, top=None):
+        """
+        Players by rank, best first.
+
+        Args:
+            top: Only the best this many, all players if None.
+
+        Returns:
+            A list of dicts with rank, player_id, name, score and correct.
+        """
+        entries = self.leaderboard.top(len(self.players) if top is None else top)
+        return [
+            {
+                "rank": rank,
+                "player_id": player_id,
+                "name": self.players[player_id].name,
+                "score": score,
+                "correct": self.players[player_id].correct,
+            }
+            for rank, player_id, score in entries
+        ]
+
+    def player_standing(self, player_id):
+        player = self.players.get(player_id)
+        if player is None:
+            raise GameError("Unknown player")
+        return {
+            "rank": self.leaderboard.rank(player_id),
+            "player_id": player_id,
+            "name": player.name,
+            "score": player.score,
+            "correct": player.correct,
+        }
+
+    def summary(self):
+        end = self.finished_at if self.finished_at is not None else self._clock()
+        start = self.started_at if self.started_at is not None else end
+        return {
+            "your_kahoot_id": self.your_kahoot_id,
+            "total_questions": sum(1 for q in self.questions if q.type != SLIDE),
+            "total_participants": len(self.players),
+            # totalled over the final standings
+            "correct_answers": sum(entry["correct"] for entry in self.standings()),
+            "duration": timedelta(seconds=end - start),
+        }
+
+    def status(self):
+        return {
+            "id": self.id,
+            "game_id": str(self.game_id),
+            "your_kahoot_id": self.your_kahoot_id,
+            "state": self.state,
+            "players": len(self.players),
+            "questions": len(self.questions),
+            "current": self.current.public() if self.current is not None and self.state == "question" else None,
+        }
+
+
+class SessionRegistry:
+    """
+    The sessions running in this worker, keyed by game PIN.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+
+    def create(self, your_kahoot_id, questions, **kwargs):
+        while True:
+            pin = 100000 + secrets.randbelow(900000)
+            if pin not in self._sessions:
+                break
+        session = GameSession(pin, your_kahoot_id, questions, **kwargs)
+        self._sessions[pin] = session
+        return session
+
+    def get(self, session_id):
+        return self._sessions.get(session_id)
+
+    def remove(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session._cancel_timer()
+        return session
+
+    def reap(self, idle_ttl=SESSION_IDLE_TTL, finished_ttl=FINISHED_SESSION_TTL):
+        """
+        Remove games left idle for `idle_ttl` seconds and finished games
+        still here `finished_ttl` seconds after the end (their report was
+        never saved). Run periodically, see the app's lifespan.
+
+        Returns:
+            The ids of the removed sessions.
+        """
+        expired = []
+        for session_id, session in self._sessions.items():
+            idle = session._clock() - session.last_activity
+            ttl = finished_ttl if session.state == "finished" else idle_ttl
+            if idle >= ttl:
+                expired.append(session_id)
+        for session_id in expired:
+            self.remove(session_id)
+        return expired
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+sessions = SessionRegistry()
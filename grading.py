@@ -0,0 +1,101 @@
+import os
+import unicodedata
+
+# Grading of written answers. A question's accepted answers (from
+# quiz_written_answer) are normalised once when the game loads, so grading a
+# submission is a set lookup on its normalised text. With a typo allowance
+# the index also keeps the accepted answers grouped by length, and only
+# those within the allowance are compared, with an edit distance that stops
+# as soon as the limit is exceeded. Players tend to send the same few
+# answers, so every distinct normalised answer is graded once per question
+# and remembered.
+
+# typos (insertions, deletions, substitutions) forgiven in written answers
+WRITTEN_ANSWER_MAX_DISTANCE = int(os.getenv("WRITTEN_ANSWER_MAX_DISTANCE", "0"))
+# shorter answers must match exactly, one typo turns "cat" into "car"
+MIN_FUZZY_LENGTH = 4
+# distinct answers remembered per question
+MAX_REMEMBERED = 10000
+
+
+def normalize_answer(answer):
+    """
+    Case-folded, accents removed and whitespace collapsed, so "  Zürich"
+    and "zurich" compare equal.
+    """
+    decomposed = unicodedata.normalize("NFKD", str(answer))
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def within_distance(a, b, limit):
+    """
+    True if the Levenshtein distance between `a` and `b` is at most `limit`.
+    Only the band of the table within `limit` of the diagonal is computed and
+    the comparison stops once a whole row exceeds the limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    too_far = limit + 1
+    previous = [i if i <= limit else too_far for i in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [too_far] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        best = current[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j - 1] + cost, previous[j] + 1, current[j - 1] + 1)
+            current[j] = value if value <= limit else too_far
+            if current[j] < best:
+                best = current[j]
+        if best > limit:
+            return False
+        previous = current
+    return previous[len(b)] <= limit
+
+
+class AnswerIndex:
+    """
+    The accepted answers of one written question, ready for grading.
+
+    Args:
+        answers: Accepted answers as stored in quiz_written_answer.
+        max_distance: Typos forgiven in answers of MIN_FUZZY_LENGTH or more
+            characters, 0 for exact matches only.
+    """
+
+    def __init__(self, answers, max_distance=WRITTEN_ANSWER_MAX_DISTANCE):
+        self.answers = sorted(set(answers))
+        self.max_distance = max_distance
+        self._exact = frozenset(normalize_answer(answer) for answer in self.answers)
+        self._by_length = {}
+        for answer in self._exact:
+            self._by_length.setdefault(len(answer), []).append(answer)
+        self._graded = {}
+
+    def __len__(self):
+        return len(self._exact)
+
+    def _match(self, normalized):
+        if normalized in self._exact:
+            return True
+        limit = self.max_distance
+        if not limit or len(normalized) < MIN_FUZZY_LENGTH:
+            return False
+        for length in range(len(normalized) - limit, len(normalized) + limit + 1):
+            for accepted in self._by_length.get(length, ()):
+                if len(accepted) >= MIN_FUZZY_LENGTH and within_distance(normalized, accepted, limit):
+                    return True
+        return False
+
+    def grade(self, answer):
+        normalized = normalize_answer(answer)
+        correct = self._graded.get(normalized)
+        if correct is None:
+            correct = self._match(normalized)
+            if len(self._graded) < MAX_REMEMBERED:
+                self._graded[normalized] = correct
+        return correct
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+# Buffered writes of game answers. Inserting every answer in its own
+# transaction would mean one round trip and one commit per answer, thousands
+# per question in a big game. Answers are appended to an in-memory buffer
+# instead and a background task writes them in batches (a COPY per batch,
+# see copy_game_answers in db_async.py) whenever a batch is full or the flush
+# interval has passed. The buffer is bounded: when the database can't keep
+# up, `put` waits for room, which slows down answering rather than letting
+# memory grow.
+
+ANSWER_BATCH_SIZE = int(os.getenv("ANSWER_BATCH_SIZE", "1000"))
+ANSWER_FLUSH_INTERVAL = float(os.getenv("ANSWER_FLUSH_INTERVAL", "0.5"))
+ANSWER_BUFFER_SIZE = int(os.getenv("ANSWER_BUFFER_SIZE", "50000"))
+# flush durations kept for the latency figures in stats()
+LATENCY_SAMPLES = 256
+
+
+class AnswerIngester:
+    """
+    Collects answer events and writes them in batches.
+
+    Args:
+        write: Coroutine function called with a list of events, e.g. one
+            running copy_game_answers on a pool connection.
+        batch_size: Events written per call to `write`, a full batch is
+            flushed straight away.
+        flush_interval: Seconds an event waits at most before a flush starts.
+        buffer_size: Events held (buffered or being written) before `put` waits.
+        data_errors: Exception types `write` raises for events the database
+            will never accept, e.g. psycopg.DataError. Other errors are
+            retried.
+        clock: Timer for the latency figures, replaceable in tests.
+    """
+
+    def __init__(
+        self,
+        write,
+        batch_size=ANSWER_BATCH_SIZE,
+        flush_interval=ANSWER_FLUSH_INTERVAL,
+        buffer_size=ANSWER_BUFFER_SIZE,
+        data_errors=(),
+        clock=time.perf_counter,
+    ):
+        self._write = write
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self._data_errors = tuple(data_errors)
+        self._clock = clock
+        self._buffer = []
+        self._in_flight = 0
+        self._batch_ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.rejected = 0
+        self.backpressure_waits = 0
+
+    def __len__(self):
+        return len(self._buffer) + self._in_flight
+
+    async def put(self, event):
+        """
+        Buffer an event, waiting while the buffer is full.
+        """
+        if len(self) >= self.buffer_size:
+            self.backpressure_waits += 1
+            while len(self) >= self.buffer_size:
+                self._space.clear()
+                await self._space.wait()
+        self._buffer.append(event)
+        if len(self._buffer) >= self.batch_size:
+            self._batch_ready.set()
+
+    async def flush(self):
+        """
+        Write everything buffered so far, a batch at a time. A batch the
+        database refuses with one of `data_errors` is split in halves until
+        the offending events are found; those are dropped and counted in
+        `rejected`. A batch that fails for any other reason (e.g. the database
+        is down) goes back to the front of the buffer and is retried on the
+        next flush.
+
+        Returns:
+            True if the buffer was emptied, False if a write failed.
+        """
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                if len(self._buffer) < self.batch_size:
+                    self._batch_ready.clear()
+                self._in_flight = len(batch)
+                pending = [batch]
+                started = self._clock()
+                try:
+                    while pending:
+                        part = pending.pop(0)
+                        try:
+                            await self._write(part)
+                        except self._data_errors as e:
+                            if len(part) == 1:
+                                self.rejected += 1
+                                print(f"Dropped a game answer the database refused. Error message: {e}")
+                            else:
+                                middle = len(part) // 2
+                                pending[0:0] = [part[:middle], part[middle:]]
+                            continue
+                        except BaseException:
+                            pending.insert(0, part)
+                            raise
+                        self.written += len(part)
+                except Exception as e:
+                    self._buffer[:0] = [event for part in pending for event in part]
+                    self.failed_flushes += 1
+                    print(f"Unable to write {len(batch)} game answers, will retry. Error message: {e}")
+                    return False
+                except asyncio.CancelledError:
+                    # stopped mid write, keep what is left for the final flush
+                    self._buffer[:0] = [event for part in pending for event in part]
+                    raise
+                finally:
+                    self._in_flight = 0
+                    self._space.set()
+                self._latencies.append(self._clock() - started)
+                self.flushes += 1
+            return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            if not await self.flush():
+                # don't retry a full batch in a tight loop while the database is down
+                await asyncio.sleep(self.flush_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the background task and write what is left.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+        latency = None
+        if latencies:
+            latency = {
+                "last_ms": round(self._latencies[-1] * 1000, 3),
+                "avg_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+                "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 3),
+                "max_ms": round(latencies[-1] * 1000, 3),
+            }
+        return {
+            "buffered": len(self._buffer),
+            "in_flight": self._in_flight,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "rejected": self.rejected,
+            "backpressure_waits": self.backpressure_waits,
+            "flush_latency": latency,
+        }
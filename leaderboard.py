@@ -0,0 +1,117 @@
+import bisect
+
+# Live ranking of a game's players. Scores are whole points between 0 and a
+# maximum known when the game starts (MAX_POINTS per scored question), so
+# instead of sorting all players after every answer, the number of players
+# on each score is kept in a Fenwick tree indexed from the highest score
+# down. Updating a score, a player's rank and finding the next occupied
+# score are O(log max_score); top-K walks only the scores it returns. Each
+# score keeps its players sorted by join order, so a tie (everyone on 0 at
+# the start of a game) is listed by slicing off the first K, not by scanning
+# every tied player.
+
+
+class Leaderboard:
+    """
+    Scores and ranks of a game's players.
+
+    Ranks are competition style: players on the same score share a rank
+    and the next rank is skipped (1, 2, 2, 4). Within a score the player
+    who joined first is listed first.
+
+    Args:
+        max_score: Highest score a player can reach.
+    """
+
+    def __init__(self, max_score):
+        self.max_score = max_score
+        self._tree = [0] * (max_score + 2)
+        self._scores = {}  # player id -> score
+        self._joined = {}  # player id -> join sequence
+        self._buckets = {}  # score -> sorted list of (join sequence, player id)
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, player_id):
+        return player_id in self._scores
+
+    def _index(self, score):
+        # highest score first, Fenwick indexes start at 1
+        return self.max_score - score + 1
+
+    def _add(self, index, delta):
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def _prefix(self, index):
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def _find(self, count):
+        """
+        Smallest index whose prefix sum reaches `count`.
+        """
+        index = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            next_index = index + step
+            if next_index < len(self._tree) and self._tree[next_index] < count:
+                index = next_index
+                count -= self._tree[next_index]
+            step >>= 1
+        return index + 1
+
+    def _place(self, player_id, score):
+        if not 0 <= score <= self.max_score:
+            raise ValueError(f"Score {score} is outside 0..{self.max_score}")
+        self._scores[player_id] = score
+        bisect.insort(self._buckets.setdefault(score, []), (self._joined[player_id], player_id))
+        self._add(self._index(score), 1)
+
+    def _take(self, player_id):
+        score = self._scores.pop(player_id)
+        bucket = self._buckets[score]
+        del bucket[bisect.bisect_left(bucket, (self._joined[player_id], player_id))]
+        if not bucket:
+            del self._buckets[score]
+        self._add(self._index(score), -1)
+
+    def add(self, player_id, score=0):
+        if player_id in self._scores:
+            raise ValueError(f"Player {player_id} is already on the leaderboard")
+        self._joined[player_id] = len(self._joined)
+        self._place(player_id, score)
+
+    def update(self, player_id, score):
+        if self._scores[player_id] == score:
+            return
+        self._take(player_id)
+        self._place(player_id, score)
+
+    def score(self, player_id):
+        return self._scores[player_id]
+
+    def rank(self, player_id):
+        """
+        1 plus the number of players with a higher score.
+        """
+        return self._prefix(self._index(self._scores[player_id]) - 1) + 1
+
+    def top(self, k):
+        """
+        The best `k` players as (rank, player id, score) tuples, best first.
+        """
+        k = min(k, len(self._scores))
+        standings = []
+        while len(standings) < k:
+            rank = len(standings) + 1
+            score = self.max_score - self._find(rank) + 1
+            # the whole bucket shares a rank, only the first few are needed
+            for _, player_id in self._buckets[score][:k - len(standings)]:
+                standings.append((rank, player_id, score))
+        return standings
@@ -0,0 +1,79 @@
+# Read-through cache for the small lookup tables. Rows are served from memory;
+# writes send a NOTIFY on LOOKUP_CHANNEL (see create_languages and friends in
+# db.py / db_async.py) and every worker's listener drops its copy of that
+# table. While the listener is not connected the cache is bypassed, since
+# invalidations from other workers could be missed.
+
+LOOKUP_TABLES = ("languages", "subscriptions", "customer_types")
+LOOKUP_CHANNEL = "lookup_changed"
+
+
+class LookupCache:
+    """
+    Caches every row of the lookup tables, keyed by table.
+
+    Args:
+        listener: NotificationListener delivering invalidations.
+        load: Coroutine function returning the rows of a table.
+    """
+
+    def __init__(self, listener, load):
+        self._listener = listener
+        self._load = load
+        self._rows = {}
+        self._by_id = {}
+        # bumped on every invalidation so a load that raced with one is not stored
+        self._generation = {table: 0 for table in LOOKUP_TABLES}
+        self.hits = 0
+        self.misses = 0
+
+        listener.subscribe(LOOKUP_CHANNEL, self.invalidate)
+        listener.on_reconnect(self.invalidate_all)
+
+    def invalidate(self, table):
+        if table not in LOOKUP_TABLES:
+            return
+        self._generation[table] += 1
+        self._rows.pop(table, None)
+        self._by_id.pop(table, None)
+
+    def invalidate_all(self, *_):
+        for table in LOOKUP_TABLES:
+            self.invalidate(table)
+
+    async def get_all(self, table):
+        """
+        Return every row of a lookup table ordered by id.
+
+        Raises:
+            ValueError: If `table` is not a lookup table.
+        """
+        if table not in LOOKUP_TABLES:
+            raise ValueError(f"{table} is not a lookup table")
+        rows = self._rows.get(table)
+        if rows is not None:
+            self.hits += 1
+            return rows
+
+        self.misses += 1
+        generation = self._generation[table]
+        rows = await self._load(table)
+        if self._listener.connected and generation == self._generation[table]:
+            self._rows[table] = rows
+            self._by_id[table] = {row["id"]: row for row in rows}
+        return rows
+
+    async def get(self, table, id):
+        """
+        Return one row of a lookup table, or None if the id doesn't exist.
+        """
+        by_id = self._by_id.get(table)
+        if by_id is None:
+            rows = await self.get_all(table)
+            by_id = self._by_id.get(table) or {row["id"]: row for row in rows}
+        else:
+            self.hits += 1
+        return by_id.get(id)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "cached_tables": sorted(self._rows)}
@@ -0,0 +1,543 @@
+from collections import namedtuple
+
+import psycopg2
+
+# Versioned schema migrations. Each migration is applied once and recorded in
+# schema_migrations, so once the schema is current `migrate` costs a single
+# query. Add new migrations at the end of MIGRATIONS with the next version
+# number, never edit one that has already shipped.
+
+# arbitrary key for pg_advisory_lock so concurrent workers migrate one at a time
+MIGRATION_LOCK_ID = 7245101
+
+# statements run inside one transaction, indexes are built afterwards with
+# CREATE INDEX CONCURRENTLY (which can't run in a transaction) as
+# (name, table, columns) tuples
+Migration = namedtuple("Migration", ["version", "description", "statements", "indexes"])
+
+SCHEMA_MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations(
+    version INT PRIMARY KEY,
+    description VARCHAR(200) NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+)
+"""
+
+SUBSCRIPTIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS subscriptions(
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(20) NOT NULL
+)
+"""
+
+LANGUAGES_TABLE = """
+CREATE TABLE IF NOT EXISTS languages(
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(50) NOT NULL
+)
+"""
+
+CUSTOMER_TYPES_TABLE = """
+CREATE TABLE IF NOT EXISTS customer_types(
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(30) NOT NULL
+)
+"""
+
+USERS_TABLE = """
+CREATE TABLE IF NOT EXISTS users(
+    id SERIAL PRIMARY KEY,
+    username VARCHAR(50) NOT NULL UNIQUE,
+    email VARCHAR(255) NOT NULL UNIQUE,
+    password VARCHAR(255) NOT NULL,
+    birthdate DATE NOT NULL,
+    signup_date TIMESTAMP NOT NULL DEFAULT NOW(),
+    name VARCHAR(255),
+    organisation VARCHAR(50),
+    subscriptions_id INT NOT NULL REFERENCES subscriptions(id) ON DELETE RESTRICT,
+    language_id INT NOT NULL REFERENCES languages(id) ON DELETE RESTRICT,
+    customer_type_id INT NOT NULL REFERENCES customer_types(id) ON DELETE RESTRICT
+)
+"""
+
+YOUR_KAHOOT_TABLE = """
+CREATE TABLE IF NOT EXISTS your_kahoot(
+    id SERIAL PRIMARY KEY,
+    title VARCHAR(80) NOT NULL,
+    description VARCHAR(500),
+    is_private BOOLEAN,
+    language_id INT NOT NULL REFERENCES languages(id) ON DELETE RESTRICT
+)
+"""
+
+IMAGES_TABLE = """
+CREATE TABLE IF NOT EXISTS images(
+    id SERIAL PRIMARY KEY,
+    link VARCHAR(500),
+    your_kahoot_id INT UNIQUE REFERENCES your_kahoot(id) ON DELETE SET NULL
+)
+"""
+
+KAHOOT_OWNERS_TABLE = """
+CREATE TABLE IF NOT EXISTS kahoot_owners(
+    id SERIAL PRIMARY KEY,
+    users_id INT REFERENCES users(id) ON DELETE SET NULL,
+    your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL,
+    UNIQUE(users_id, your_kahoot_id)
+)
+"""
+
+FAVORITE_KAHOOTS_TABLE = """
+CREATE TABLE IF NOT EXISTS favorite_kahoots(
+    id SERIAL PRIMARY KEY,
+    users_id INT REFERENCES users(id) ON DELETE SET NULL,
+    your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL,
+    UNIQUE(users_id, your_kahoot_id)
+)
+"""
+
+KAHOOT_REPORT_TABLE = """
+CREATE TABLE IF NOT EXISTS kahoot_report(
+    id SERIAL PRIMARY KEY,
+    total_questions INT NOT NULL,
+    total_participants INT NOT NULL,
+    correct_answers INT,
+    duration INTERVAL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL
+)
+"""
+
+GROUPS_TABLE = """
+CREATE TABLE IF NOT EXISTS groups(
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(50) NOT NULL,
+    description VARCHAR(200)
+)
+"""
+
+USER_GROUP_MEMBERS_TABLE = """
+CREATE TABLE IF NOT EXISTS user_group_members(
+    id SERIAL PRIMARY KEY,
+    user_id INT REFERENCES users(id) ON DELETE SET NULL,
+    group_id INT REFERENCES groups(id) ON DELETE SET NULL,
+    UNIQUE(user_id, group_id)
+)
+"""
+
+GROUPS_AND_KAHOOTS_TABLE = """
+CREATE TABLE IF NOT EXISTS groups_and_kahoots(
+    id SERIAL PRIMARY KEY,
+    group_id INT REFERENCES groups(id) ON DELETE SET NULL,
+    your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL,
+    UNIQUE(group_id, your_kahoot_id)
+)
+"""
+
+GROUP_MESSAGES_TABLE = """
+CREATE TABLE IF NOT EXISTS group_messages(
+    id SERIAL PRIMARY KEY,
+    text VARCHAR(400) NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    user_id INT REFERENCES users(id) ON DELETE SET NULL,
+    group_id INT REFERENCES groups(id) ON DELETE SET NULL
+)
+"""
+
+SAVED_PAYMENT_CARD_TABLE = """
+CREATE TABLE IF NOT EXISTS saved_payment_card(
+    id SERIAL PRIMARY KEY,
+    payment_provider VARCHAR(20),
+    payment_method_token VARCHAR(255),
+    card_type VARCHAR(50) CHECK (card_type IN ('Visa', 'Mastercard', 'American Express')),
+    last_four CHAR(4),
+    expiration_month INT,
+    expiration_year INT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    user_id INT REFERENCES users(id) ON DELETE SET NULL
+)
+"""
+
+SAVED_PAYPAL_TABLE = """
+CREATE TABLE IF NOT EXISTS saved_paypal(
+    id SERIAL PRIMARY KEY,
+    payment_method_token VARCHAR(255),
+    firstname VARCHAR(100),
+    lastname VARCHAR(100),
+    payment_email VARCHAR(255),
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    user_id INT REFERENCES users(id) ON DELETE SET NULL
+)
+"""
+
+SAVED_GOOGLE_PAY_TABLE = """
+CREATE TABLE IF NOT EXISTS saved_google_pay(
+    id SERIAL PRIMARY KEY,
+    payment_method_token VARCHAR(255),
+    firstname VARCHAR(100),
+    lastname VARCHAR(100),
+    payment_email VARCHAR(255),
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    user_id INT REFERENCES users(id) ON DELETE SET NULL
+)
+"""
+
+TRANSACTIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS transactions(
+    id SERIAL PRIMARY KEY,
+    payment_method_token VARCHAR(255),
+    amount DECIMAL(10,2),
+    currency CHAR(3),
+    status VARCHAR(20),
+    provider VARCHAR(20),
+    transaction_id VARCHAR(255),
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    subscriptions_id INT REFERENCES subscriptions(id) ON DELETE SET NULL,
+    saved_payment_card_id INT REFERENCES saved_payment_card(id) ON DELETE SET NULL,
+    saved_paypal_id INT REFERENCES saved_paypal(id) ON DELETE SET NULL,
+    saved_google_pay_id INT REFERENCES saved_google_pay(id) ON DELETE SET NULL,
+    user_id INT REFERENCES users(id) ON DELETE SET NULL
+)
+"""
+
+QUIZ_WITH_WRITTEN_ANSWER_TABLE = """
+CREATE TABLE IF NOT EXISTS quiz_with_written_answer(
+    id SERIAL PRIMARY KEY,
+    question VARCHAR(100) NOT NULL,
+    your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL
+)
+"""
+
+QUIZ_WRITTEN_ANSWER_TABLE = """
+CREATE TABLE IF NOT EXISTS quiz_written_answer(
+    id SERIAL PRIMARY KEY,
+    answer VARCHAR(100) NOT NULL,
+    quiz_with_written_answer_id INT REFERENCES quiz_with_written_answer(id) ON DELETE SET NULL
+)
+"""
+
+QUIZ_WITH_TRUE_FALSE_TABLE = """
+CREATE TABLE IF NOT EXISTS quiz_with_true_false(
+    id SERIAL PRIMARY KEY,
+    question VARCHAR(100) NOT NULL,
+    answer BOOLEAN NOT NULL,
+    your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL
+)
+"""
+
+PRESENTATION_CLASSIC_TABLE = """
+CREATE TABLE IF NOT EXISTS presentation_classic(
+    id SERIAL PRIMARY KEY,
+    title VARCHAR(100),
+    text VARCHAR(500),
+    your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL
+)
+"""
+
+SURVEY_OPEN_QUESTION_TABLE = """
+CREATE TABLE IF NOT EXISTS survey_open_question(
+    id SERIAL PRIMARY KEY,
+    question VARCHAR(100),
+    answer_text VARCHAR(250),
+    your_kahoot_id INT REFERENCES your_kahoot(id) ON DELETE SET NULL
+)
+"""
+
+BASELINE_TABLES = [
+    SUBSCRIPTIONS_TABLE,
+    LANGUAGES_TABLE,
+    CUSTOMER_TYPES_TABLE,
+    USERS_TABLE,
+    YOUR_KAHOOT_TABLE,
+    IMAGES_TABLE,
+    KAHOOT_OWNERS_TABLE,
+    FAVORITE_KAHOOTS_TABLE,
+    KAHOOT_REPORT_TABLE,
+    GROUPS_TABLE,
+    USER_GROUP_MEMBERS_TABLE,
+    GROUPS_AND_KAHOOTS_TABLE,
+    GROUP_MESSAGES_TABLE,
+    SAVED_PAYMENT_CARD_TABLE,
+    SAVED_PAYPAL_TABLE,
+    SAVED_GOOGLE_PAY_TABLE,
+    TRANSACTIONS_TABLE,
+    QUIZ_WITH_WRITTEN_ANSWER_TABLE,
+    QUIZ_WRITTEN_ANSWER_TABLE,
+    QUIZ_WITH_TRUE_FALSE_TABLE,
+    PRESENTATION_CLASSIC_TABLE,
+    SURVEY_OPEN_QUESTION_TABLE,
+]
+
+# Postgres indexes primary keys and UNIQUE constraints but not referencing
+# columns, so joins and ON DELETE SET NULL cascades scanned whole tables.
+# Columns already leading a UNIQUE constraint (kahoot_owners.users_id,
+# favorite_kahoots.users_id, user_group_members.user_id,
+# groups_and_kahoots.group_id, images.your_kahoot_id) are covered.
+FOREIGN_KEY_INDEXES = [
+    ("users_subscriptions_id_idx", "users", "subscriptions_id"),
+    ("users_language_id_idx", "users", "language_id"),
+    ("users_customer_type_id_idx", "users", "customer_type_id"),
+    ("your_kahoot_language_id_idx", "your_kahoot", "language_id"),
+    ("kahoot_owners_your_kahoot_id_idx", "kahoot_owners", "your_kahoot_id"),
+    ("favorite_kahoots_your_kahoot_id_idx", "favorite_kahoots", "your_kahoot_id"),
+    ("kahoot_report_your_kahoot_id_idx", "kahoot_report", "your_kahoot_id"),
+    ("user_group_members_group_id_idx", "user_group_members", "group_id"),
+    ("groups_and_kahoots_your_kahoot_id_idx", "groups_and_kahoots", "your_kahoot_id"),
+    ("group_messages_user_id_idx", "group_messages", "user_id"),
+    ("group_messages_group_id_created_at_idx", "group_messages", "group_id, created_at"),
+    ("saved_payment_card_user_id_idx", "saved_payment_card", "user_id"),
+    ("saved_paypal_user_id_idx", "saved_paypal", "user_id"),
+    ("saved_google_pay_user_id_idx", "saved_google_pay", "user_id"),
+    ("transactions_user_id_idx", "transactions", "user_id"),
+    ("transactions_subscriptions_id_idx", "transactions", "subscriptions_id"),
+    ("transactions_saved_payment_card_id_idx", "transactions", "saved_payment_card_id"),
+    ("transactions_saved_paypal_id_idx", "transactions", "saved_paypal_id"),
+    ("transactions_saved_google_pay_id_idx", "transactions", "saved_google_pay_id"),
+    ("quiz_with_written_answer_your_kahoot_id_idx", "quiz_with_written_answer", "your_kahoot_id"),
+    ("quiz_written_answer_quiz_with_written_answer_id_idx", "quiz_written_answer", "quiz_with_written_answer_id"),
+    ("quiz_with_true_false_your_kahoot_id_idx", "quiz_with_true_false", "your_kahoot_id"),
+    ("presentation_classic_your_kahoot_id_idx", "presentation_classic", "your_kahoot_id"),
+    ("survey_open_question_your_kahoot_id_idx", "survey_open_question", "your_kahoot_id"),
+]
+
+# Per-table change counters behind the ETags in app.py. A statement level
+# trigger stores a fresh value from one sequence on every write, so a version
+# never repeats and reading it is a primary key lookup instead of a scan.
+TABLE_VERSIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS table_versions(
+    table_name VARCHAR(63) PRIMARY KEY,
+    version BIGINT NOT NULL
+)
+"""
+
+TABLE_VERSIONS_SEQUENCE = "CREATE SEQUENCE IF NOT EXISTS table_versions_seq"
+
+BUMP_TABLE_VERSION_FUNCTION = """
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO table_versions (table_name, version)
+    VALUES (TG_TABLE_NAME, nextval('table_versions_seq'))
+    ON CONFLICT (table_name) DO UPDATE SET version = EXCLUDED.version;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+VERSIONED_TABLES = (
+    "users",
+    "your_kahoot",
+    "groups",
+    "kahoot_owners",
+    "favorite_kahoots",
+    "user_group_members",
+)
+
+
+def _version_triggers(tables):
+    statements = []
+    for table in tables:
+        statements.append(f"DROP TRIGGER IF EXISTS {table}_bump_version ON {table}")
+        statements.append(f"""
+        CREATE TRIGGER {table}_bump_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+        """)
+    return statements
+
+
+# Change log behind GET /changes. A row level trigger records every insert,
+# update and delete on CHANGE_LOG_TABLES together with the writing
+# transaction's id, which lets the reader hand out a watermark that no
+# still-running transaction can fall behind (see read_changes in db_async.py).
+# TRUNCATE is not logged.
+CHANGE_LOG_TABLE = """
+CREATE TABLE IF NOT EXISTS change_log(
+    id BIGSERIAL PRIMARY KEY,
+    txid BIGINT NOT NULL DEFAULT txid_current(),
+    table_name VARCHAR(63) NOT NULL,
+    row_id INT NOT NULL,
+    operation VARCHAR(6) NOT NULL CHECK (operation IN ('insert', 'update', 'delete')),
+    changed_at TIMESTAMP NOT NULL DEFAULT NOW()
+)
+"""
+
+CHANGE_LOG_INDEX = "CREATE INDEX IF NOT EXISTS change_log_txid_id_idx ON change_log (txid, id)"
+
+LOG_CHANGE_FUNCTION = """
+CREATE OR REPLACE FUNCTION log_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO change_log (table_name, row_id, operation) VALUES (TG_TABLE_NAME, OLD.id, 'delete');
+    ELSE
+        INSERT INTO change_log (table_name, row_id, operation) VALUES (TG_TABLE_NAME, NEW.id, lower(TG_OP));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+CHANGE_LOG_TABLES = ("your_kahoot", "users", "groups")
+
+
+def _change_log_triggers(tables):
+    statements = []
+    for table in tables:
+        statements.append(f"DROP TRIGGER IF EXISTS {table}_log_change ON {table}")
+        statements.append(f"""
+        CREATE TRIGGER {table}_log_change
+        AFTER INSERT OR UPDATE OR DELETE ON {table}
+        FOR EACH ROW EXECUTE FUNCTION log_change()
+        """)
+    return statements
+
+
+# Where pruning (prune_change_log in db_async.py) has cut the change log: the
+# (txid, id) of the newest entry deleted so far. Clients whose position is
+# behind it may have missed changes and have to start over.
+CHANGE_LOG_PRUNED_TABLE = """
+CREATE TABLE IF NOT EXISTS change_log_pruned(
+    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+    txid BIGINT NOT NULL,
+    last_id BIGINT NOT NULL,
+    pruned_at TIMESTAMP NOT NULL DEFAULT NOW()
+)
+"""
+
+CHANGE_LOG_RETENTION_INDEXES = [("change_log_changed_at_idx", "change_log", "changed_at")]
+
+# One row per answer given in a live game, written in batches with COPY by
+# the ingester in ingest.py. A game's kahoot_report can be rebuilt from its
+# rows (see read_game_report in db_async.py). There are no foreign keys: the
+# rows are a log of what happened, and a kahoot deleted mid game must not
+# make a whole batch fail.
+GAME_ANSWERS_TABLE = """
+CREATE TABLE IF NOT EXISTS game_answers(
+    id BIGSERIAL PRIMARY KEY,
+    game_id UUID NOT NULL,
+    your_kahoot_id INT,
+    question_index INT NOT NULL,
+    question_id INT NOT NULL,
+    player_id INT NOT NULL,
+    answer TEXT,
+    correct BOOLEAN NOT NULL,
+    points INT NOT NULL,
+    answered_at TIMESTAMPTZ NOT NULL
+)
+"""
+
+GAME_ANSWERS_INDEX = "CREATE INDEX IF NOT EXISTS game_answers_game_id_idx ON game_answers (game_id)"
+
+
+MIGRATIONS = [
+    Migration(1, "baseline tables", BASELINE_TABLES, []),
+    Migration(2, "foreign key and lookup indexes", [], FOREIGN_KEY_INDEXES),
+    Migration(
+        3,
+        "table change counters",
+        [TABLE_VERSIONS_TABLE, TABLE_VERSIONS_SEQUENCE, BUMP_TABLE_VERSION_FUNCTION, *_version_triggers(VERSIONED_TABLES)],
+        [],
+    ),
+    Migration(
+        4,
+        "change log",
+        [CHANGE_LOG_TABLE, CHANGE_LOG_INDEX, LOG_CHANGE_FUNCTION, *_change_log_triggers(CHANGE_LOG_TABLES)],
+        [],
+    ),
+    Migration(5, "game answers", [GAME_ANSWERS_TABLE, GAME_ANSWERS_INDEX], []),
+    Migration(6, "change log retention", [CHANGE_LOG_PRUNED_TABLE], CHANGE_LOG_RETENTION_INDEXES),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(con):
+    """
+    Return the highest applied migration version, 0 for a fresh database.
+
+    Args:
+        con: A psycopg2 connection in autocommit mode.
+    """
+    with con.cursor() as cur:
+        try:
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        except psycopg2.errors.UndefinedTable:
+            return 0
+        return cur.fetchone()[0]
+
+
+def _create_index_concurrently(cur, name, table, columns):
+    # a failed concurrent build leaves an INVALID index behind that
+    # IF NOT EXISTS would happily skip, so drop it and build again
+    cur.execute("""
+        SELECT 1 FROM pg_index
+        JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+        WHERE pg_class.relname = %s AND NOT pg_index.indisvalid
+    """, (name,))
+    if cur.fetchone():
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def _apply(con, migration):
+    con.autocommit = False
+    with con:
+        with con.cursor() as cur:
+            for statement in migration.statements:
+                cur.execute(statement)
+
+    con.autocommit = True
+    with con.cursor() as cur:
+        for name, table, columns in migration.indexes:
+            _create_index_concurrently(cur, name, table, columns)
+        cur.execute(
+            "INSERT INTO schema_migrations (version, description) VALUES (%s, %s) ON CONFLICT (version) DO NOTHING",
+            (migration.version, migration.description),
+        )
+
+
+def migrate(con):
+    """
+    Apply every migration newer than the database's recorded version.
+
+    Returns straight away after one query when the schema is current.
+    Otherwise it takes an advisory lock so only one process migrates at a
+    time and applies the pending migrations in order.
+
+    Args:
+        con: An active psycopg2 connection. Left in its original
+            autocommit mode afterwards.
+
+    Returns:
+        A list with the versions that were applied.
+
+    Raises:
+        psycopg2.DatabaseError: If a migration fails. Earlier migrations stay
+            recorded, the failing one is retried on the next run.
+    """
+    autocommit = con.autocommit
+    con.autocommit = True
+    applied = []
+    try:
+        if current_version(con) >= LATEST_VERSION:
+            return applied
+
+        with con.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            with con.cursor() as cur:
+                cur.execute(SCHEMA_MIGRATIONS_TABLE)
+            # another process may have migrated while we waited for the lock
+            version = current_version(con)
+            for migration in MIGRATIONS:
+                if migration.version <= version:
+                    continue
+                _apply(con, migration)
+                applied.append(migration.version)
+                print(f"Applied migration {migration.version}: {migration.description}")
+        finally:
+            con.autocommit = True
+            with con.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+    finally:
+        con.autocommit = autocommit
+    return applied
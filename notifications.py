@@ -0,0 +1,91 @@
+import asyncio
+from collections import defaultdict
+
+from psycopg import sql
+
+from db_setup import connect_listener
+
+# Fans Postgres NOTIFY messages out to in-process handlers. Each worker keeps
+# one LISTEN connection for every channel instead of a connection per consumer.
+
+
+class NotificationListener:
+    """
+    Listens on Postgres channels over a single connection and calls the
+    handlers subscribed to each channel with the notification payload.
+
+    The connection is re-established with backoff when it drops. Handlers
+    registered with `on_reconnect` run after every (re)connect, since
+    notifications sent while disconnected are lost.
+
+    Args:
+        connect: Coroutine function returning an autocommit AsyncConnection.
+    """
+
+    def __init__(self, connect=connect_listener):
+        self._connect = connect
+        self._handlers = defaultdict(list)
+        self._reconnect_handlers = []
+        self._task = None
+        self._conn = None
+        self.connected = False
+
+    def subscribe(self, channel, handler):
+        """
+        Register `handler(payload)` for a channel. Subscribe before `start`.
+        """
+        self._handlers[channel].append(handler)
+
+    def on_reconnect(self, handler):
+        """
+        Register `handler()` to run whenever the listener (re)connects.
+        """
+        self._reconnect_handlers.append(handler)
+
+    def dispatch(self, channel, payload):
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(payload)
+            except Exception as e:
+                print(f"Notification handler for '{channel}' failed. Error message: {e}")
+
+    async def start(self):
+        if self._task is None and self._handlers:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        delay = 0.5
+        while True:
+            try:
+                self._conn = await self._connect()
+                for channel in self._handlers:
+                    await self._conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+                self.connected = True
+                delay = 0.5
+                for handler in self._reconnect_handlers:
+                    handler()
+                async for notify in self._conn.notifies():
+                    self.dispatch(notify.channel, notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Notification listener disconnected, retrying in {delay}s. Error message: {e}")
+            finally:
+                self.connected = False
+                if self._conn is not None:
+                    await self._conn.close()
+                    self._conn = None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+listener = NotificationListener()
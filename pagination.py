@@ -0,0 +1,68 @@
+import base64
+import json
+
+# Keyset pagination helpers for the list endpoints. Pages are addressed by the
+# last id the client has seen instead of an OFFSET, so every page is an index
+# range scan of the same cost no matter how deep the client pages.
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id):
+    """
+    Turn the id of the last row on a page into an opaque cursor string.
+
+    Args:
+        last_id: Primary key of the last row returned.
+
+    Returns:
+        A url-safe string the client sends back as `after`.
+    """
+    raw = json.dumps({"id": last_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Turn a cursor produced by `encode_cursor` back into an id.
+
+    Args:
+        cursor: The `after` value sent by the client, or None for the first page.
+
+    Returns:
+        The id to continue after, 0 for the first page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    if not cursor:
+        return 0
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+    if not isinstance(last_id, int) or last_id < 0:
+        raise ValueError("Invalid pagination cursor")
+    return last_id
+
+
+def paginate(rows, limit, key="id"):
+    """
+    Split rows fetched with `limit + 1` into a page and the next cursor.
+
+    Args:
+        rows: Rows ordered by `key`, at most `limit + 1` of them.
+        limit: Requested page size.
+        key: Column the rows are ordered by.
+
+    Returns:
+        A tuple (page, next_cursor) where next_cursor is None on the last page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1][key])
@@ -0,0 +1,251 @@
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection became available within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+
+    FastAPI runs sync endpoints on a thread pool, so checkouts and returns are
+    guarded by a single condition variable. When every connection is in use a
+    caller waits (up to `timeout` seconds) for one to be released instead of
+    failing straight away like psycopg2's SimpleConnectionPool.
+
+    Connections are health checked on checkout and recycled once they are
+    older than `max_lifetime` or have been idle longer than `max_idle`.
+
+    Args:
+        minconn: Number of connections opened up front and kept around.
+        maxconn: Upper bound of open connections.
+        timeout: Seconds to wait for a free connection before giving up.
+        max_lifetime: Seconds a connection may live before it is replaced.
+        max_idle: Seconds a connection above `minconn` may sit idle.
+        connect: Callable creating a new connection, defaults to psycopg2.connect.
+        **kwargs: Connection arguments passed on to `connect`.
+    """
+
+    def __init__(self, minconn, maxconn, timeout=30.0, max_lifetime=3600.0, max_idle=600.0, connect=None, **kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Pool sizes must satisfy 0 <= minconn <= maxconn and maxconn >= 1")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self._connect_func = connect or psycopg2.connect
+        self._kwargs = kwargs
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, returned_at)
+        self._used = set()
+        self._created_at = {}
+        self._opening = 0
+        self._closed = False
+
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "connections_opened": 0,
+            "connections_recycled": 0,
+            "health_check_failures": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+        self._waiting = 0
+
+        for _ in range(minconn):
+            conn = self._open()
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+
+    # ---------- internals ----------
+
+    def _open(self):
+        conn = self._connect_func(**self._kwargs)
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def _discard(self, conn):
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _total(self):
+        return len(self._idle) + len(self._used) + self._opening
+
+    def _is_expired(self, conn, now):
+        created = self._created_at.get(id(conn), now)
+        return self.max_lifetime is not None and now - created > self.max_lifetime
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        try:
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def _prune_idle(self, now):
+        # Oldest returned connections sit at the left; drop the ones that
+        # have outlived max_idle while keeping at least minconn around.
+        while self._idle and self.max_idle is not None and self._total() > self.minconn:
+            conn, returned_at = self._idle[0]
+            if now - returned_at <= self.max_idle:
+                break
+            self._idle.popleft()
+            self._discard(conn)
+            self._stats["connections_recycled"] += 1
+
+    # ---------- public API ----------
+
+    def getconn(self, timeout=None):
+        """
+        Check out a connection, waiting for one to be released if needed.
+
+        Args:
+            timeout: Seconds to wait, overrides the pool default.
+
+        Returns:
+            A healthy psycopg2 connection object.
+
+        Raises:
+            PoolTimeout: If no connection became available in time.
+            PoolError: If the pool has been closed.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            conn = None
+            with self._cond:
+                self._waiting += 1
+                try:
+                    while True:
+                        if self._closed:
+                            raise PoolError("connection pool is closed")
+                        now = time.monotonic()
+                        self._prune_idle(now)
+                        if self._idle:
+                            conn, _ = self._idle.pop()
+                            self._used.add(conn)
+                            break
+                        if self._total() < self.maxconn:
+                            self._opening += 1
+                            break
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            raise PoolTimeout(f"no connection available within {timeout} seconds")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            if conn is None:
+                try:
+                    conn = self._open()
+                finally:
+                    with self._cond:
+                        self._opening -= 1
+                        if conn is not None:
+                            self._used.add(conn)
+                        else:
+                            self._cond.notify()
+            elif self._is_expired(conn, time.monotonic()) or not self._is_healthy(conn):
+                with self._cond:
+                    self._used.discard(conn)
+                    if not conn.closed and self._is_expired(conn, time.monotonic()):
+                        self._stats["connections_recycled"] += 1
+                    else:
+                        self._stats["health_check_failures"] += 1
+                    self._discard(conn)
+                    self._cond.notify()
+                continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._stats["checkouts"] += 1
+                self._stats["wait_time_total"] += waited
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+            return conn
+
+    def putconn(self, conn, close=False):
+        """
+        Return a connection to the pool.
+
+        Connections left inside a transaction are rolled back, broken or
+        expired ones are closed instead of being reused.
+
+        Args:
+            conn: A connection previously returned by `getconn`.
+            close: Close the connection instead of keeping it in the pool.
+        """
+        with self._cond:
+            if conn not in self._used:
+                raise PoolError("trying to put a connection that is not checked out")
+            self._used.discard(conn)
+
+        if not close and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                close = True
+
+        with self._cond:
+            if close or conn.closed or self._closed or self._is_expired(conn, time.monotonic()):
+                if not close and not conn.closed and not self._closed:
+                    self._stats["connections_recycled"] += 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        """
+        Close every idle connection and refuse new checkouts.
+
+        Connections still checked out are closed when they are returned.
+        """
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def stats(self):
+        """
+        Snapshot of the pool's size and usage counters.
+
+        Returns:
+            A dict with current sizes, waiters and cumulative counters.
+        """
+        with self._cond:
+            return {
+                "minconn": self.minconn,
+                "maxconn": self.maxconn,
+                "size": len(self._idle) + len(self._used),
+                "idle": len(self._idle),
+                "in_use": len(self._used),
+                "waiting": self._waiting,
+                **self._stats,
+            }
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import os
+from collections import defaultdict
+
+from fastapi import WebSocketDisconnect
+
+# WebSocket fan-out for live games, one room per game session. Session events
+# (see GameSession.add_listener in game.py) are serialised once, published on
+# the room's topic and the same string is queued for every socket in the room.
+# Each socket has a bounded send queue drained by its own writer task; a
+# client that lets its queue fill up is disconnected so it can't hold up the
+# room or grow memory without bound.
+
+SEND_QUEUE_SIZE = int(os.getenv("GAME_SEND_QUEUE_SIZE", "64"))
+HEARTBEAT_INTERVAL = float(os.getenv("GAME_HEARTBEAT_INTERVAL", "15"))
+# a client that sends nothing (not even a pong) for this long is dropped
+HEARTBEAT_TIMEOUT = float(os.getenv("GAME_HEARTBEAT_TIMEOUT", "45"))
+
+PING_FRAME = json.dumps({"type": "ping", "data": {}})
+
+# close codes, 1013 is "try again later" in RFC 6455
+GAME_OVER_CLOSE_CODE = 1000
+HEARTBEAT_CLOSE_CODE = 1001
+SLOW_CLIENT_CLOSE_CODE = 1013
+FORBIDDEN_CLOSE_CODE = 4403
+NOT_FOUND_CLOSE_CODE = 4404
+
+_CLOSE = object()
+
+
+class InProcessPubSub:
+    """
+    Topic based publish/subscribe inside one process. Sessions live in the
+    worker that created them, so this is all a room needs; a networked
+    backend only has to offer the same subscribe/publish calls.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(list)
+
+    def subscribe(self, topic, callback):
+        self._subscribers[topic].append(callback)
+
+    def unsubscribe(self, topic, callback):
+        callbacks = self._subscribers.get(topic)
+        if callbacks and callback in callbacks:
+            callbacks.remove(callback)
+            if not callbacks:
+                del self._subscribers[topic]
+
+    def publish(self, topic, message):
+        for callback in list(self._subscribers.get(topic, ())):
+            callback(message)
+
+
+class RoomConnection:
+    """
+    One socket in a room with its bounded send queue.
+
+    Args:
+        websocket: Accepted starlette WebSocket.
+        queue_size: Messages buffered before the client counts as slow.
+    """
+
+    def __init__(self, websocket, queue_size=SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.queue_size = queue_size
+        # one slot more than queue_size, kept free for the close marker
+        self.queue = asyncio.Queue(maxsize=queue_size + 1)
+        self.closed = False
+        self.slow = False
+        self._close_code = GAME_OVER_CLOSE_CODE
+
+    def offer(self, message):
+        """
+        Queue a message without waiting. Returns False if the client was too
+        slow and is being disconnected.
+        """
+        if self.closed:
+            return False
+        if self.queue.qsize() >= self.queue_size:
+            self.slow = True
+            self.close(SLOW_CLIENT_CLOSE_CODE)
+            return False
+        self.queue.put_nowait(message)
+        return True
+
+    def close(self, code=GAME_OVER_CLOSE_CODE):
+        """
+        Let the writer send what is queued (nothing for a slow client) and
+        then close the socket.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self.slow:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+        self._close_code = code
+        self.queue.put_nowait(_CLOSE)
+
+    async def run_writer(self):
+        while True:
+            message = await self.queue.get()
+            if message is _CLOSE:
+                await self.websocket.close(code=self._close_code)
+                return
+            await self.websocket.send_text(message)
+
+    async def run_heartbeat(self, interval=HEARTBEAT_INTERVAL):
+        while not self.closed:
+            await asyncio.sleep(interval)
+            self.offer(PING_FRAME)
+
+    async def run_reader(self, handle, timeout=HEARTBEAT_TIMEOUT):
+        """
+        Pass every JSON message from the client to `handle`. Returns True if
+        the client went quiet for `timeout` seconds, False if it left.
+        """
+        while True:
+            try:
+                message = await asyncio.wait_for(self.websocket.receive_json(), timeout)
+            except asyncio.TimeoutError:
+                self.close(HEARTBEAT_CLOSE_CODE)
+                return True
+            except WebSocketDisconnect:
+                return False
+            except ValueError:
+                self.offer(json.dumps({"type": "error", "data": {"detail": "Messages must be JSON"}}))
+                continue
+            await handle(message)
+
+
+async def serve_connection(connection, handle, interval=HEARTBEAT_INTERVAL, timeout=HEARTBEAT_TIMEOUT):
+    """
+    Run a room connection until the client leaves, stops answering pings,
+    falls too far behind or the room closes.
+
+    Args:
+        connection: RoomConnection of an accepted socket.
+        handle: Coroutine function called with each message from the client.
+        interval: Seconds between pings.
+        timeout: Seconds of silence after which the client is dropped.
+    """
+    writer = asyncio.create_task(connection.run_writer())
+    reader = asyncio.create_task(connection.run_reader(handle, timeout))
+    pinger = asyncio.create_task(connection.run_heartbeat(interval))
+    try:
+        done, _ = await asyncio.wait({writer, reader}, return_when=asyncio.FIRST_COMPLETED)
+        if reader in done and not reader.cancelled() and reader.exception() is None and reader.result():
+            # went quiet, give the writer a moment to send the close frame
+            await asyncio.wait({writer}, timeout=interval)
+    finally:
+        connection.closed = True
+        for task in (writer, reader, pinger):
+            task.cancel()
+        await asyncio.gather(writer, reader, pinger, return_exceptions=True)
+
+
+class Room:
+    """
+    The sockets watching one game session in this worker.
+    """
+
+    def __init__(self, topic, pubsub):
+        self.topic = topic
+        self.connections = set()
+        self._pubsub = pubsub
+        self.broadcasts = 0
+        self.slow_disconnects = 0
+        pubsub.subscribe(topic, self.deliver)
+
+    def connect(self, websocket, queue_size=SEND_QUEUE_SIZE):
+        connection = RoomConnection(websocket, queue_size)
+        self.connections.add(connection)
+        return connection
+
+    def disconnect(self, connection):
+        if connection in self.connections:
+            self.connections.discard(connection)
+            self.slow_disconnects += connection.slow
+
+    def publish(self, event):
+        # serialised once here, every socket gets the same string
+        self._pubsub.publish(self.topic, json.dumps(event))
+
+    def deliver(self, message):
+        self.broadcasts += 1
+        for connection in list(self.connections):
+            if not connection.offer(message):
+                self.disconnect(connection)
+
+    def close(self):
+        self._pubsub.unsubscribe(self.topic, self.deliver)
+        for connection in list(self.connections):
+            connection.close()
+        self.connections.clear()
+
+
+class RoomRegistry:
+    """
+    Rooms of this worker keyed by session id, created on first use and
+    wired to the session's events.
+    """
+
+    def __init__(self, pubsub=None):
+        self.pubsub = pubsub or InProcessPubSub()
+        self._rooms = {}
+
+    def get(self, session):
+        room = self._rooms.get(session.id)
+        if room is None:
+            room = Room(f"game:{session.id}", self.pubsub)
+            self._rooms[session.id] = room
+            session.add_listener(room.publish)
+            session.add_listener(self._close_when_finished(session.id))
+        return room
+
+    def _close_when_finished(self, session_id):
+        def listener(event):
+            # runs after room.publish, so the final event is queued before the close
+            if event["type"] == "finished":
+                self.close(session_id)
+        return listener
+
+    def close(self, session_id):
+        room = self._rooms.pop(session_id, None)
+        if room is not None:
+            room.close()
+
+    def stats(self):
+        return {
+            "rooms": len(self._rooms),
+            "connections": sum(len(room.connections) for room in self._rooms.values()),
+            "broadcasts": sum(room.broadcasts for room in self._rooms.values()),
+            "slow_disconnects": sum(room.slow_disconnects for room in self._rooms.values()),
+        }
+
+
+rooms = RoomRegistry()
@@ -1,5 +1,5 @@
 from datetime import date
-from typing import Optional
+from typing import Annotated, List, Optional, Union
 
 from pydantic import BaseModel, EmailStr, Field
 
@@ -65,6 +65,29 @@ class PresentationClassicCreate(BaseModel):
     title: Optional[str] = Field(None, max_length=100)
     text: Optional[str] = Field(None, max_length=500)
 
+# Pydantic Models for POST /your_kahoots/import, a whole kahoot in one document
+class TrueFalseQuizImport(BaseModel):
+    question: str = Field(..., min_length=1, max_length=100)
+    answer: bool
+
+class WrittenQuizImport(BaseModel):
+    question: str = Field(..., min_length=1, max_length=100)
+    answers: List[Annotated[str, Field(min_length=1, max_length=100)]] = Field(default_factory=list, max_length=50)
+
+class PresentationClassicImport(BaseModel):
+    title: Optional[str] = Field(None, max_length=100)
+    text: Optional[str] = Field(None, max_length=500)
+
+class YourKahootImport(YourKahootCreate):
+    owner_id: Optional[int] = Field(None, gt=0)
+    true_false: List[TrueFalseQuizImport] = Field(default_factory=list, max_length=500)
+    written: List[WrittenQuizImport] = Field(default_factory=list, max_length=500)
+    slides: List[PresentationClassicImport] = Field(default_factory=list, max_length=500)
+
+class YourKahootClone(BaseModel):
+    title: Optional[str] = Field(None, min_length=1, max_length=80) # defaults to the original title
+    owner_id: Optional[int] = Field(None, gt=0) # defaults to the original owners
+
 # Pydantic Models for PUT endpoints (UPDATE)
 class QuizAnswerWrittenUpdate(BaseModel):
     answer: str = Field(..., min_length=1, max_length=100)
@@ -98,6 +121,22 @@ class PresentationClassicUpdate(BaseModel):
 class QuizTrueFalseQuestionPatch(BaseModel):
     question: str = Field(..., min_length=1, max_length=100)
 
+# Pydantic Models for live game sessions
+class SessionCreate(BaseModel):
+    your_kahoot_id: int = Field(..., gt=0)
+    question_time: Optional[float] = Field(None, gt=0, le=300) # seconds per question, server default if None
+    answer_typos: Optional[int] = Field(None, ge=0, le=3) # forgiven in written answers, server default if None
+
+class PlayerJoin(BaseModel):
+    name: str = Field(..., min_length=1, max_length=30)
+
+class AnswerMessage(BaseModel):
+    # bool for True/False, text for Written questions; NUL can't be stored in Postgres text
+    answer: Union[bool, Annotated[str, Field(max_length=255, pattern=r"^[^\x00]*$")]]
+
+class AnswerSubmit(AnswerMessage):
+    player_id: int = Field(..., gt=0)
+
 # Pydantic Models for DELETE endpoints
 class Username(BaseModel):
     username: str = Field(..., min_length=1, max_length=50)
@@ -0,0 +1,51 @@
+import asyncio
+
+# Request coalescing: while a read for a given key is in flight, identical
+# reads wait for it and share its result instead of issuing their own query
+# (and checking out their own pool connection).
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls that share a key.
+
+    The work runs in its own task, so a caller that gets cancelled (e.g. the
+    client disconnected) doesn't cancel it for the others waiting on it.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, func):
+        """
+        Await `func()` unless a call with the same key is already running,
+        in which case wait for that one instead.
+
+        Args:
+            key: Hashable identifying the call, e.g. ("questions", kahoot_id).
+            func: Zero argument coroutine function doing the work.
+
+        Returns:
+            The result of the (shared) call. Exceptions are shared as well.
+        """
+        task = self._flights.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(func())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        # mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {"in_flight": len(self._flights), "calls": self.calls, "shared": self.shared}
@@ -0,0 +1,57 @@
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def json_default(value):
+    """
+    Serialises the column types psycopg returns that json.dumps can't handle,
+    using the same representations as FastAPI's JSON responses.
+    """
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def ndjson_response(batches):
+    """
+    Wraps an async iterator of row batches in a newline delimited JSON
+    StreamingResponse. Each batch is encoded and sent as one chunk, so the
+    first rows go out as soon as the database returns them.
+
+    Args:
+        batches: Async iterator yielding lists of dict rows.
+
+    Returns:
+        A StreamingResponse with one JSON object per line.
+    """
+    async def body():
+        async for rows in batches:
+            yield "".join(json.dumps(row, default=json_default) + "\n" for row in rows).encode()
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def sse_response(frames):
+    """
+    Wraps an async iterator of preformatted Server-Sent Events frames in a
+    StreamingResponse, with the headers that stop caches and proxies from
+    buffering the stream.
+
+    Args:
+        frames: Async iterator yielding SSE frames as strings.
+
+    Returns:
+        A StreamingResponse of type text/event-stream.
+    """
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(frames, media_type=SSE_MEDIA_TYPE, headers=headers)
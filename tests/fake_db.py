@@ -0,0 +1,38 @@
+from contextlib import asynccontextmanager
+
+# Stand-in for a psycopg AsyncConnection, shared by the tests of db_async.py
+# functions. Every statement is recorded with whitespace collapsed, and the
+# rows it returns come from `respond(text, params)`, which can also raise to
+# play a database error.
+
+
+class FakeCursor:
+    def __init__(self, con):
+        self.con = con
+        self.result = []
+
+    async def execute(self, query, params=None):
+        text = query.as_string(None) if hasattr(query, "as_string") else query
+        text = " ".join(text.split())
+        self.con.statements.append((text, params))
+        self.result = list(self.con.respond(text, params) or [])
+
+    async def fetchone(self):
+        return self.result[0] if self.result else None
+
+    async def fetchall(self):
+        return self.result
+
+
+class FakeConnection:
+    def __init__(self, respond=None):
+        self.respond = respond or (lambda text, params: [])
+        self.statements = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    @asynccontextmanager
+    async def cursor(self, row_factory=None):
+        yield FakeCursor(self)
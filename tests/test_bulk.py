@@ -0,0 +1,92 @@
+import asyncio
+
+from db_async import bulk_create_user_group_members, bulk_create_users
+from tests.fake_db import FakeConnection
+
+####
+# to run this file, run this in root:  pytest tests/test_bulk.py -v
+#
+
+class FakeTables:
+    """
+    Answers the statements bulk_insert sends: the FOR KEY SHARE lookups with
+    the ids in `ids`, the INSERT like Postgres would with ON CONFLICT DO
+    NOTHING on every unique key in `unique`, returning the input position of
+    each inserted row.
+    """
+
+    def __init__(self, ids, columns, unique, existing=()):
+        self.ids = ids
+        self.columns = columns
+        self.unique = unique
+        self.rows = [dict(row) for row in existing]
+
+    def __call__(self, text, params):
+        if "FOR KEY SHARE" in text:
+            table = text.split('FROM "')[1].split('"')[0]
+            return [{"id": i} for i in params[0] if i in self.ids[table]]
+        if "INSERT INTO" in text:
+            result = []
+            for position, values in enumerate(zip(*params), 1):
+                row = dict(zip(self.columns, values))
+                if any(all(other[c] == row[c] for c in key) for key in self.unique for other in self.rows):
+                    continue
+                self.rows.append(row)
+                result.append({"input_position": position, "id": len(self.rows), **row})
+            return result
+
+
+def test_conflicting_rows_are_reported_and_the_rest_inserted():
+    tables = FakeTables(
+        {"users": {1, 2}, "groups": {10}},
+        ["user_id", "group_id"],
+        [("user_id", "group_id")],
+        existing=[{"user_id": 2, "group_id": 10}],
+    )
+    con = FakeConnection(tables)
+    rows = [
+        {"user_id": 1, "group_id": 10},
+        {"user_id": 3, "group_id": 10},
+        {"user_id": 2, "group_id": 10},
+        {"user_id": 1, "group_id": 10},
+        {"user_id": 1, "group_id": 11},
+    ]
+    result = asyncio.run(bulk_create_user_group_members(con, rows))
+
+    assert [(r["user_id"], r["group_id"]) for r in result["created"]] == [(1, 10)]
+    assert [(e["index"], e["error"]) for e in result["errors"]] == [
+        (1, "foreign_key_violation"),
+        (2, "unique_violation"),
+        (3, "unique_violation"),
+        (4, "foreign_key_violation"),
+    ]
+    assert "user_id 3 does not exist in users" in result["errors"][0]["detail"]
+
+def test_rows_are_matched_by_position_not_by_one_unique_key():
+    columns = ["username", "email", "password", "birthdate", "subscriptions_id", "language_id",
+               "customer_type_id", "name", "organisation"]
+    tables = FakeTables(
+        {"subscriptions": set(), "languages": set(), "customer_types": set()},
+        columns,
+        [("username",), ("email",)],
+        existing=[{"username": "bob", "email": "taken@x"}],
+    )
+    con = FakeConnection(tables)
+    user = dict.fromkeys(columns)
+    rows = [
+        {**user, "username": "alice", "email": "taken@x"},
+        {**user, "username": "alice", "email": "new@x"},
+    ]
+    result = asyncio.run(bulk_create_users(con, rows))
+
+    assert [(r["username"], r["email"]) for r in result["created"]] == [("alice", "new@x")]
+    assert [(e["index"], e["error"]) for e in result["errors"]] == [(0, "unique_violation")]
+
+def test_one_insert_statement_per_batch():
+    tables = FakeTables({"users": set(range(1, 101)), "groups": {1}}, ["user_id", "group_id"], [("user_id", "group_id")])
+    con = FakeConnection(tables)
+    rows = [{"user_id": i, "group_id": 1} for i in range(1, 101)]
+    result = asyncio.run(bulk_create_user_group_members(con, rows))
+
+    assert len(result["created"]) == 100
+    assert len(con.statements) == 3
@@ -0,0 +1,63 @@
+import asyncio
+
+from cache import TTLCache
+
+####
+# to run this file, run this in root:  pytest tests/test_cache.py -v
+#
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hit_and_miss_counters():
+    cache = TTLCache(maxsize=2, ttl=10)
+    assert cache.get(1) is None
+    cache.set(1, "questions")
+    assert cache.get(1) == "questions"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    cache.get(1)
+    cache.set(3, "c")
+    assert cache.get(2) is None
+    assert cache.get(1) == "a"
+    assert cache.stats()["evictions"] == 1
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=2, ttl=5, clock=clock)
+    cache.set(1, "a")
+    clock.now = 6
+    assert cache.get(1) is None
+    assert cache.stats()["expirations"] == 1
+
+def test_get_or_load_loads_once():
+    cache = TTLCache(maxsize=2, ttl=10)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return ["q1"]
+
+    assert asyncio.run(cache.get_or_load(7, load)) == ["q1"]
+    assert asyncio.run(cache.get_or_load(7, load)) == ["q1"]
+    assert len(calls) == 1
+
+def test_load_racing_with_invalidation_is_not_stored():
+    cache = TTLCache(maxsize=2, ttl=10)
+
+    async def load():
+        cache.invalidate(7)
+        return ["stale"]
+
+    assert asyncio.run(cache.get_or_load(7, load)) == ["stale"]
+    assert cache.get(7) is None
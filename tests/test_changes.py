@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from changes import CHANGE_FEED_TABLES, decode_change_token, encode_change_token, next_change_token, parse_tables
+from fieldsets import FIELDSETS
+from db_async import prune_change_log, read_changes
+from migrations import CHANGE_LOG_TABLES
+from tests.fake_db import FakeConnection
+
+####
+# to run this file, run this in root:  pytest tests/test_changes.py -v
+#
+
+def test_token_round_trip():
+    assert decode_change_token(encode_change_token(1234, 56)) == (1234, 56)
+
+def test_missing_token_starts_at_beginning_of_log():
+    assert decode_change_token(None) == (0, 0)
+
+@pytest.mark.parametrize("token", ["garbage", "e30", encode_change_token(-1, 0), encode_change_token(5, "x")])
+def test_invalid_token_is_rejected(token):
+    with pytest.raises(ValueError):
+        decode_change_token(token)
+
+def test_full_page_continues_after_last_entry():
+    rows = [{"txid": 10, "id": 1}, {"txid": 12, "id": 3}]
+    token, has_more = next_change_token(rows, 2, watermark=20)
+    assert has_more
+    assert decode_change_token(token) == (12, 3)
+
+def test_short_page_continues_at_watermark():
+    token, has_more = next_change_token([{"txid": 10, "id": 1}], 2, watermark=20)
+    assert not has_more
+    assert decode_change_token(token) == (20, 0)
+
+def test_parse_tables():
+    assert parse_tables(None) == CHANGE_FEED_TABLES
+    assert parse_tables("groups, users") == ("users", "groups")
+    with pytest.raises(ValueError):
+        parse_tables("users,saved_paypal")
+
+def test_feed_tables_are_logged_and_have_a_fieldset():
+    for table in CHANGE_FEED_TABLES:
+        assert table in CHANGE_LOG_TABLES
+        assert "password" not in FIELDSETS[table]["allowed"]
+
+def pruned_up_to(txid, last_id):
+    def respond(text, params):
+        if "txid_snapshot_xmin" in text:
+            return [{"watermark": 500}]
+        if "FROM change_log_pruned" in text:
+            return [{"txid": txid, "last_id": last_id}]
+        if "FROM change_log" in text:
+            return [{"id": 41, "txid": 300, "table_name": "users", "row_id": 1, "operation": "UPDATE"}]
+    return respond
+
+def test_token_behind_pruned_entries_is_gone():
+    con = FakeConnection(pruned_up_to(200, 40))
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(read_changes(con, 200, 39, 10, ["users"]))
+    assert e.value.status_code == 410
+
+@pytest.mark.parametrize("since", [(0, 0), (200, 40), (250, 1)])
+def test_fresh_or_retained_token_reads_the_log(since):
+    con = FakeConnection(pruned_up_to(200, 40))
+    page = asyncio.run(read_changes(con, *since, 10, ["users"]))
+    assert [c["id"] for c in page["changes"]] == [41]
+    assert page["watermark"] == 500
+
+def test_prune_deletes_entries_older_than_retention():
+    con = FakeConnection(lambda text, params: [{"deleted": 3}])
+    assert asyncio.run(prune_change_log(con, 86400)) == 3
+    query, params = con.statements[0]
+    assert "DELETE FROM change_log WHERE changed_at <" in query
+    assert "INSERT INTO change_log_pruned" in query
+    assert params == (86400,)
@@ -0,0 +1,39 @@
+import asyncio
+
+from cache import QUESTIONS_CHANNEL, question_cache
+from db_async import clone_your_kahoot
+from tests.fake_db import FakeConnection
+
+####
+# to run this file, run this in root:  pytest tests/test_clone.py -v
+#
+
+def respond(text, params):
+    if "WITH new_kahoot AS" in text:
+        return [{"id": 900, "title": "Copy", "true_false": 2, "written": 1, "written_answers": 2,
+                 "slides": 0, "surveys": 0, "owners": None}]
+
+def test_clone_invalidates_the_cached_questions_of_the_copy():
+    async def run():
+        question_cache.invalidate(900)
+        # e.g. a session created for the new id before the clone committed
+        assert await question_cache.get_or_load(900, lambda: asyncio.sleep(0, [])) == []
+
+        con = FakeConnection(respond)
+        result = await clone_your_kahoot(con, 5)
+        questions = await question_cache.get_or_load(900, lambda: asyncio.sleep(0, ["fresh"]))
+        return con, result, questions
+
+    try:
+        con, result, questions = asyncio.run(run())
+    finally:
+        question_cache.invalidate(900)
+
+    assert result["id"] == 900 and result["owners"] == []
+    assert questions == ["fresh"]
+    assert ("SELECT pg_notify(%s, %s)", (QUESTIONS_CHANNEL, "900")) in con.statements
+
+def test_clone_of_a_missing_kahoot_is_none():
+    con = FakeConnection(lambda text, params: [])
+    assert asyncio.run(clone_your_kahoot(con, 5)) is None
+    assert len(con.statements) == 1
@@ -0,0 +1,128 @@
+import asyncio
+import json
+
+import psycopg
+import pytest
+from fastapi import HTTPException
+
+import db_async
+from cache import QUESTIONS_CHANNEL
+from events import EVENTS_CHANNEL
+from lookup_cache import LOOKUP_CHANNEL
+from tests.fake_db import FakeConnection
+
+####
+# to run this file, run this in root:  pytest tests/test_db_async.py -v
+#
+
+def returning(*rows):
+    """
+    Every statement returns `rows`, a pg_notify returns nothing.
+    """
+    return lambda text, params: [] if "pg_notify" in text else [dict(row) for row in rows]
+
+def failing(error):
+    def respond(text, params):
+        raise error("constraint violated")
+    return respond
+
+def notifications(con, channel):
+    return [params[1] for text, params in con.statements if "pg_notify" in text and params[0] == channel]
+
+def status_of(call, con):
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(call(con))
+    return e.value.status_code
+
+
+USER = {"id": 3, "username": "ann", "email": "ann@example.com"}
+
+def create_user(con):
+    return db_async.create_users(con, "ann", "ann@example.com", "secret", "2000-01-01", 1, 1, 1)
+
+
+def test_create_returns_the_row_and_announces_it():
+    con = FakeConnection(returning(USER))
+    assert asyncio.run(create_user(con)) == USER
+    assert [json.loads(payload) for payload in notifications(con, EVENTS_CHANNEL)] == [
+        {"table": "users", "event": "create", "id": 3}
+    ]
+
+def test_create_of_a_lookup_tells_workers_to_reload_it():
+    con = FakeConnection(returning({"name": "premium"}))
+    assert asyncio.run(db_async.create_subscriptions(con, "premium")) == {"name": "premium"}
+    assert notifications(con, LOOKUP_CHANNEL) == ["subscriptions"]
+
+@pytest.mark.parametrize("call, error, status", [
+    (create_user, psycopg.errors.UniqueViolation, 409),
+    (create_user, psycopg.errors.ForeignKeyViolation, 404),
+    (lambda con: db_async.create_favorite_kahoots(con, 1, 2), psycopg.errors.UniqueViolation, 409),
+    (lambda con: db_async.create_favorite_kahoots(con, 1, 2), psycopg.errors.ForeignKeyViolation, 404),
+    (lambda con: db_async.create_subscriptions(con, "premium"), psycopg.errors.UniqueViolation, 400),
+    (lambda con: db_async.create_groups(con, "class 1"), psycopg.errors.UniqueViolation, 400),
+    (lambda con: db_async.create_true_false_quiz(con, "q", True, 9), psycopg.errors.ForeignKeyViolation, 400),
+    (lambda con: db_async.create_kahoot_report(con, 9, 3, 2, 4, 60), psycopg.errors.ForeignKeyViolation, 404),
+])
+def test_create_maps_integrity_errors(call, error, status):
+    assert status_of(call, FakeConnection(failing(error))) == status
+
+def test_list_read_continues_after_the_cursor():
+    rows = [{"id": 4, "username": "bob"}, {"id": 5, "username": "cid"}]
+    con = FakeConnection(returning(*rows))
+    assert asyncio.run(db_async.read_all_users(con, limit=3, after_id=3, columns=["id", "username"])) == rows
+    [(query, params)] = con.statements
+    assert params == (3, 3)
+
+@pytest.mark.parametrize("call", [
+    lambda con: db_async.read_all_users(con, limit=3),
+    lambda con: db_async.read_all_groups(con, limit=3),
+    lambda con: db_async.read_individual_user(con, 3),
+    lambda con: db_async.read_written_answers_by_kahoot_id(con, 9),
+])
+def test_read_maps_database_errors_to_400(call):
+    assert status_of(call, FakeConnection(failing(psycopg.OperationalError))) == 400
+
+def test_read_of_a_missing_row_is_not_found():
+    assert asyncio.run(db_async.read_individual_user(FakeConnection(returning(USER)), 3)) == USER
+    assert status_of(lambda con: db_async.read_individual_user(con, 3), FakeConnection()) == 404
+
+@pytest.mark.parametrize("call", [
+    lambda con: db_async.delete_group_by_id(con, 1),
+    lambda con: db_async.delete_user_by_username(con, "ann"),
+    lambda con: db_async.delete_your_kahoot_by_id(con, 1),
+    lambda con: db_async.delete_quiz_with_true_false(con, 1),
+    lambda con: db_async.delete_quiz_question_with_written_answer(con, 1),
+    lambda con: db_async.delete_quiz_answer_with_written_answer(con, 1),
+    lambda con: db_async.update_groups(con, 1, "class 1", None),
+    lambda con: db_async.update_your_kahoot_by(con, 1, "title", None, False, 1),
+    lambda con: db_async.update_quiz_with_true_false(con, 1, "q", True, 9),
+    lambda con: db_async.update_quiz_question_with_written_answer(con, 1, "q", 9),
+    lambda con: db_async.update_quiz_answer_with_written_answer(con, 1, 2, "a"),
+    lambda con: db_async.patch_question_quiz_with_true_false(con, 1, "q"),
+])
+def test_write_to_a_missing_row_is_not_found(call):
+    con = FakeConnection()
+    assert status_of(call, con) == 404
+    assert notifications(con, EVENTS_CHANNEL) == notifications(con, QUESTIONS_CHANNEL) == []
+
+@pytest.mark.parametrize("call", [
+    lambda con: db_async.delete_group_by_id(con, 1),
+    lambda con: db_async.delete_user_by_username(con, "ann"),
+    lambda con: db_async.update_quiz_with_true_false(con, 1, "q", True, 9),
+])
+def test_write_blocked_by_a_reference_is_a_bad_request(call):
+    assert status_of(call, FakeConnection(failing(psycopg.errors.ForeignKeyViolation))) == 400
+
+def test_delete_returns_the_row_and_announces_it():
+    con = FakeConnection(returning({"id": 7, "name": "class 1", "description": None}))
+    assert asyncio.run(db_async.delete_group_by_id(con, 7))["id"] == 7
+    assert [json.loads(payload)["event"] for payload in notifications(con, EVENTS_CHANNEL)] == ["delete"]
+
+def test_moving_a_question_invalidates_both_kahoots():
+    con = FakeConnection(returning({"id": 1, "question": "q", "answer": True, "your_kahoot_id": 9, "old_kahoot_id": 8}))
+    result = asyncio.run(db_async.update_quiz_with_true_false(con, 1, "q", True, 9))
+    assert result == {"id": 1, "question": "q", "answer": True, "your_kahoot_id": 9}
+    assert sorted(notifications(con, QUESTIONS_CHANNEL)) == ["8", "9"]
+
+def test_update_of_a_missing_slide_is_none():
+    assert asyncio.run(db_async.update_presentation_classic(FakeConnection(), 1, 9, "title")) is None
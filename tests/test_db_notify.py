@@ -0,0 +1,63 @@
+import db
+from cache import QUESTIONS_CHANNEL
+
+####
+# to run this file, run this in root:  pytest tests/test_db_notify.py -v
+#
+
+class SyncConnection:
+    """
+    Stands in for a psycopg2 connection: `with con` is the transaction and
+    every cursor answers statements with `respond(text, params)`.
+    """
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self, cursor_factory=None):
+        return SyncCursor(self)
+
+
+class SyncCursor:
+    def __init__(self, con):
+        self.con = con
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        text = " ".join(query.split())
+        self.con.statements.append((text, params))
+        self.result = list(self.con.respond(text, params) or [])
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+
+def notified(con):
+    return sorted(params[1] for text, params in con.statements if params and params[0] == QUESTIONS_CHANNEL)
+
+def test_question_writers_notify_the_kahoot():
+    con = SyncConnection(lambda text, params: [{"id": 1, "question": "q", "answer": True, "your_kahoot_id": 4}])
+    db.create_true_false_quiz(con, "q", True, 4)
+    db.delete_quiz_with_true_false(con, 1)
+    db.patch_question_quiz_with_true_false(con, 1, "q")
+    assert notified(con) == ["4", "4", "4"]
+
+def test_moving_a_question_notifies_both_kahoots():
+    row = {"id": 1, "question": "q", "your_kahoot_id": 5, "old_kahoot_id": 4}
+    con = SyncConnection(lambda text, params: [dict(row)])
+    result = db.update_quiz_question_with_written_answer(con, 1, "q", 5)
+    assert notified(con) == ["4", "5"]
+    assert "old_kahoot_id" not in result
@@ -0,0 +1,27 @@
+from etag import etag_headers, etag_matches, make_etag
+
+####
+# to run this file, run this in root:  pytest tests/test_etag.py -v
+#
+
+def test_etag_is_strong_and_stable():
+    etag = make_etag({"users": 4, "groups": 7}, "/users?limit=10")
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == make_etag({"groups": 7, "users": 4}, "/users?limit=10")
+
+def test_etag_changes_with_table_version_and_variant():
+    etag = make_etag({"users": 4}, "/users?")
+    assert make_etag({"users": 5}, "/users?") != etag
+    assert make_etag({}, "/users?") != etag
+    assert make_etag({"users": 4}, "/users?limit=10") != etag
+
+def test_if_none_match_comparison():
+    etag = make_etag({"users": 1}, "/users?")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
+
+def test_headers_ask_browsers_to_revalidate():
+    assert etag_headers('"abc"') == {"ETag": '"abc"', "Cache-Control": "no-cache"}
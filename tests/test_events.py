@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+from events import EVICTED_FRAME, HEARTBEAT_FRAME, RESYNC_FRAME, EventBroker, event_payload
+
+####
+# to run this file, run this in root:  pytest tests/test_events.py -v
+#
+
+def test_event_is_sent_to_subscribers_of_its_table():
+    broker = EventBroker()
+    kahoots = broker.subscribe(("your_kahoot",))
+    groups = broker.subscribe(("groups",))
+
+    broker.publish(event_payload("your_kahoot", "create", 7))
+
+    frame = kahoots.queue.get_nowait()
+    assert frame.startswith("event: create\n")
+    assert json.loads(frame.split("data: ")[1]) == {"table": "your_kahoot", "event": "create", "id": 7}
+    assert groups.queue.empty()
+
+def test_frame_is_formatted_once_for_all_subscribers():
+    broker = EventBroker()
+    a = broker.subscribe()
+    b = broker.subscribe()
+    broker.publish(event_payload("groups", "delete", 1))
+    assert a.queue.get_nowait() is b.queue.get_nowait()
+
+def test_slow_subscriber_is_evicted_without_affecting_others():
+    broker = EventBroker(queue_size=2)
+    slow = broker.subscribe()
+    fast = broker.subscribe()
+
+    for i in range(3):
+        broker.publish(event_payload("users", "update", i))
+        fast.queue.get_nowait()
+
+    assert slow.evicted
+    assert slow.queue.get_nowait() is EVICTED_FRAME
+    assert broker.stats() == {"subscribers": 1, "published": 3, "evictions": 1}
+
+def test_stream_sends_heartbeat_and_ends_after_eviction():
+    broker = EventBroker(queue_size=1)
+    subscriber = broker.subscribe()
+
+    async def main():
+        stream = broker.stream(subscriber, heartbeat=0.01)
+        assert await stream.__anext__() == HEARTBEAT_FRAME
+        broker.publish(event_payload("users", "create", 1))
+        broker.publish(event_payload("users", "create", 2))
+        return [frame async for frame in stream]
+
+    assert asyncio.run(main()) == [EVICTED_FRAME]
+
+def test_closing_stream_unsubscribes():
+    broker = EventBroker()
+    subscriber = broker.subscribe()
+
+    async def main():
+        stream = broker.stream(subscriber)
+        broker.resync()
+        assert await stream.__anext__() == RESYNC_FRAME
+        await stream.aclose()
+
+    asyncio.run(main())
+    assert broker.stats()["subscribers"] == 0
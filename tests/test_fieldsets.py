@@ -0,0 +1,23 @@
+import pytest
+
+from fieldsets import FIELDSETS, parse_fields
+
+####
+# to run this file, run this in root:  pytest tests/test_fieldsets.py -v
+#
+
+def test_default_projection_is_used_without_fields():
+    assert parse_fields("users") == FIELDSETS["users"]["default"]
+
+def test_password_is_never_selectable():
+    for spec in FIELDSETS.values():
+        assert "password" not in spec["allowed"]
+    with pytest.raises(ValueError):
+        parse_fields("users", "id,password")
+
+def test_requested_fields_keep_whitelist_order_and_always_include_id():
+    assert parse_fields("your_kahoot", " title , description") == ("id", "title", "description")
+
+def test_unknown_field_is_rejected():
+    with pytest.raises(ValueError):
+        parse_fields("groups", "name;DROP TABLE groups")
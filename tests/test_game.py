@@ -0,0 +1,173 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from game import MAX_POINTS, GameError, GameSession, SessionRegistry, load_questions
+
+####
+# to run this file, run this in root:  pytest tests/test_game.py -v
+#
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+ROWS = [
+    {"position": 1, "id": 11, "type": "True/False", "question": "Is water wet?", "answer": True, "text": None},
+    {"position": 2, "id": 21, "type": "Written", "question": "Capital of France?", "answer": None, "text": None},
+    {"position": 3, "id": 31, "type": "Slide", "question": "Thanks", "answer": None, "text": "for playing"},
+]
+
+def make_session(clock=None):
+    questions = load_questions(ROWS, {21: ["Paris", "Lutetia"]}, time_limit=10)
+    return GameSession(123456, 5, questions, clock=clock or FakeClock())
+
+
+def test_questions_are_sent_without_answers():
+    session = make_session()
+    question = session.next_question()
+    assert question == {"index": 0, "id": 11, "type": "True/False", "text": "Is water wet?", "time_limit": 10}
+
+def test_faster_correct_answers_score_more():
+    clock = FakeClock()
+    session = make_session(clock)
+    fast = session.join("fast")
+    slow = session.join("slow")
+    wrong = session.join("wrong")
+    session.next_question()
+
+    assert session.submit(fast.id, True) == {"correct": True, "points": MAX_POINTS, "score": MAX_POINTS, "rank": 1}
+    clock.now = 10
+    assert session.submit(slow.id, True)["points"] == MAX_POINTS // 2
+    assert session.submit(wrong.id, False)["points"] == 0
+
+def test_written_answers_are_normalised():
+    session = make_session()
+    player = session.join("p")
+    session.next_question()
+    session.close_question()
+    session.next_question()
+    assert session.submit(player.id, "  PARIS ")["correct"]
+
+def test_answers_after_deadline_or_twice_are_refused():
+    clock = FakeClock()
+    session = make_session(clock)
+    a = session.join("a")
+    b = session.join("b")
+    session.next_question()
+    session.submit(a.id, True)
+    with pytest.raises(GameError):
+        session.submit(a.id, True)
+    clock.now = 10.5
+    with pytest.raises(GameError):
+        session.submit(b.id, True)
+
+def test_timer_closes_question():
+    async def main():
+        questions = load_questions(ROWS, {}, time_limit=0.01)
+        session = GameSession(1, 5, questions)
+        session.next_question()
+        await asyncio.sleep(0.05)
+        return session.state
+
+    assert asyncio.run(main()) == "reveal"
+
+def test_reveal_counts_answers():
+    session = make_session()
+    a = session.join("a")
+    b = session.join("b")
+    session.next_question()
+    session.submit(a.id, True)
+    session.submit(b.id, False)
+    assert session.close_question() == {"index": 0, "correct_answer": True, "answered": 2, "correct": 1}
+
+def test_summary_for_kahoot_report():
+    clock = FakeClock()
+    session = make_session(clock)
+    a = session.join("a")
+    session.join("b")
+    session.next_question()
+    session.submit(a.id, True)
+    clock.now = 42
+    summary = session.finish()
+    assert summary == {
+        "your_kahoot_id": 5,
+        "total_questions": 2,
+        "total_participants": 2,
+        "correct_answers": 1,
+        "duration": timedelta(seconds=42),
+    }
+    with pytest.raises(GameError):
+        session.join("late")
+
+def test_registry_hands_out_unique_pins():
+    registry = SessionRegistry()
+    pins = {registry.create(1, ()).id for _ in range(100)}
+    assert len(pins) == 100
+    assert all(100000 <= pin <= 999999 for pin in pins)
+
+def test_standings_follow_scores():
+    clock = FakeClock()
+    session = make_session(clock)
+    ann = session.join("ann")
+    bob = session.join("bob")
+    cid = session.join("cid")
+    events = []
+    session.add_listener(events.append)
+    session.next_question()
+    clock.now = 5
+    session.submit(bob.id, True)
+    session.submit(ann.id, False)
+    session.close_question()
+
+    assert [(entry["rank"], entry["name"]) for entry in session.standings()] == [(1, "bob"), (2, "ann"), (2, "cid")]
+    assert session.player_standing(cid.id)["rank"] == 2
+    assert events[-1] == {"type": "leaderboard", "data": {"players": session.standings(10)}}
+    assert session.finish()["correct_answers"] == 1
+
+def test_answer_events_for_ingestion():
+    session = make_session()
+    player = session.join("ann")
+    session.next_question()
+    session.submit(player.id, True)
+    event = session.answer_event(player.id)
+    assert event["game_id"] == session.game_id
+    assert (event["question_id"], event["answer"], event["correct"], event["points"]) == (11, "true", True, MAX_POINTS)
+
+def test_written_answers_use_the_grading_index():
+    questions = load_questions(ROWS, {21: ["Paris", "Lutetia"]}, time_limit=10, max_distance=1)
+    session = GameSession(1, 5, questions, clock=FakeClock())
+    player = session.join("p")
+    session.next_question()
+    session.close_question()
+    session.next_question()
+    assert session.submit(player.id, "Pariss")["correct"]
+    assert session.close_question()["correct_answer"] == ["Lutetia", "Paris"]
+
+def test_answer_events_drop_nul_characters():
+    session = make_session()
+    player = session.join("ann")
+    session.next_question()
+    session.close_question()
+    session.next_question()
+    session.submit(player.id, "Par\x00is")
+    assert session.answer_event(player.id)["answer"] == "Paris"
+
+def test_reap_drops_idle_and_unsaved_finished_sessions():
+    clock = FakeClock()
+    registry = SessionRegistry()
+    busy = registry.create(1, (), clock=clock)
+    idle = registry.create(2, (), clock=clock)
+    done = registry.create(3, (), clock=clock)
+    done.finish()
+    clock.now = 50
+    busy.join("ann")
+    clock.now = 100
+
+    assert registry.reap(idle_ttl=80, finished_ttl=60) == [idle.id, done.id]
+    assert registry.get(busy.id) is busy and len(registry) == 1
@@ -0,0 +1,108 @@
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import app as app_module
+from game import GameSession, load_questions, sessions
+from ingest import AnswerIngester
+
+####
+# to run this file, run this in root:  pytest tests/test_game_endpoints.py -v
+#
+
+ROWS = [
+    {"position": 1, "id": 11, "type": "True/False", "question": "Is water wet?", "answer": True, "text": None},
+]
+
+def make_client(monkeypatch, reports):
+    async def create_kahoot_report(con, **summary):
+        if reports["fail"]:
+            reports["fail"] -= 1
+            raise HTTPException(status_code=400, detail="Unable to save the kahoot report.")
+        reports["saved"].append(summary)
+        return {"id": len(reports["saved"]), **summary}
+
+    async def write(events):
+        pass
+
+    async def no_connection():
+        yield None
+
+    monkeypatch.setattr(app_module, "create_kahoot_report", create_kahoot_report)
+    monkeypatch.setattr(app_module, "answer_log", AnswerIngester(write))
+    monkeypatch.setitem(app_module.app.dependency_overrides, app_module.get_db_connection, no_connection)
+    return TestClient(app_module.app)
+
+def add_session(session_id):
+    session = GameSession(session_id, 5, load_questions(ROWS, {}, time_limit=10))
+    sessions._sessions[session_id] = session
+    return session
+
+
+def test_failed_report_keeps_the_session_for_a_retry(monkeypatch):
+    reports = {"fail": 1, "saved": []}
+    client = make_client(monkeypatch, reports)
+    session = add_session(700001)
+    try:
+        session.join("ann")
+        headers = {"X-Game-Token": session.host_token}
+        first = client.post(f"/sessions/{session.id}/finish", headers=headers)
+        assert first.status_code == 400
+        assert sessions.get(session.id) is session
+
+        second = client.post(f"/sessions/{session.id}/finish", headers=headers)
+        assert second.status_code == 200
+        assert second.json()["total_participants"] == 1
+        assert len(reports["saved"]) == 1
+        assert sessions.get(session.id) is None
+    finally:
+        sessions.remove(session.id)
+
+def test_game_actions_need_their_tokens(monkeypatch):
+    client = make_client(monkeypatch, {"fail": 0, "saved": []})
+    session = add_session(700002)
+    try:
+        ann = session.join("ann")
+        bob = session.join("bob")
+        assert client.post(f"/sessions/{session.id}/next").status_code == 403
+        assert client.post(f"/sessions/{session.id}/next", headers={"X-Game-Token": ann.token}).status_code == 403
+        assert client.post(f"/sessions/{session.id}/next", headers={"X-Game-Token": session.host_token}).status_code == 200
+
+        answer = {"player_id": bob.id, "answer": True}
+        assert client.post(f"/sessions/{session.id}/answers", json=answer, headers={"X-Game-Token": ann.token}).status_code == 403
+        assert client.post(f"/sessions/{session.id}/answers", json=answer, headers={"X-Game-Token": bob.token}).status_code == 200
+        assert client.post(f"/sessions/{session.id}/reveal", headers={"X-Game-Token": bob.token}).status_code == 403
+        assert client.post(f"/sessions/{session.id}/finish").status_code == 403
+    finally:
+        sessions.remove(session.id)
+
+def test_session_without_question_time_uses_the_server_default(monkeypatch):
+    client = make_client(monkeypatch, {"fail": 0, "saved": []})
+
+    async def run(func, *args):
+        return ROWS if func is app_module.read_questions_by_kahoot_id else {}
+
+    monkeypatch.setattr(app_module, "run_coalesced", run)
+    monkeypatch.setattr(app_module, "run_with_connection", run)
+    monkeypatch.setattr(app_module, "DEFAULT_QUESTION_TIME", 45.0)
+    app_module.question_cache.invalidate(700010)
+    created = []
+    try:
+        for body in ({"your_kahoot_id": 700010}, {"your_kahoot_id": 700010, "question_time": 12}):
+            response = client.post("/sessions", json=body)
+            assert response.status_code == 201
+            created.append(sessions.get(response.json()["id"]))
+        assert [session.questions[0].time_limit for session in created] == [45.0, 12]
+    finally:
+        app_module.question_cache.invalidate(700010)
+        for session in created:
+            sessions.remove(session.id)
+
+def test_join_hands_out_a_player_token(monkeypatch):
+    client = make_client(monkeypatch, {"fail": 0, "saved": []})
+    session = add_session(700003)
+    try:
+        joined = client.post(f"/sessions/{session.id}/players", json={"name": "ann"}).json()
+        assert session.is_player(joined["player_id"], joined["token"])
+        assert not session.is_host(joined["token"])
+    finally:
+        sessions.remove(session.id)
@@ -0,0 +1,56 @@
+import random
+
+from grading import AnswerIndex, normalize_answer, within_distance
+
+####
+# to run this file, run this in root:  pytest tests/test_grading.py -v
+#
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j - 1] + (char_a != char_b), previous[j] + 1, current[j - 1] + 1))
+        previous = current
+    return previous[-1]
+
+
+def test_normalize_strips_case_accents_and_whitespace():
+    assert normalize_answer("  Zürich\tCITY ") == "zurich city"
+    assert normalize_answer("Straße") == normalize_answer("STRASSE")
+    assert normalize_answer("Crème  Brûlée") == "creme brulee"
+
+def test_within_distance_agrees_with_full_levenshtein():
+    rng = random.Random(3)
+    for _ in range(2000):
+        a = "".join(rng.choice("abc") for _ in range(rng.randint(0, 7)))
+        b = "".join(rng.choice("abc") for _ in range(rng.randint(0, 7)))
+        limit = rng.randint(0, 3)
+        assert within_distance(a, b, limit) == (levenshtein(a, b) <= limit), (a, b, limit)
+
+def test_typos_are_only_forgiven_in_longer_answers():
+    exact = AnswerIndex(["Paris", "cat"])
+    assert exact.grade("PARIS") and not exact.grade("Pariss")
+
+    fuzzy = AnswerIndex(["Paris", "cat"], max_distance=1)
+    assert fuzzy.grade("Pariss") and fuzzy.grade("pars")
+    assert not fuzzy.grade("Parisss")
+    assert not fuzzy.grade("car")
+
+def test_several_accepted_answers():
+    index = AnswerIndex(["Mount Everest", "Everest"], max_distance=1)
+    assert [index.grade(answer) for answer in ["everest", "Mt Everest", "mount everst", "K2"]] == [True, False, True, False]
+
+def test_each_distinct_answer_is_matched_once(monkeypatch):
+    index = AnswerIndex(["Leonardo da Vinci", "da Vinci", "Leonardo"], max_distance=2)
+    matched = []
+    match = index._match
+    monkeypatch.setattr(index, "_match", lambda normalized: matched.append(normalized) or match(normalized))
+    rng = random.Random(5)
+    typed = ["leonardo da vinci", "Da Vinci", "leonardo", "Michelangelo", "leonado", "raphael", "davinci"]
+    answers = [rng.choice(typed) + " " * rng.randint(0, 2) for _ in range(5000)]
+
+    results = [index.grade(answer) for answer in answers]
+    assert results == [not answer.startswith(("Mich", "raph")) for answer in answers]
+    assert sorted(matched) == sorted({normalize_answer(answer) for answer in answers})
@@ -0,0 +1,58 @@
+import asyncio
+
+import schemas as s
+from cache import QUESTIONS_CHANNEL, question_cache
+from db_async import import_your_kahoot
+from tests.fake_db import FakeConnection
+
+####
+# to run this file, run this in root:  pytest tests/test_import.py -v
+#
+
+def respond(text, params):
+    if "INSERT INTO your_kahoot" in text:
+        return [{"id": 7, "title": params[0]}]
+    if "nextval" in text:
+        return [{"id": 100 + i} for i in range(params[0])]
+
+
+def make_kahoot(questions):
+    return s.YourKahootImport(
+        title="Capitals",
+        language_id=1,
+        owner_id=3,
+        true_false=[{"question": f"tf {i}", "answer": i % 2 == 0} for i in range(questions)],
+        written=[{"question": f"w {i}", "answers": [f"a {i}", f"b {i}"]} for i in range(questions)],
+        slides=[{"title": "intro"}],
+    ).model_dump()
+
+def test_statement_count_does_not_grow_with_questions():
+    small, large = FakeConnection(respond), FakeConnection(respond)
+    asyncio.run(import_your_kahoot(small, make_kahoot(2)))
+    result = asyncio.run(import_your_kahoot(large, make_kahoot(50)))
+
+    assert len(small.statements) == len(large.statements)
+    assert result == {"id": 7, "title": "Capitals", "true_false": 50, "written": 50, "written_answers": 100, "slides": 1}
+
+def test_answers_reference_their_questions():
+    con = FakeConnection(respond)
+    asyncio.run(import_your_kahoot(con, make_kahoot(2)))
+
+    answers = next(params for query, params in con.statements if "INSERT INTO quiz_written_answer" in query)
+    assert answers == ([100, 100, 101, 101], ["a 0", "b 0", "a 1", "b 1"])
+
+def test_import_invalidates_the_cached_questions_of_the_new_kahoot():
+    async def run():
+        question_cache.invalidate(7)
+        assert await question_cache.get_or_load(7, lambda: asyncio.sleep(0, [])) == []
+        con = FakeConnection(respond)
+        await import_your_kahoot(con, make_kahoot(1))
+        return con, await question_cache.get_or_load(7, lambda: asyncio.sleep(0, ["fresh"]))
+
+    try:
+        con, questions = asyncio.run(run())
+    finally:
+        question_cache.invalidate(7)
+
+    assert questions == ["fresh"]
+    assert ("SELECT pg_notify(%s, %s)", (QUESTIONS_CHANNEL, "7")) in con.statements
@@ -0,0 +1,98 @@
+import asyncio
+
+from ingest import AnswerIngester
+
+####
+# to run this file, run this in root:  pytest tests/test_ingest.py -v
+#
+
+class FakeWriter:
+    def __init__(self, fail=0, delay=0, poison=None):
+        self.batches = []
+        self.fail = fail
+        self.delay = delay
+        self.poison = poison
+
+    async def __call__(self, events):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("database is down")
+        if self.poison is not None and self.poison in events:
+            raise ValueError("text fields cannot contain NUL (0x00) bytes")
+        self.batches.append(list(events))
+
+
+def test_full_batches_are_written_straight_away():
+    async def scenario():
+        writer = FakeWriter()
+        ingester = AnswerIngester(writer, batch_size=3, flush_interval=60, buffer_size=100)
+        ingester.start()
+        for event in range(7):
+            await ingester.put(event)
+        await asyncio.sleep(0.01)
+        # a full batch starts a flush of everything buffered
+        assert writer.batches == [[0, 1, 2], [3, 4, 5], [6]]
+        assert ingester.stats()["written"] == 7
+        await ingester.stop()
+
+    asyncio.run(scenario())
+
+def test_partial_batch_is_written_after_the_interval():
+    async def scenario():
+        writer = FakeWriter()
+        ingester = AnswerIngester(writer, batch_size=100, flush_interval=0.02, buffer_size=100)
+        ingester.start()
+        await ingester.put("a")
+        await asyncio.sleep(0.1)
+        assert writer.batches == [["a"]]
+        stats = ingester.stats()
+        assert stats["flushes"] == 1 and stats["flush_latency"]["max_ms"] >= 0
+        await ingester.stop()
+
+    asyncio.run(scenario())
+
+def test_full_buffer_makes_put_wait():
+    async def scenario():
+        writer = FakeWriter(delay=0.05)
+        ingester = AnswerIngester(writer, batch_size=2, flush_interval=60, buffer_size=2)
+        ingester.start()
+        await ingester.put(1)
+        await ingester.put(2)
+        waiting = asyncio.create_task(ingester.put(3))
+        await asyncio.sleep(0.01)
+        # the first batch is being written and still takes up the buffer
+        assert not waiting.done()
+        await asyncio.wait_for(waiting, 1)
+        assert ingester.stats()["backpressure_waits"] == 1
+        await ingester.stop()
+        assert writer.batches == [[1, 2], [3]]
+
+    asyncio.run(scenario())
+
+def test_failed_batch_is_kept_in_order_and_retried():
+    async def scenario():
+        writer = FakeWriter(fail=1)
+        ingester = AnswerIngester(writer, batch_size=2, flush_interval=60, buffer_size=10)
+        for event in range(3):
+            await ingester.put(event)
+        assert not await ingester.flush()
+        assert ingester.stats()["failed_flushes"] == 1
+        assert await ingester.flush()
+        assert writer.batches == [[0, 1], [2]]
+
+    asyncio.run(scenario())
+
+def test_event_the_database_refuses_is_dropped_and_the_rest_written():
+    async def scenario():
+        writer = FakeWriter(poison="bad")
+        ingester = AnswerIngester(writer, batch_size=8, flush_interval=60, buffer_size=100, data_errors=(ValueError,))
+        events = ["a", "b", "c", "bad", "d", "e", "f", "g", "h", "i"]
+        for event in events:
+            await ingester.put(event)
+        assert await ingester.flush()
+        assert [event for batch in writer.batches for event in batch] == [e for e in events if e != "bad"]
+        stats = ingester.stats()
+        assert stats["rejected"] == 1 and stats["written"] == 9 and stats["buffered"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from leaderboard import Leaderboard
+
+####
+# to run this file, run this in root:  pytest tests/test_leaderboard.py -v
+#
+
+def expected_standings(scores):
+    ordered = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [(1 + sum(1 for s in scores.values() if s > score), player_id, score) for player_id, score in ordered]
+
+
+def test_ranks_share_ties_and_skip():
+    board = Leaderboard(100)
+    for player_id, score in [(1, 50), (2, 80), (3, 50), (4, 0)]:
+        board.add(player_id, score)
+    assert [board.rank(player_id) for player_id in (1, 2, 3, 4)] == [2, 1, 2, 4]
+    assert board.top(3) == [(1, 2, 80), (2, 1, 50), (2, 3, 50)]
+
+def test_updates_match_sorting_everything():
+    rng = random.Random(7)
+    board = Leaderboard(5000)
+    scores = {}
+    for player_id in range(1, 301):
+        board.add(player_id)
+        scores[player_id] = 0
+    for _ in range(2000):
+        player_id = rng.randint(1, 300)
+        scores[player_id] = min(5000, scores[player_id] + rng.randint(0, 1000))
+        board.update(player_id, scores[player_id])
+    expected = expected_standings(scores)
+    assert board.top(25) == expected[:25]
+    assert board.top(1000) == expected
+    assert all(board.rank(player_id) == rank for rank, player_id, _ in expected)
+
+def test_scores_outside_range_are_refused():
+    board = Leaderboard(10)
+    with pytest.raises(ValueError):
+        board.add(1, 11)
+    board.add(1)
+    with pytest.raises(ValueError):
+        board.add(1)
+
+def test_ties_are_listed_in_join_order():
+    board = Leaderboard(100)
+    for player_id in (30, 10, 20, 40):
+        board.add(player_id)
+    assert board.top(3) == [(1, 30, 0), (1, 10, 0), (1, 20, 0)]
+    board.update(10, 50)
+    board.update(40, 50)
+    board.update(30, 50)
+    assert board.top(4) == [(1, 30, 50), (1, 10, 50), (1, 40, 50), (4, 20, 0)]
@@ -0,0 +1,89 @@
+import asyncio
+
+import psycopg
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import app as app_module
+from db_async import put_link
+from tests.fake_db import FakeConnection
+
+####
+# to run this file, run this in root:  pytest tests/test_links.py -v
+#
+
+def make_client(monkeypatch):
+    links = set()
+
+    async def put_link(con, table, left_id, right_id):
+        created = (table, left_id, right_id) not in links
+        links.add((table, left_id, right_id))
+        return {"id": 1, "users_id": left_id, "your_kahoot_id": right_id, "created": created}
+
+    async def delete_link(con, table, left_id, right_id):
+        deleted = (table, left_id, right_id) in links
+        links.discard((table, left_id, right_id))
+        return deleted
+
+    async def no_connection():
+        yield None
+
+    monkeypatch.setattr(app_module, "put_link", put_link)
+    monkeypatch.setattr(app_module, "delete_link", delete_link)
+    monkeypatch.setitem(app_module.app.dependency_overrides, app_module.get_db_connection, no_connection)
+    return TestClient(app_module.app), links
+
+
+def test_repeated_put_is_idempotent(monkeypatch):
+    client, links = make_client(monkeypatch)
+    first = client.put("/favorite_kahoots/1/2")
+    second = client.put("/favorite_kahoots/1/2")
+
+    assert first.status_code == 201
+    assert second.status_code == 200
+    assert second.json() == {"id": 1, "users_id": 1, "your_kahoot_id": 2}
+    assert links == {("favorite_kahoots", 1, 2)}
+
+def test_delete_of_missing_link_succeeds(monkeypatch):
+    client, links = make_client(monkeypatch)
+    client.put("/group_memberships/3/4")
+
+    assert client.delete("/group_memberships/3/4").status_code == 204
+    assert client.delete("/group_memberships/3/4").status_code == 204
+    assert links == set()
+
+def test_put_link_sends_one_upsert_and_returns_the_row():
+    row = {"id": 5, "users_id": 1, "your_kahoot_id": 2, "created": True}
+    con = FakeConnection(lambda text, params: [row])
+
+    assert asyncio.run(put_link(con, "favorite_kahoots", 1, 2)) == row
+    [(query, params)] = con.statements
+    assert 'INSERT INTO "favorite_kahoots" ("users_id", "your_kahoot_id")' in query
+    assert 'ON CONFLICT ("users_id", "your_kahoot_id") DO NOTHING' in query
+    assert "UNION ALL" in query and query.endswith("LIMIT 1;")
+    assert params == {"left_id": 1, "right_id": 2}
+
+def test_put_link_retries_once_then_reports_a_conflict():
+    con = FakeConnection(lambda text, params: [])
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(put_link(con, "user_group_members", 3, 4))
+    assert e.value.status_code == 409
+    assert len(con.statements) == 2
+
+def test_put_link_finds_the_row_on_the_second_run():
+    row = {"id": 9, "user_id": 3, "group_id": 4, "created": False}
+    results = iter([[], [row]])
+    con = FakeConnection(lambda text, params: next(results))
+
+    assert asyncio.run(put_link(con, "user_group_members", 3, 4)) == row
+    assert len(con.statements) == 2
+
+def test_put_link_to_a_missing_row_is_not_found():
+    def respond(text, params):
+        raise psycopg.errors.ForeignKeyViolation("insert or update violates foreign key constraint")
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(put_link(FakeConnection(respond), "kahoot_owners", 1, 99))
+    assert e.value.status_code == 404
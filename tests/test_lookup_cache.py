@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from lookup_cache import LOOKUP_CHANNEL, LookupCache
+from notifications import NotificationListener
+
+####
+# to run this file, run this in root:  pytest tests/test_lookup_cache.py -v
+#
+
+class FakeDatabase:
+    def __init__(self):
+        self.tables = {"languages": [{"id": 1, "name": "English"}], "subscriptions": [], "customer_types": []}
+        self.queries = 0
+
+    async def load(self, table):
+        self.queries += 1
+        return list(self.tables[table])
+
+
+def make_cache(connected=True):
+    listener = NotificationListener(connect=None)
+    listener.connected = connected
+    db = FakeDatabase()
+    return LookupCache(listener, db.load), listener, db
+
+
+def test_second_read_is_served_from_memory():
+    cache, _, db = make_cache()
+    assert asyncio.run(cache.get_all("languages")) == [{"id": 1, "name": "English"}]
+    assert asyncio.run(cache.get("languages", 1)) == {"id": 1, "name": "English"}
+    assert db.queries == 1
+    assert cache.stats()["hits"] == 1
+
+def test_notification_invalidates_table():
+    cache, listener, db = make_cache()
+    asyncio.run(cache.get_all("languages"))
+    db.tables["languages"].append({"id": 2, "name": "Swedish"})
+
+    listener.dispatch(LOOKUP_CHANNEL, "languages")
+
+    assert asyncio.run(cache.get("languages", 2)) == {"id": 2, "name": "Swedish"}
+    assert db.queries == 2
+
+def test_cache_is_bypassed_while_listener_is_disconnected():
+    cache, _, db = make_cache(connected=False)
+    asyncio.run(cache.get_all("languages"))
+    asyncio.run(cache.get_all("languages"))
+    assert db.queries == 2
+
+def test_unknown_id_returns_none():
+    cache, _, _ = make_cache()
+    assert asyncio.run(cache.get("languages", 99)) is None
+
+def test_only_lookup_tables_are_cached():
+    cache, _, _ = make_cache()
+    with pytest.raises(ValueError):
+        asyncio.run(cache.get_all("users"))
@@ -0,0 +1,29 @@
+import re
+
+from migrations import LATEST_VERSION, MIGRATIONS
+
+####
+# to run this file, run this in root:  pytest tests/test_migrations.py -v
+#
+
+def test_versions_are_consecutive():
+    versions = [m.version for m in MIGRATIONS]
+    assert versions == list(range(1, len(MIGRATIONS) + 1))
+    assert LATEST_VERSION == versions[-1]
+
+def test_index_names_are_unique():
+    names = [name for m in MIGRATIONS for name, _, _ in m.indexes]
+    assert len(names) == len(set(names))
+
+def test_indexes_reference_known_tables_and_columns():
+    tables = {}
+    for m in MIGRATIONS:
+        for statement in m.statements:
+            table = re.search(r"CREATE TABLE IF NOT EXISTS (\w+)\s*\(", statement)
+            if table:
+                tables[table.group(1)] = set(re.findall(r"^\s+(\w+) ", statement, re.M))
+    for m in MIGRATIONS:
+        for name, table, columns in m.indexes:
+            assert table in tables, name
+            for column in columns.split(", "):
+                assert column in tables[table], name
@@ -0,0 +1,75 @@
+import pytest
+
+from pagination import DEFAULT_PAGE_SIZE, decode_cursor, encode_cursor, paginate
+
+####
+# to run this file, run this in root:  pytest tests/test_pagination.py -v
+#
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(42)) == 42
+
+def test_missing_cursor_starts_at_beginning():
+    assert decode_cursor(None) == 0
+    assert decode_cursor("") == 0
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "e30", encode_cursor(-1), encode_cursor("7")])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_paginate_returns_cursor_when_more_rows_exist():
+    rows = [{"id": i} for i in range(1, 5)]
+    page, next_cursor = paginate(rows, 3)
+    assert [r["id"] for r in page] == [1, 2, 3]
+    assert decode_cursor(next_cursor) == 3
+
+def test_paginate_last_page_has_no_cursor():
+    rows = [{"id": 1}, {"id": 2}]
+    page, next_cursor = paginate(rows, 3)
+    assert page == rows
+    assert next_cursor is None
+
+def test_list_without_limit_gets_a_default_page(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import app as app_module
+
+    rows = [{"id": i, "name": f"group {i}"} for i in range(1, 251)]
+    limits = []
+
+    async def read_all_groups(con, limit, after_id=0, columns=None):
+        limits.append(limit)
+        return [row for row in rows if row["id"] > after_id][:limit]
+
+    async def read_table_versions(con, tables):
+        return {table: 1 for table in tables}
+
+    async def fake_connection():
+        yield object()
+
+    monkeypatch.setattr(app_module, "read_all_groups", read_all_groups)
+    monkeypatch.setattr(app_module, "read_table_versions", read_table_versions)
+    monkeypatch.setitem(app_module.app.dependency_overrides, app_module.get_db_connection, fake_connection)
+    client = TestClient(app_module.app)
+
+    first = client.get("/groups")
+    assert len(first.json()) == DEFAULT_PAGE_SIZE
+    seen = first.json()
+    cursor = first.headers.get("X-Next-Cursor")
+    while cursor:
+        page = client.get("/groups", params={"after": cursor})
+        seen += page.json()
+        cursor = page.headers.get("X-Next-Cursor")
+    assert [row["id"] for row in seen] == list(range(1, 251))
+    assert limits == [DEFAULT_PAGE_SIZE + 1] * 3
+
+def test_nested_page_response_passes_json_through():
+    from app import nested_page_response
+
+    response = nested_page_response({"body": '[{"user_id": 7, "kahoots": []}]', "has_more": True, "last_id": 7})
+    assert response.body == b'[{"user_id": 7, "kahoots": []}]'
+    assert decode_cursor(response.headers["X-Next-Cursor"]) == 7
+
+    last = nested_page_response({"body": "[]", "has_more": False, "last_id": None})
+    assert "X-Next-Cursor" not in last.headers
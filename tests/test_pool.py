@@ -0,0 +1,147 @@
+import threading
+import time
+
+import pytest
+from psycopg2 import extensions
+
+from pool import ConnectionPool, PoolTimeout
+
+####
+# to run this file, run this in root:  pytest tests/test_pool.py -v
+#
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query):
+        if self.conn.broken:
+            raise Exception("server closed the connection unexpectedly")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(**kwargs):
+    opened = []
+
+    def connect(**_):
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    options = {"minconn": 1, "maxconn": 2, "timeout": 0.2}
+    options.update(kwargs)
+    return ConnectionPool(connect=connect, **options), opened
+
+
+def test_warms_up_to_minconn():
+    pool, opened = make_pool(minconn=2, maxconn=4)
+    assert len(opened) == 2
+    assert pool.stats()["idle"] == 2
+
+def test_times_out_when_exhausted():
+    pool, _ = make_pool(maxconn=1)
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn(timeout=0.05)
+    assert pool.stats()["timeouts"] == 1
+
+def test_waiter_gets_released_connection():
+    pool, _ = make_pool(maxconn=1, timeout=2)
+    conn = pool.getconn()
+    result = {}
+
+    def waiter():
+        result["conn"] = pool.getconn()
+
+    t = threading.Thread(target=waiter)
+    t.start()
+    time.sleep(0.05)
+    pool.putconn(conn)
+    t.join(1)
+    assert result["conn"] is conn
+
+def test_never_exceeds_maxconn_under_concurrency():
+    pool, opened = make_pool(minconn=0, maxconn=3, timeout=5)
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(20):
+                conn = pool.getconn()
+                assert pool.stats()["in_use"] <= 3
+                pool.putconn(conn)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert len(opened) <= 3
+    assert pool.stats()["checkouts"] == 200
+
+def test_broken_connection_is_replaced_on_checkout():
+    pool, opened = make_pool()
+    first = pool.getconn()
+    pool.putconn(first)
+    first.broken = True
+    second = pool.getconn()
+    assert second is not first
+    assert first.closed
+    assert pool.stats()["health_check_failures"] == 1
+
+def test_open_transaction_is_rolled_back_on_release():
+    pool, _ = make_pool()
+    conn = pool.getconn()
+    conn.status = extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+    assert conn.rollbacks == 1
+    assert pool.getconn() is conn
+
+def test_connection_past_max_lifetime_is_recycled():
+    pool, opened = make_pool(max_lifetime=0.01)
+    conn = pool.getconn()
+    time.sleep(0.02)
+    pool.putconn(conn)
+    assert conn.closed
+    assert pool.getconn() is not conn
+    assert pool.stats()["connections_recycled"] >= 1
+
+def test_idle_connections_above_minconn_are_pruned():
+    pool, _ = make_pool(minconn=0, maxconn=2, max_idle=0.01)
+    a = pool.getconn()
+    b = pool.getconn()
+    pool.putconn(a)
+    pool.putconn(b)
+    time.sleep(0.02)
+    c = pool.getconn()
+    assert c is not a and c is not b
+    assert a.closed and b.closed
@@ -0,0 +1,71 @@
+import asyncio
+import re
+import sqlite3
+
+from db_async import read_questions_by_kahoot_id
+from tests.fake_db import FakeConnection
+
+####
+# to run this file, run this in root:  pytest tests/test_questions.py -v
+#
+
+KEYS = ["position", "id", "type", "question", "answer", "text"]
+
+
+def sqlite_tables():
+    """
+    The three item tables in an in-memory SQLite database, ids deliberately
+    interleaved across tables and out of insertion order, plus rows of
+    another kahoot that must not show up.
+    """
+    db = sqlite3.connect(":memory:")
+    db.executescript("""
+    CREATE TABLE quiz_with_true_false (id INTEGER PRIMARY KEY, question TEXT, answer BOOLEAN, your_kahoot_id INTEGER);
+    CREATE TABLE quiz_with_written_answer (id INTEGER PRIMARY KEY, question TEXT, your_kahoot_id INTEGER);
+    CREATE TABLE presentation_classic (id INTEGER PRIMARY KEY, title TEXT, text TEXT, your_kahoot_id INTEGER);
+    INSERT INTO quiz_with_true_false VALUES (5, 'Is the sun a star?', 1, 7), (2, 'Is water dry?', 0, 7), (3, 'Other kahoot', 1, 8);
+    INSERT INTO quiz_with_written_answer VALUES (4, 'Capital of France?', 7), (1, 'Largest ocean?', 7);
+    INSERT INTO presentation_classic VALUES (6, 'Intro', 'Welcome', 7);
+    """)
+    return db
+
+def run_in_sqlite(db):
+    """
+    Answers statements by running them in SQLite, with the Postgres casts
+    and the psycopg placeholders translated.
+    """
+    def respond(text, params):
+        cur = db.execute(re.sub(r"%\((\w+)\)s", r":\1", re.sub(r"::\w+", "", text)), params)
+        columns = [c[0] for c in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+    return respond
+
+def read_questions(kahoot_id):
+    con = FakeConnection(run_in_sqlite(sqlite_tables()))
+    return asyncio.run(read_questions_by_kahoot_id(con, kahoot_id))
+
+
+def test_every_row_has_the_same_keys():
+    rows = read_questions(7)
+    assert rows
+    for row in rows:
+        assert list(row) == KEYS
+
+def test_true_false_then_written_then_slides_each_by_id():
+    rows = read_questions(7)
+    assert [(row["position"], row["type"], row["id"]) for row in rows] == [
+        (1, "True/False", 2),
+        (2, "True/False", 5),
+        (3, "Written", 1),
+        (4, "Written", 4),
+        (5, "Slide", 6),
+    ]
+
+def test_answer_and_text_belong_to_their_kind():
+    rows = {row["id"]: row for row in read_questions(7)}
+    assert (rows[2]["question"], bool(rows[2]["answer"]), rows[2]["text"]) == ("Is water dry?", False, None)
+    assert (rows[1]["question"], rows[1]["answer"], rows[1]["text"]) == ("Largest ocean?", None, None)
+    assert (rows[6]["question"], rows[6]["answer"], rows[6]["text"]) == ("Intro", None, "Welcome")
+
+def test_kahoot_without_items_has_no_rows():
+    assert read_questions(99) == []
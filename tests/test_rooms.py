@@ -0,0 +1,180 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+import app as app_module
+from game import GameSession, load_questions, sessions
+from rooms import (
+    FORBIDDEN_CLOSE_CODE,
+    HEARTBEAT_CLOSE_CODE,
+    PING_FRAME,
+    SLOW_CLIENT_CLOSE_CODE,
+    InProcessPubSub,
+    RoomRegistry,
+    serve_connection,
+)
+
+####
+# to run this file, run this in root:  pytest tests/test_rooms.py -v
+#
+
+class FakeWebSocket:
+    """
+    Records what the server sends; `incoming` feeds receive_json.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.close_code = None
+        self.incoming = asyncio.Queue()
+
+    async def send_text(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+    async def receive_json(self):
+        return await self.incoming.get()
+
+
+ROWS = [
+    {"position": 1, "id": 11, "type": "True/False", "question": "Is water wet?", "answer": True, "text": None},
+    {"position": 2, "id": 21, "type": "Written", "question": "Capital of France?", "answer": None, "text": None},
+]
+
+def make_session(id=123456):
+    return GameSession(id, 5, load_questions(ROWS, {21: ["Paris"]}, time_limit=10))
+
+
+def test_pubsub_delivers_to_topic_subscribers():
+    pubsub = InProcessPubSub()
+    received = []
+    pubsub.subscribe("game:1", received.append)
+    pubsub.publish("game:1", "a")
+    pubsub.publish("game:2", "b")
+    pubsub.unsubscribe("game:1", received.append)
+    pubsub.publish("game:1", "c")
+    assert received == ["a"]
+
+def test_event_is_serialised_once_for_all_sockets():
+    async def scenario():
+        registry = RoomRegistry()
+        session = make_session()
+        room = registry.get(session)
+        connections = [room.connect(FakeWebSocket()) for _ in range(3)]
+        session.next_question()
+        messages = [connection.queue.get_nowait() for connection in connections]
+        assert json.loads(messages[0])["type"] == "question"
+        assert all(message is messages[0] for message in messages)
+        assert registry.stats()["broadcasts"] == 1
+
+    asyncio.run(scenario())
+
+def test_slow_client_is_disconnected_without_affecting_others():
+    async def scenario():
+        registry = RoomRegistry()
+        session = make_session()
+        room = registry.get(session)
+        slow_socket = FakeWebSocket()
+        slow = room.connect(slow_socket, queue_size=1)
+        fast = room.connect(FakeWebSocket(), queue_size=10)
+
+        room.publish({"type": "one", "data": {}})
+        fast.queue.get_nowait()
+        room.publish({"type": "two", "data": {}})
+
+        assert slow.slow and slow not in room.connections
+        assert fast in room.connections
+        assert registry.stats()["slow_disconnects"] == 1
+        # the slow client's backlog is dropped, only the close is left
+        await slow.run_writer()
+        assert slow_socket.sent == []
+        assert slow_socket.close_code == SLOW_CLIENT_CLOSE_CODE
+
+    asyncio.run(scenario())
+
+def test_finished_event_is_sent_before_the_room_closes():
+    async def scenario():
+        registry = RoomRegistry()
+        session = make_session()
+        websocket = FakeWebSocket()
+        connection = registry.get(session).connect(websocket)
+        session.next_question()
+        session.finish()
+        await connection.run_writer()
+        assert [json.loads(data)["type"] for data in websocket.sent] == ["question", "reveal", "leaderboard", "finished"]
+        assert registry.stats()["rooms"] == 0
+
+    asyncio.run(scenario())
+
+def test_quiet_client_is_dropped_after_heartbeat_timeout():
+    async def scenario():
+        registry = RoomRegistry()
+        websocket = FakeWebSocket()
+        connection = registry.get(make_session()).connect(websocket)
+
+        async def handle(message):
+            pass
+
+        await asyncio.wait_for(serve_connection(connection, handle, interval=0.01, timeout=0.05), 1)
+        assert PING_FRAME in websocket.sent
+        assert websocket.close_code == HEARTBEAT_CLOSE_CODE
+
+    asyncio.run(scenario())
+
+def test_websocket_game_flow():
+    session = make_session(654321)
+    sessions._sessions[session.id] = session
+    player = session.join("ann")
+    try:
+        client = TestClient(app_module.app)
+        with client.websocket_connect(f"/sessions/{session.id}/ws?token={session.host_token}") as host:
+            with client.websocket_connect(f"/sessions/{session.id}/ws?player_id={player.id}&token={player.token}") as ws:
+                assert host.receive_json()["type"] == "state"
+                assert ws.receive_json()["data"]["state"] == "lobby"
+
+                host.send_json({"type": "next"})
+                assert host.receive_json()["type"] == "question"
+                assert ws.receive_json()["data"]["id"] == 11
+
+                ws.send_json({"type": "answer", "answer": "x" * 10000})
+                assert ws.receive_json()["type"] == "error"
+
+                ws.send_json({"type": "answer", "answer": True})
+                result = ws.receive_json()
+                assert result["type"] == "answer_result"
+                assert result["data"]["correct"] and result["data"]["points"] > 0
+
+                ws.send_json({"type": "next"})
+                error = ws.receive_json()
+                assert error["type"] == "error" and "detail" in error["data"]
+
+                host.send_json({"type": "reveal"})
+                reveal = ws.receive_json()
+                assert reveal["type"] == "reveal" and reveal["data"]["correct"] == 1
+    finally:
+        sessions.remove(session.id)
+
+def test_websocket_requires_matching_tokens():
+    session = make_session(654322)
+    sessions._sessions[session.id] = session
+    ann = session.join("ann")
+    bob = session.join("bob")
+    try:
+        client = TestClient(app_module.app)
+        for query in (f"token={ann.token}", f"player_id={bob.id}&token={ann.token}", f"player_id={bob.id}"):
+            with pytest.raises(WebSocketDisconnect) as closed:
+                with client.websocket_connect(f"/sessions/{session.id}/ws?{query}"):
+                    pass
+            assert closed.value.code == FORBIDDEN_CLOSE_CODE
+        # a spectator without a token can watch but not run the game
+        with client.websocket_connect(f"/sessions/{session.id}/ws") as ws:
+            assert ws.receive_json()["type"] == "state"
+            ws.send_json({"type": "next"})
+            assert ws.receive_json()["type"] == "error"
+    finally:
+        sessions.remove(session.id)
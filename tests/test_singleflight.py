@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+####
+# to run this file, run this in root:  pytest tests/test_singleflight.py -v
+#
+
+def test_concurrent_identical_calls_run_once():
+    flights = SingleFlight()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ["question"]
+
+    async def main():
+        return await asyncio.gather(*(flights.do(("questions", 1), load) for _ in range(10)))
+
+    results = asyncio.run(main())
+    assert results == [["question"]] * 10
+    assert len(calls) == 1
+    assert flights.stats() == {"in_flight": 0, "calls": 1, "shared": 9}
+
+def test_different_keys_run_separately():
+    flights = SingleFlight()
+
+    async def main():
+        return await asyncio.gather(
+            flights.do(("user", 1), lambda: asyncio.sleep(0, result=1)),
+            flights.do(("user", 2), lambda: asyncio.sleep(0, result=2)),
+        )
+
+    assert asyncio.run(main()) == [1, 2]
+    assert flights.stats()["calls"] == 2
+
+def test_exception_is_shared_and_not_cached():
+    flights = SingleFlight()
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("database went away")
+
+    async def main():
+        results = await asyncio.gather(*(flights.do("k", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        with pytest.raises(RuntimeError):
+            await flights.do("k", failing)
+
+    asyncio.run(main())
+    assert len(calls) == 2
+
+def test_cancelled_waiter_does_not_cancel_others():
+    flights = SingleFlight()
+
+    async def load():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flights.do("k", load))
+        second = asyncio.ensure_future(flights.do("k", load))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "done"
+        assert first.cancelled()
+
+    asyncio.run(main())
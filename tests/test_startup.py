@@ -0,0 +1,32 @@
+import subprocess
+import sys
+from pathlib import Path
+
+####
+# to run this file, run this in root:  pytest tests/test_startup.py -v
+#
+
+ROOT = Path(__file__).parent.parent
+
+# Runs in a fresh interpreter so other test modules that already used the
+# pools can't influence the result.
+IMPORT_CHECK = """
+import socket
+connects = []
+original = socket.socket.connect
+def spy(self, *args):
+    connects.append(args)
+    return original(self, *args)
+socket.socket.connect = spy
+
+import app
+import db_setup
+assert db_setup.pool is None
+assert db_setup.async_pool is None
+assert connects == [], connects
+"""
+
+def test_importing_app_opens_no_connections():
+    result = subprocess.run([sys.executable, "-c", IMPORT_CHECK], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == ""
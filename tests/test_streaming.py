@@ -0,0 +1,30 @@
+import asyncio
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from streaming import NDJSON_MEDIA_TYPE, ndjson_response
+
+####
+# to run this file, run this in root:  pytest tests/test_streaming.py -v
+#
+
+async def batches():
+    yield [{"id": 1, "birthdate": date(2000, 1, 2)}, {"id": 2, "amount": Decimal("9.50")}]
+    yield [{"id": 3, "created_at": datetime(2024, 5, 1, 12, 30)}]
+
+async def collect(response):
+    return [chunk async for chunk in response.body_iterator]
+
+def test_ndjson_response_sends_one_chunk_per_batch():
+    response = ndjson_response(batches())
+    chunks = asyncio.run(collect(response))
+
+    assert response.media_type == NDJSON_MEDIA_TYPE
+    assert len(chunks) == 2
+    lines = b"".join(chunks).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"id": 1, "birthdate": "2000-01-02"},
+        {"id": 2, "amount": 9.5},
+        {"id": 3, "created_at": "2024-05-01T12:30:00"},
+    ]